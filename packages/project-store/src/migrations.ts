@@ -106,6 +106,48 @@ export function runMigrations(db: Database.Database): void {
         UPDATE reports SET updated_at = created_at WHERE updated_at IS NULL;
       `,
     },
+    {
+      // Scan inventory bulk loaded by scripts/network-topology-mapper.py --sqlite
+      // (keep in sync with SqliteResultSink.SCHEMA there)
+      name: '003_add_scan_inventory',
+      sql: `
+        CREATE TABLE IF NOT EXISTS network_scans (
+          id TEXT PRIMARY KEY,
+          project_id TEXT NOT NULL,
+          topology_id TEXT,
+          scan_time TEXT,
+          device_count INTEGER NOT NULL,
+          metadata_json TEXT NOT NULL,
+          containerlab_json TEXT,
+          docker_compose_json TEXT,
+          created_at TEXT NOT NULL,
+          FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE,
+          FOREIGN KEY (topology_id) REFERENCES topologies(id) ON DELETE SET NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS scan_devices (
+          id TEXT PRIMARY KEY,
+          project_id TEXT NOT NULL,
+          scan_id TEXT,
+          ip TEXT NOT NULL,
+          mac TEXT NOT NULL DEFAULT '',
+          hostname TEXT,
+          device_type TEXT,
+          os_name TEXT,
+          open_ports_json TEXT NOT NULL,
+          device_json TEXT NOT NULL,
+          first_seen_at TEXT NOT NULL,
+          last_seen_at TEXT NOT NULL,
+          UNIQUE (project_id, ip, mac),
+          FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE,
+          FOREIGN KEY (scan_id) REFERENCES network_scans(id) ON DELETE SET NULL
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_network_scans_project_id ON network_scans(project_id);
+        CREATE INDEX IF NOT EXISTS idx_scan_devices_project_id ON scan_devices(project_id);
+        CREATE INDEX IF NOT EXISTS idx_scan_devices_mac ON scan_devices(mac);
+      `,
+    },
   ];
 
   const appliedMigrations = db
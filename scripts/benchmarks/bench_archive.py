@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Scan Archive Benchmark
+======================
+Simulates a year of daily scans of one network (synthetic hosts from
+nmap_xml_gen.py with realistic churn: port changes, reboots, hosts that
+come and go, fresh traceroute RTTs) and writes each day as the mapper's
+indent=2 JSON results. Then archives them all and compares disk usage and
+the time to answer history, port and diff queries.
+
+Usage: python3 bench_archive.py [--hosts 500] [--days 365] [--workdir DIR]
+"""
+
+import argparse
+import contextlib
+import io
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from common import load_mapper
+from nmap_xml_gen import SERVICES, host_ip, write_nmap_xml
+
+
+def base_devices(module, hosts: int):
+    """Device dicts for ``hosts`` synthetic hosts, as the parser records them."""
+    mapper = module.NetworkTopologyMapper(journal=False)
+    with tempfile.NamedTemporaryFile('w', suffix='.xml') as xml:
+        write_nmap_xml(xml, (host_ip(i) for i in range(hosts)))
+        xml.flush()
+        with contextlib.redirect_stdout(io.StringIO()):
+            parsed = mapper._parse_nmap_xml_hosts(xml.name)
+    devices = {}
+    for index, (ip, info) in enumerate(parsed.items()):
+        device = mapper._empty_device_info(ip)
+        device.update(info)
+        device['mac'] = f"02:00:00:{index >> 16 & 255:02x}:{index >> 8 & 255:02x}:{index & 255:02x}"
+        device['discovered_by'] = 'arp_raw'
+        devices[ip] = device
+    return devices
+
+
+def mutate(devices, rng: random.Random, next_index: int) -> int:
+    """One day of churn; returns the next unused host index."""
+    for device in devices.values():
+        if rng.random() < 0.01:
+            ports = device['ports']
+            if ports and rng.random() < 0.5:
+                ports.pop(rng.randrange(len(ports)))
+            else:
+                port = rng.choice(SERVICES)[0]
+                if all(entry['port'] != port for entry in ports):
+                    ports.append({'port': port, 'protocol': 'tcp', 'state': 'open'})
+        if 'uptime_seconds' in device:
+            uptime = 0 if rng.random() < 0.02 else int(device['uptime_seconds']) + 86400
+            device['uptime_seconds'] = str(uptime)
+        for hop in device.get('traceroute', []):
+            hop['rtt'] = f"{int(hop['ttl']) * 0.8 + rng.random():.2f}"
+    for _ in range(rng.randint(0, 2)):
+        # A new host joins the network
+        ip = host_ip(next_index)
+        template = rng.choice(list(devices.values()))
+        devices[ip] = {**template, 'ip': ip, 'mac': f"02:01:00:00:{next_index >> 8 & 255:02x}:{next_index & 255:02x}"}
+        next_index += 1
+    return next_index
+
+
+def write_days(module, workdir: Path, hosts: int, days: int, seed: int):
+    """Write ``days`` daily results files; returns their paths and total size."""
+    rng = random.Random(seed)
+    devices = base_devices(module, hosts)
+    mapper = module.NetworkTopologyMapper(journal=False)
+    start = datetime(2025, 10, 1, 6, 0)
+    next_index = hosts
+    files = []
+    for day in range(days):
+        next_index = mutate(devices, rng, next_index)
+        scan_time = (start + timedelta(days=day)).isoformat()
+        # A few hosts are switched off on any given day
+        present = {ip: device for ip, device in devices.items() if rng.random() > 0.003}
+        for device in present.values():
+            device['scan_time'] = scan_time
+        mapper.scan_metadata = {'scan_time': scan_time, 'scanner_version': '1.0.0', 'scan_type': 'comprehensive',
+                                'network_info': {'network_cidr': '10.0.0.0/16', 'gateway': '10.0.0.1'}}
+        mapper.discovered_devices = {ip: module.Device.from_dict(device) for ip, device in present.items()}
+        with contextlib.redirect_stdout(io.StringIO()):
+            mapper.scan_metadata['topology'] = mapper.determine_network_topology()
+        path = workdir / f"network-topology-{(start + timedelta(days=day)):%Y%m%d_%H%M%S}.json"
+        with open(path, 'w') as f:
+            module.JsonStream(f).write(mapper._results_document(list(mapper.discovered_devices)))
+        files.append(path)
+    return files
+
+
+def timed(function, *args, repeat: int = 5):
+    """Best-of-``repeat`` wall time in ms, and the last result."""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the compressed scan archive')
+    parser.add_argument('--hosts', type=int, default=500, help='Hosts on the first day (default: 500)')
+    parser.add_argument('--days', type=int, default=365, help='Daily scans (default: 365)')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed (default: 1)')
+    parser.add_argument('--workdir', help='Keep the generated scans and archive here (default: a temporary directory)')
+    args = parser.parse_args()
+
+    module = load_mapper()
+    with tempfile.TemporaryDirectory(prefix='ntm-archive-') as tmp:
+        workdir = Path(args.workdir or tmp)
+        workdir.mkdir(parents=True, exist_ok=True)
+        print(f"🧪 Writing {args.days} daily scans of ~{args.hosts} hosts...")
+        files = write_days(module, workdir, args.hosts, args.days, args.seed)
+        json_bytes = sum(path.stat().st_size for path in files)
+
+        archive_path = workdir / 'scan-archive.db'
+        archive_path.unlink(missing_ok=True)
+        started = time.perf_counter()
+        with module.ScanArchive(archive_path) as archive:
+            for path in files:
+                metadata, devices = module.ScanArchive.read_results(path)
+                archive.add_scan(metadata, devices, source=str(path))
+            archive.conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        ingest = time.perf_counter() - started
+        archive_bytes = archive_path.stat().st_size
+
+        print(f"{'format':<10} {'MB':>9} {'per scan':>10}")
+        print(f"{'json':<10} {json_bytes / 1e6:>9.1f} {json_bytes / len(files) / 1e3:>8.0f} KB")
+        print(f"{'archive':<10} {archive_bytes / 1e6:>9.1f} {archive_bytes / len(files) / 1e3:>8.0f} KB")
+        print(f"⏬ Archive is {archive_bytes / json_bytes:.1%} of the JSON; ingest took {ingest:.1f} s "
+              f"({len(files) / ingest:.0f} scans/s)")
+
+        rng = random.Random(args.seed)
+        with module.ScanArchive(archive_path) as archive:
+            scans = archive.scans()
+            ips = [row[0] for row in archive.conn.execute('SELECT DISTINCT ip FROM observations WHERE scan_id = ?',
+                                                          (scans[-1][0],))]
+            sample = rng.sample(ips, min(20, len(ips)))
+            history_ms = [timed(archive.host_history, ip)[0] for ip in sample]
+            port_ms, _ = timed(archive.port_history, 3389, sample[0])
+            all_port_ms, _ = timed(archive.port_history, 3389)
+            diff_ms, diff = timed(archive.diff, str(scans[-2][0]), 'latest')
+            year_ms, year = timed(archive.diff, str(scans[0][0]), 'latest')
+            restore_ms, (_metadata, restored) = timed(archive.scan_results, str(scans[len(scans) // 2][0]), repeat=1)
+
+            _metadata, original = module.ScanArchive.read_results(files[len(files) // 2])
+            lossless = restored == {device['ip']: device for device in original}
+
+        print(f"{'query':<34} {'ms':>8}")
+        print(f"{'history (20 hosts, mean / max)':<34} {sum(history_ms) / len(history_ms):>8.1f} / {max(history_ms):.1f}")
+        print(f"{'port 3389 on one host':<34} {port_ms:>8.1f}")
+        print(f"{'port 3389 on every host':<34} {all_port_ms:>8.1f}")
+        print(f"{'diff consecutive days':<34} {diff_ms:>8.1f}  ({len(diff['changed'])} changed)")
+        print(f"{'diff first vs last day':<34} {year_ms:>8.1f}  ({len(year['changed'])} changed)")
+        print(f"{'restore one full scan':<34} {restore_ms:>8.1f}")
+        if not lossless:
+            print("❌ Restored scan differs from its JSON file")
+            return 1
+        print("✓ Restored scan matches its original JSON device for device")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
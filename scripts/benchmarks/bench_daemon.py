@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Monitoring Daemon Benchmark
+===========================
+Compares a cron-style one-shot scan (a fresh mapper deep-scanning every
+host) with the monitoring daemon's cycles over synthetic hosts and the
+fake nmap (fake_nmap.py). The first daemon cycle is cold; later cycles
+run on the same warm mapper and scan cache, so only the port sweep runs
+for unchanged hosts, while a few hosts join and leave between cycles.
+Port sweeps are charged --sweep-latency per host and deep scans --latency.
+Each cycle's incrementally updated topology must equal one rebuilt from
+its devices by a fresh mapper.
+
+A reader thread polls the daemon API over its Unix socket throughout,
+timing GET /state, /status and /diff both while a cycle is scanning and
+while the daemon is idle. The socket must be no looser than 0660, and the
+localhost TCP port must serve GETs but refuse POST /scan.
+
+Usage: python3 bench_daemon.py [--hosts 200] [--cycles 4] [--latency 0.1] [--sweep-latency 0.01]
+"""
+
+import argparse
+import contextlib
+import http.client
+import ipaddress
+import os
+import socket
+import stat
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from common import load_mapper
+from nmap_xml_gen import GATEWAY, host_ip
+from run_benchmarks import fake_nmap_path
+
+ENDPOINTS = ('/state', '/status', '/diff?since=0')
+
+
+class UnixConnection(http.client.HTTPConnection):
+    """HTTP over the daemon's Unix socket."""
+
+    def __init__(self, socket_path: str):
+        super().__init__('localhost')
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+
+def network_prefix(args) -> int:
+    """Prefix length that fits every host index the run will use, churned ones included.
+    
+    Fixed for the whole run: a segment CIDR that grew as hosts churned in
+    would show up as a change on every device.
+    """
+    last_host = args.hosts + args.churn * max(0, args.cycles - 1)
+    return max(8, 32 - (last_host + 2).bit_length())
+
+
+def stub_network(mapper, hosts, prefix: int):
+    """Point ``mapper`` at the synthetic /``prefix`` network; ``hosts`` is a list of host indexes."""
+    network = ipaddress.ip_network(f"{host_ip(0)}/{prefix}", strict=False)
+    mapper.get_local_network_info = lambda interface=None: {
+        'interface': 'bench0', 'local_ip': GATEWAY, 'gateway': GATEWAY,
+        'network_cidr': str(network), 'network_size': network.num_addresses,
+    }
+    mapper.arp_scan = lambda network_cidr, on_device=None: [
+        {'ip': host_ip(i), 'mac': f"02:00:00:{i >> 16 & 255:02x}:{i >> 8 & 255:02x}:{i & 255:02x}",
+         'discovered_by': 'benchmark'}
+        for i in hosts
+    ]
+    mapper.bluetooth_scan = lambda: []
+    return mapper
+
+
+def one_shot(module, workdir: Path, args) -> float:
+    """Wall time of a single full scan, as an hourly cron job runs it."""
+    mapper = module.NetworkTopologyMapper(output_file=str(workdir / 'cron' / 'topology.json'), journal=False,
+                                          nmap_parallelism=args.parallel, nmap_host_group_size=args.host_group)
+    stub_network(mapper, list(range(args.hosts)), network_prefix(args))
+    started = time.perf_counter()
+    mapper.scan_network()
+    mapper.save_results()
+    return time.perf_counter() - started
+
+
+def poll(socket_path: str, daemon, samples, stop: threading.Event):
+    """Hit each endpoint in turn until ``stop``, filing latencies by daemon state."""
+    connection = UnixConnection(socket_path)
+    while not stop.is_set():
+        for endpoint in ENDPOINTS:
+            state = daemon.status['state']
+            started = time.perf_counter()
+            connection.request('GET', endpoint)
+            response = connection.getresponse()
+            response.read()
+            samples.setdefault((endpoint, state), []).append(time.perf_counter() - started)
+        time.sleep(0.002)
+    connection.close()
+
+
+def access_failures(daemon):
+    """Failures of the API access rules: a 0660 socket, and reads only over TCP."""
+    failures = []
+    mode = stat.S_IMODE(os.stat(daemon.socket_path).st_mode)
+    if mode & ~0o660:
+        failures.append(f"API socket is mode {mode:04o}, looser than 0660")
+    port = daemon._servers[-1].server_address[1]
+    for method, expected in (('GET', 200), ('POST', 403)):
+        connection = http.client.HTTPConnection('127.0.0.1', port)
+        connection.request(method, '/status' if method == 'GET' else '/scan')
+        status = connection.getresponse().status
+        connection.close()
+        if status != expected:
+            failures.append(f"{method} over TCP answered {status}, expected {expected}")
+    return failures
+
+
+def topology_state(topology):
+    """Order-independent view of a topology (incremental updates reorder the lists)."""
+    return {key: sorted(map(str, value)) if isinstance(value, list) else value for key, value in topology.items()}
+
+
+def rebuilt_topology(module, warm):
+    """The topology a fresh mapper builds from the warm mapper's devices."""
+    mapper = module.NetworkTopologyMapper(journal=False)
+    mapper.discovered_devices = warm.discovered_devices
+    mapper.scan_metadata['network_info'] = warm.scan_metadata.get('network_info', {})
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        return topology_state(mapper.determine_network_topology())
+
+
+def percentile(values, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the monitoring daemon against one-shot scans')
+    parser.add_argument('--hosts', type=int, default=200, help='Hosts on the network (default: 200)')
+    parser.add_argument('--cycles', type=int, default=4, help='Daemon cycles to run (default: 4)')
+    parser.add_argument('--churn', type=int, default=2, help='Hosts that join and leave per cycle (default: 2)')
+    parser.add_argument('--latency', type=float, default=0.1, help='Fake nmap deep-scan seconds per host (default: 0.1)')
+    parser.add_argument('--sweep-latency', type=float, default=0.01,
+                        help='Fake nmap port-sweep seconds per host (default: 0.01)')
+    parser.add_argument('--parallel', type=int, default=6, help='Initial nmap workers (default: 6)')
+    parser.add_argument('--host-group', type=int, default=25, help='Hosts per nmap run (default: 25)')
+    args = parser.parse_args()
+
+    module = load_mapper()
+    with tempfile.TemporaryDirectory(prefix='ntm-daemon-') as tmp:
+        workdir = Path(tmp)
+        os.environ['PATH'] = fake_nmap_path(workdir)
+        os.environ['FAKE_NMAP_LATENCY'] = str(args.latency)
+        os.environ['FAKE_NMAP_SWEEP_LATENCY'] = str(args.sweep_latency)
+        print(f"🧪 {args.hosts} hosts, {args.cycles} daemon cycles, {args.churn} hosts joining/leaving per cycle")
+
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            cron_s = one_shot(module, workdir, args)
+
+        hosts = list(range(args.hosts))
+        next_host = args.hosts
+
+        class BenchDaemon(module.MonitorDaemon):
+            def _cycle_mapper(self):
+                return stub_network(super()._cycle_mapper(), hosts, network_prefix(args))
+
+        config = module.NetworkTopologyMapper(output_file=str(workdir / 'daemon' / 'topology.json'),
+                                              nmap_parallelism=args.parallel,
+                                              nmap_host_group_size=args.host_group)._config
+        daemon = BenchDaemon(config, socket_path=str(workdir / 'daemon.sock'), port=0)
+        samples = {}
+        stop = threading.Event()
+        cycles = []
+        mappers = set()
+        mismatched = []
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            daemon.start_api()
+        denied = access_failures(daemon)
+        reader = threading.Thread(target=poll, args=(str(daemon.socket_path), daemon, samples, stop))
+        reader.start()
+        try:
+            for cycle in range(args.cycles):
+                if cycle:
+                    for _ in range(args.churn):
+                        hosts.pop(0)
+                        hosts.append(next_host)
+                        next_host += 1
+                with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                    started = time.perf_counter()
+                    ok = daemon.run_cycle()
+                    wall = time.perf_counter() - started
+                daemon.status['state'] = 'idle'
+                cycles.append((ok, wall, daemon.snapshot.metadata, daemon.diffs[-1]))
+                mappers.add(id(daemon.mapper))
+                if topology_state(daemon.snapshot.metadata['topology']) != rebuilt_topology(module, daemon.mapper):
+                    mismatched.append(cycle + 1)
+                time.sleep(0.5)  # Idle reads between cycles
+        finally:
+            stop.set()
+            reader.join()
+            daemon.stop_api()
+
+    print(f"{'run':<16} {'wall (s)':>9} {'deep-scanned':>13} {'+ / - / ~':>12}")
+    print(f"{'cron one-shot':<16} {cron_s:>9.2f} {args.hosts:>13} {'-':>12}")
+    failed = False
+    for index, (ok, wall, metadata, diff) in enumerate(cycles, 1):
+        failed = failed or not ok
+        deep = metadata.get('stage_timings', {}).get('deep_scan', {}).get('hosts', 0)
+        delta = f"{len(diff['added'])} / {len(diff['removed'])} / {len(diff['changed'])}"
+        print(f"{f'daemon cycle {index}':<16} {wall:>9.2f} {deep:>13} {delta:>12}")
+    warm = [wall for _ok, wall, _metadata, _diff in cycles[1:]]
+    if warm:
+        print(f"⏩ Warm cycles take {sum(warm) / len(warm) / cron_s:.0%} of a one-shot scan")
+
+    print(f"{'API read':<16} {'state':<9} {'reads':>6} {'p50 (ms)':>9} {'p99 (ms)':>9} {'max (ms)':>9}")
+    slowest = 0.0
+    for (endpoint, state), values in sorted(samples.items()):
+        slowest = max(slowest, max(values))
+        print(f"{endpoint:<16} {state:<9} {len(values):>6} {percentile(values, 0.5) * 1000:>9.2f} "
+              f"{percentile(values, 0.99) * 1000:>9.2f} {max(values) * 1000:>9.2f}")
+    for failure in denied:
+        print(f"❌ {failure}")
+    if denied:
+        return 1
+    if failed:
+        print("❌ A daemon cycle failed")
+        return 1
+    if len(mappers) != 1:
+        print(f"❌ The daemon used {len(mappers)} mappers instead of one warm one")
+        return 1
+    if mismatched:
+        print(f"❌ Topology of cycles {mismatched} differs from a rebuild")
+        return 1
+    if slowest >= 1.0:
+        print(f"❌ Slowest API read took {slowest:.2f}s")
+        return 1
+    print(f"✓ Every API read answered in under a second (slowest {slowest * 1000:.1f} ms)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Device Record Memory Benchmark
+==============================
+Compares the memory held by discovered_devices as the parser's nested
+dicts against the slotted Device records, for synthetic nmap results
+(nmap_xml_gen.py). Reports traced bytes and GC-tracked objects per device,
+and checks that every Device converts back to exactly its original dict.
+
+Usage: python3 bench_device_memory.py [--hosts 20000] [--ports 6] [--depth 4]
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import sys
+import tempfile
+import tracemalloc
+
+from common import load_mapper
+from nmap_xml_gen import host_ip, write_nmap_xml
+
+
+def recorded_dicts(module, hosts: int, ports: int, depth: int):
+    """Device dicts as _record_device sees them, serialised so each copy is fresh."""
+    mapper = module.NetworkTopologyMapper(journal=False)
+    with tempfile.NamedTemporaryFile('w', suffix='.xml') as xml:
+        write_nmap_xml(xml, (host_ip(i) for i in range(hosts)), ports=ports, depth=depth)
+        xml.flush()
+        with contextlib.redirect_stdout(io.StringIO()):
+            parsed = mapper._parse_nmap_xml_hosts(xml.name)
+    records = []
+    for index, (ip, info) in enumerate(parsed.items()):
+        device_info = mapper._empty_device_info(ip)
+        device_info.update(info)
+        device_info['mac'] = f"02:00:00:{index >> 16 & 255:02x}:{index >> 8 & 255:02x}:{index & 255:02x}"
+        device_info['discovered_by'] = 'arp_raw'
+        records.append(json.dumps(device_info))
+    return records
+
+
+def measure(build, records):
+    """Traced bytes and new GC-tracked objects retained by build(records)."""
+    gc.collect()
+    objects_before = len(gc.get_objects())
+    tracemalloc.start()
+    held = build(records)
+    gc.collect()
+    size, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    objects = len(gc.get_objects()) - objects_before
+    return held, size, objects
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark device record memory')
+    parser.add_argument('--hosts', type=int, default=20000, help='Synthetic hosts (default: 20000)')
+    parser.add_argument('--ports', type=int, default=6, help='Mean open ports per host (default: 6)')
+    parser.add_argument('--depth', type=int, default=4, help='Maximum traceroute depth (default: 4)')
+    args = parser.parse_args()
+
+    module = load_mapper()
+    print(f"🧪 Generating {args.hosts} synthetic hosts...")
+    records = recorded_dicts(module, args.hosts, args.ports, args.depth)
+
+    dicts, dict_bytes, dict_objects = measure(lambda rs: {d['ip']: d for d in map(json.loads, rs)}, records)
+    devices, device_bytes, device_objects = measure(
+        lambda rs: {d.ip: d for d in (module.Device.from_dict(json.loads(r)) for r in rs)}, records
+    )
+
+    mismatches = sum(1 for ip, device in devices.items() if device.to_dict() != dicts[ip])
+    count = len(records)
+    print(f"{'model':<8} {'MB':>8} {'bytes/device':>13} {'GC objects/device':>18}")
+    print(f"{'dict':<8} {dict_bytes / 1e6:>8.1f} {dict_bytes / count:>13,.0f} {dict_objects / count:>18.1f}")
+    print(f"{'Device':<8} {device_bytes / 1e6:>8.1f} {device_bytes / count:>13,.0f} {device_objects / count:>18.1f}")
+    print(f"⏬ {1 - device_bytes / dict_bytes:.0%} less memory, "
+          f"{1 - device_objects / max(1, dict_objects):.0%} fewer GC-tracked objects")
+    if mismatches:
+        print(f"❌ {mismatches} devices did not round-trip to their original dict")
+        return 1
+    print(f"✓ All {count} devices round-trip losslessly through to_dict()")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+IPv6 Discovery Wire-Format Benchmark
+====================================
+Checks the hand-built packets and parsers behind --ipv6 against bytes
+captured from a Linux kernel, then times the neighbor-cache parser on a
+large synthetic dump. Needs neither root nor a network.
+
+- Icmpv6Prober frames: the echo request to ff02::1 must carry the ICMPv6
+  checksum the kernel computed for the same message (fd00:77::1, id 0x1234,
+  seq 1, payload "inspectr"), both plain and behind the unknown
+  destination option, and every frame must checksum to 0xffff
+- Icmpv6Prober._answer must accept a captured echo reply and drop our own
+  looped-back request
+- LinuxNetworkConfig must parse a captured RTM_NEWNEIGH dump (vx0 is
+  ifindex 16) into exactly its usable entries, skipping FAILED and NOARP
+  ones and entries on other families
+
+Usage: python3 bench_ipv6_discovery.py [--entries 100000]
+"""
+
+import argparse
+import socket
+import struct
+import sys
+import time
+
+from common import load_mapper
+
+# Echo request sent by the kernel from a raw ICMPv6 socket on vx0 (02:00:00:00:00:01)
+KERNEL_ECHO_REQUEST = bytes.fromhex(
+    '33330000000102000000000186dd60052f9b00103afffd000077000000000000000000000001'
+    'ff0200000000000000000000000000018000ba4e12340001696e737065637472'
+)
+KERNEL_CHECKSUM = 0xba4e
+# The reply from fd00:77::2 (02:00:00:00:00:02)
+KERNEL_ECHO_REPLY = bytes.fromhex(
+    '02000000000102000000000286dd600b95de00103a40fd000077000000000000000000000002'
+    'fd0000770000000000000000000000018100bad812340001696e737065637472'
+)
+# RTM_GETNEIGH (AF_INET6) dump: fd00:77::2 REACHABLE and fe80::ff:fe00:2 DELAY
+# on vx0, fd00:77::99 FAILED, and NOARP multicast/loopback entries
+NEIGHBOR_DUMP = bytes.fromhex(
+    '580000001c000200010000002c6c00000a000000100000004000000514000100ff02000000000000'
+    '00000000000000160a0002003333000000160000080004000000000014000300521d0000e2050000'
+    'e205000000000000580000001c000200010000002c6c00000a000000100000004000000514000100'
+    'ff0200000000000000000000000000020a0002003333000000020000080004000000000014000300'
+    '881c0000180500001805000000000000580000001c000200010000002c6c00000a00000010000000'
+    '4000000514000100ff0200000000000000000000000000010a000200333300000001000008000400'
+    '0000000014000300811c0000110500001105000000000000580000001c000200010000002c6c0000'
+    '0a000000100000000200000114000100fd0000770000000000000000000000020a00020002000000'
+    '0002000008000400010000001400030014030000140300001403000001000000580000001c000200'
+    '010000002c6c00000a000000040000004000000514000100ff0200000000000000000001ff000001'
+    '0a0002003333ff0000010000080004000000000014000300217e0900b1660900b166090000000000'
+    '4c0000001c000200010000002c6c00000a000000100000002000000114000100fd00007700000000'
+    '00000000000000990800040000000000140003007917000009000000090000000000000058000000'
+    '1c000200010000002c6c00000a000000080000004000000514000100ff0200000000000000000000'
+    '000000160a000200333300000016000008000400000000001400030075bf070005a8070005a80700'
+    '00000000580000001c000200010000002c6c00000a000000080000004000000514000100ff020000'
+    '0000000000000000000000020a0002003333000000020000080004000000000014000300d8be0700'
+    '68a7070068a7070000000000580000001c000200010000002c6c00000a0000000100000040000002'
+    '14000100fd0000770000000000000000000000010a00020000000000000000000800040000000000'
+    '14000300811c0000110500001105000000000000580000001c000200010000002c6c00000a000000'
+    '100000000800000114000100fe80000000000000000000fffe0000020a0002000200000000020000'
+    '08000400000000001400030084180000140100001401000001000000580000001c00020001000000'
+    '2c6c00000a000000080000004000000514000100ff0200000000000000000001ffabbb160a000200'
+    '3333ffabbb1600000800040000000000140003003ebf0700cea70700cea707000000000058000000'
+    '1c000200010000002c6c00000a000000100000004000000514000100ff0200000000000000000001'
+    'ff0000010a0002003333ff0000010000080004000000000014000300ee1c00007e0500007e050000'
+    '00000000580000001c000200010000002c6c00000a000000040000004000000514000100ff020000'
+    '0000000000000000000000160a0002003333000000160000080004000000000014000300577e0900'
+    'e7660900e7660900000000001400000003000200010000002c6c000000000000'
+)
+EXPECTED_NEIGHBORS = [
+    {'interface': 'vx0', 'address': 'fd00:77::2', 'mac': '02:00:00:00:00:02', 'state': 0x02},
+    {'interface': 'vx0', 'address': 'fe80::ff:fe00:2', 'mac': '02:00:00:00:00:02', 'state': 0x08},
+]
+
+
+def ones_complement_sum(frame: bytes) -> int:
+    """Sum over the ICMPv6 pseudo-header and message of an Ethernet frame; 0xffff when the checksum is right."""
+    upper_offset = 54 if frame[20] == 58 else 54 + 8 * (frame[55] + 1)
+    message = frame[upper_offset:]
+    data = frame[22:54] + struct.pack('!I3xB', len(message), 58) + message
+    data += b'\x00' * (len(data) % 2)
+    total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+    while total >> 16:
+        total = (total & 0xFFFF) + (total >> 16)
+    return total
+
+
+def check_frames(module):
+    """Failures building and reading ICMPv6 frames against the kernel captures."""
+    failures = []
+    prober = module.Icmpv6Prober('lo', ['fd00:77::1'])
+    prober.source_mac = KERNEL_ECHO_REQUEST[6:12]
+    prober.identifier = 0x1234
+    source = prober.sources[0]
+
+    plain = prober._frame(source, 1, options=False)
+    if plain[:14] != KERNEL_ECHO_REQUEST[:14]:
+        failures.append('Ethernet header differs from the kernel frame')
+    # Flow label and hop limit are the sender's choice; addresses and next header are not
+    if plain[20] != 58 or plain[22:54] != KERNEL_ECHO_REQUEST[22:54]:
+        failures.append('IPv6 header differs from the kernel frame')
+    if plain[54:] != KERNEL_ECHO_REQUEST[54:]:
+        failures.append(f"ICMPv6 message {plain[54:].hex()} != kernel {KERNEL_ECHO_REQUEST[54:].hex()}")
+    if struct.unpack_from('!H', plain, 56)[0] != KERNEL_CHECKSUM:
+        failures.append(f"checksum {struct.unpack_from('!H', plain, 56)[0]:#06x} != kernel {KERNEL_CHECKSUM:#06x}")
+
+    options = prober._frame(source, 1, options=True)
+    if options[20] != 60 or options[54:62] != module.Icmpv6Prober.UNKNOWN_OPTION:
+        failures.append('destination option header missing from the option probe')
+    if struct.unpack_from('!H', options, 18)[0] != len(options) - 54:
+        failures.append('option probe payload length is wrong')
+    if options[62:] != plain[54:]:
+        failures.append('option probe does not carry the same echo request')
+    for name, frame in (('kernel request', KERNEL_ECHO_REQUEST), ('kernel reply', KERNEL_ECHO_REPLY),
+                        ('echo probe', plain), ('option probe', options)):
+        if ones_complement_sum(frame) != 0xFFFF:
+            failures.append(f"{name} does not checksum to 0xffff")
+
+    answer = prober._answer(KERNEL_ECHO_REPLY)
+    expected = (socket.inet_pton(socket.AF_INET6, 'fd00:77::2'), bytes.fromhex('020000000002'))
+    if answer != expected:
+        failures.append(f"captured echo reply read as {answer}")
+    if prober._answer(KERNEL_ECHO_REQUEST) is not None:
+        failures.append('our own looped-back request was taken as an answer')
+    return failures
+
+
+def parse_dump(module, config, dump: bytes, names):
+    entries = []
+    done = False
+    for msg_type, payload in module.LinuxNetworkConfig._netlink_messages(dump):
+        if msg_type == config.NLMSG_DONE:
+            done = True
+            break
+        if msg_type == config.RTM_NEWNEIGH:
+            entry = config._parse_ndmsg(payload, names, socket.AF_INET6)
+            if entry:
+                entries.append(entry)
+    return entries, done
+
+
+def check_neighbor_dump(module, config, names):
+    """Failures parsing the captured neighbor dump (its bytes are little-endian)."""
+    entries, done = parse_dump(module, config, NEIGHBOR_DUMP, names)
+    failures = [] if done else ['NLMSG_DONE not seen at the end of the dump']
+    if entries != EXPECTED_NEIGHBORS:
+        failures.append(f"neighbor dump parsed as {entries}")
+    return failures
+
+
+def run_checks(module):
+    """Failures against the kernel captures, without the timed dump (run by run_benchmarks.py)."""
+    failures = check_frames(module)
+    if sys.byteorder == 'little':
+        failures += check_neighbor_dump(module, module.LinuxNetworkConfig(), {16: 'vx0'})
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check and time the IPv6 discovery wire formats')
+    parser.add_argument('--entries', type=int, default=100000,
+                        help='Neighbor entries in the synthetic dump to time (default: 100000)')
+    args = parser.parse_args()
+
+    module = load_mapper()
+    failures = check_frames(module)
+
+    config = module.LinuxNetworkConfig()
+    names = {16: 'vx0'}
+    if sys.byteorder != 'little':
+        print("⚠️  Netlink captures are little-endian; skipping the neighbor dump check on this host")
+    else:
+        failures += check_neighbor_dump(module, config, names)
+
+        # Time the parser on many copies of the captured messages (the trailing NLMSG_DONE dropped)
+        messages = NEIGHBOR_DUMP[:-20]
+        per_copy = sum(1 for _message in module.LinuxNetworkConfig._netlink_messages(messages))
+        copies = max(1, args.entries // per_copy)
+        dump = messages * copies + NEIGHBOR_DUMP[-20:]
+        started = time.perf_counter()
+        entries, _done = parse_dump(module, config, dump, names)
+        elapsed = time.perf_counter() - started
+        print(f"⏱️  Parsed {per_copy * copies} neighbor messages ({len(dump) / 1e6:.1f} MB) "
+              f"in {elapsed * 1000:.0f} ms, {len(entries)} usable")
+        if len(entries) != len(EXPECTED_NEIGHBORS) * copies:
+            failures.append('synthetic dump lost entries')
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        return 1
+    print("✓ ICMPv6 frames match the kernel's checksum and the neighbor dump parses to its usable entries")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Passive Discovery Capture Benchmark
+===================================
+Checks PassiveDiscovery against small hand-built capture fixtures, then
+times the pcap decoder on a large synthetic capture. Needs neither root
+nor a network.
+
+- Little-endian pcap (microsecond magic): plain Ethernet ARP replies
+- Big-endian pcap (nanosecond magic): a VLAN-tagged ARP reply, a plain one
+  and a truncated final record that must be dropped
+- pcapng: a little-endian section (Ethernet IDB, EPB and SPB blocks, and an
+  EPB for an undeclared interface that must be skipped) followed by a
+  big-endian section whose only interface is Linux cooked capture (SLL)
+- A /proc/net/arp style neighbor table: only complete entries with a MAC on
+  the requested interfaces are kept
+
+Usage: python3 bench_passive_discovery.py [--packets 200000] [--workdir DIR]
+"""
+
+import argparse
+import struct
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from common import load_mapper
+
+LINKTYPE_ETHERNET = 1
+LINKTYPE_LINUX_SLL = 113
+
+EXPECTED = {
+    'le.pcap': {'10.1.0.1': '02:00:00:01:00:01', '10.1.0.2': '02:00:00:01:00:02', '10.1.0.3': '02:00:00:01:00:03'},
+    'be.pcap': {'10.2.0.1': '02:00:00:02:00:01', '10.2.0.2': '02:00:00:02:00:02'},
+    'mixed.pcapng': {'10.3.0.1': '02:00:00:03:00:01', '10.3.0.2': '02:00:00:03:00:02',
+                     '10.3.0.3': '02:00:00:03:00:03'},
+}
+EXPECTED_PACKETS = {'le.pcap': 3, 'be.pcap': 2, 'mixed.pcapng': 3}
+
+NEIGHBOR_TABLE = """\
+IP address       HW type     Flags       HW address            Mask     Device
+192.168.1.1      0x1         0x2         AA:BB:CC:00:00:01     *        eth0
+192.168.1.20     0x1         0x0         00:00:00:00:00:00     *        eth0
+192.168.1.21     0x1         0x6         aa:bb:cc:00:00:15     *        eth0
+192.168.1.22     0x1         0x2         00:00:00:00:00:00     *        eth0
+10.9.0.5         0x1         0x2         aa:bb:cc:00:09:05     *        wlan0
+"""
+EXPECTED_NEIGHBORS = {'192.168.1.1': 'aa:bb:cc:00:00:01', '192.168.1.21': 'aa:bb:cc:00:00:15'}
+
+
+def arp_reply(ip: str, mac: str) -> bytes:
+    """ARP reply payload (after the link header) announcing ``ip`` at ``mac``."""
+    sender = bytes.fromhex(mac.replace(':', ''))
+    return (struct.pack('!HHBBH', 1, 0x0800, 6, 4, 2) + sender + bytes(int(o) for o in ip.split('.'))
+            + b'\xff' * 6 + bytes(4))
+
+
+def ethernet(ip: str, mac: str, vlan: int = 0) -> bytes:
+    header = b'\xff' * 6 + bytes.fromhex(mac.replace(':', ''))
+    if vlan:
+        header += struct.pack('!HH', 0x8100, vlan)
+    return header + struct.pack('!H', 0x0806) + arp_reply(ip, mac)
+
+
+def linux_sll(ip: str, mac: str) -> bytes:
+    sender = bytes.fromhex(mac.replace(':', '')) + bytes(2)
+    return struct.pack('!HHH', 0, 1, 6) + sender + struct.pack('!H', 0x0806) + arp_reply(ip, mac)
+
+
+def pcap(endian: str, magic: int, packets, truncated: bytes = b'') -> bytes:
+    records = [struct.pack(endian + 'IHHiIII', magic, 2, 4, 0, 0, 65535, LINKTYPE_ETHERNET)]
+    for index, packet in enumerate(packets):
+        records.append(struct.pack(endian + 'IIII', 1700000000 + index, 0, len(packet), len(packet)) + packet)
+    if truncated:
+        records.append(struct.pack(endian + 'IIII', 1700000099, 0, len(truncated), len(truncated)) + truncated[:10])
+    return b''.join(records)
+
+
+def pcapng_block(endian: str, block_type: int, body: bytes) -> bytes:
+    body += b'\x00' * (-len(body) % 4)
+    length = len(body) + 12
+    return struct.pack(endian + 'II', block_type, length) + body + struct.pack(endian + 'I', length)
+
+
+def pcapng_section(endian: str, linktype: int) -> bytes:
+    header = pcapng_block(endian, 0x0A0D0D0A, struct.pack(endian + 'IHHq', 0x1A2B3C4D, 1, 0, -1))
+    return header + pcapng_block(endian, 1, struct.pack(endian + 'HHI', linktype, 0, 65535))
+
+
+def pcapng_epb(endian: str, interface: int, packet: bytes) -> bytes:
+    return pcapng_block(endian, 6, struct.pack(endian + 'IIIII', interface, 0, 0, len(packet), len(packet)) + packet)
+
+
+def pcapng_spb(endian: str, packet: bytes) -> bytes:
+    return pcapng_block(endian, 3, struct.pack(endian + 'I', len(packet)) + packet)
+
+
+def write_fixtures(workdir: Path):
+    (workdir / 'le.pcap').write_bytes(pcap('<', 0xA1B2C3D4, [
+        ethernet(ip, mac) for ip, mac in EXPECTED['le.pcap'].items()
+    ]))
+    (workdir / 'be.pcap').write_bytes(pcap('>', 0xA1B23C4D, [
+        ethernet('10.2.0.1', '02:00:00:02:00:01', vlan=20),
+        ethernet('10.2.0.2', '02:00:00:02:00:02'),
+    ], truncated=ethernet('10.2.0.9', '02:00:00:02:00:09')))
+    (workdir / 'mixed.pcapng').write_bytes(
+        pcapng_section('<', LINKTYPE_ETHERNET)
+        + pcapng_epb('<', 0, ethernet('10.3.0.1', '02:00:00:03:00:01'))
+        + pcapng_spb('<', ethernet('10.3.0.2', '02:00:00:03:00:02'))
+        + pcapng_epb('<', 3, ethernet('10.3.0.8', '02:00:00:03:00:08'))
+        + pcapng_section('>', LINKTYPE_LINUX_SLL)
+        + pcapng_epb('>', 0, linux_sll('10.3.0.3', '02:00:00:03:00:03'))
+    )
+    (workdir / 'arp').write_text(NEIGHBOR_TABLE)
+
+
+def check_fixtures(module, workdir: Path):
+    """Failures reading the capture fixtures and the neighbor table."""
+    failures = []
+    for name, expected in EXPECTED.items():
+        discovery = module.PassiveDiscovery()
+        try:
+            packets = discovery.read_pcap(str(workdir / name))
+        except Exception as e:
+            failures.append(f"{name}: {e}")
+            continue
+        found = {ip: host['mac'] for ip, host in discovery.hosts.items()}
+        if found != expected:
+            failures.append(f"{name}: found {found}")
+        if packets != EXPECTED_PACKETS[name]:
+            failures.append(f"{name}: read {packets} packets, expected {EXPECTED_PACKETS[name]}")
+        if discovery.stats.get('malformed'):
+            failures.append(f"{name}: {discovery.stats['malformed']} packets reported malformed")
+
+    discovery = module.PassiveDiscovery()
+    discovery.read_neighbor_table(['eth0'], path=str(workdir / 'arp'))
+    found = {ip: host['mac'] for ip, host in discovery.hosts.items()}
+    if found != EXPECTED_NEIGHBORS:
+        failures.append(f"neighbor table: found {found}")
+    return failures
+
+
+def run_checks(module):
+    """Failures on the fixtures alone, without the timed capture (run by run_benchmarks.py)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        write_fixtures(Path(tmp))
+        return check_fixtures(module, Path(tmp))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check and time passive discovery on capture fixtures')
+    parser.add_argument('--packets', type=int, default=200000,
+                        help='ARP replies in the synthetic capture to time (default: 200000)')
+    parser.add_argument('--workdir', help='Directory for the fixtures (default: a temporary directory)')
+    args = parser.parse_args()
+
+    module = load_mapper()
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(args.workdir or tmp)
+        workdir.mkdir(parents=True, exist_ok=True)
+        write_fixtures(workdir)
+        failures = check_fixtures(module, workdir)
+
+        # Larger than PcapReader.CHUNK_SIZE, so records straddle chunk boundaries
+        hosts = min(args.packets, 65534)
+        capture = workdir / 'large.pcap'
+        capture.write_bytes(pcap('<', 0xA1B2C3D4, (
+            ethernet(f"10.128.{n >> 8}.{n & 255}", f"02:00:00:80:{n >> 8:02x}:{n & 255:02x}")
+            for n in (i % hosts for i in range(args.packets))
+        )))
+        discovery = module.PassiveDiscovery()
+        started = time.perf_counter()
+        packets = discovery.read_pcap(str(capture))
+        elapsed = time.perf_counter() - started
+        size = capture.stat().st_size
+        print(f"⏱️  Read {packets} packets ({size / 1e6:.1f} MB) in {elapsed * 1000:.0f} ms "
+              f"({size / 1e6 / max(elapsed, 1e-9):.0f} MB/s), {len(discovery.hosts)} hosts")
+        if packets != args.packets or len(discovery.hosts) != hosts:
+            failures.append(f"synthetic capture read as {packets} packets and {len(discovery.hosts)} hosts")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        return 1
+    print("✓ pcap (both byte orders), pcapng and the neighbor table parse to the expected hosts")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Pipelined Discovery Benchmark
+=============================
+Runs the end-to-end scan twice against the fake nmap (fake_nmap.py): once
+waiting for the whole ARP sweep before deep scans start (--no-pipeline),
+once deep-scanning hosts as they answer. The ARP sweep is simulated: its
+replies arrive spread over --sweep-seconds, followed by the retry passes'
+reply wait (--retry-seconds) in which nothing new answers, as with the raw
+sweeper on a sparse /16.
+
+Reports time to the first recorded host, total wall time and how long
+discovery was held back by the bounded hand-off queue.
+
+Usage: python3 bench_pipeline.py [--hosts 200] [--sweep-seconds 6] [--latency 0.2]
+"""
+
+import argparse
+import contextlib
+import ipaddress
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from common import load_mapper
+from nmap_xml_gen import GATEWAY, host_ip
+from run_benchmarks import fake_nmap_path
+
+
+def run_scan(module, workdir: Path, args, pipelined: bool) -> dict:
+    """One scan; returns wall time, first-result time and the feed summary."""
+    output = workdir / f"out-{'pipelined' if pipelined else 'batch'}" / 'topology.json'
+    mapper = module.NetworkTopologyMapper(
+        output_file=str(output),
+        journal=False,
+        nmap_parallelism=args.parallel,
+        nmap_host_group_size=args.host_group,
+        pipeline_discovery=pipelined,
+    )
+    prefix = max(8, 32 - (args.hosts + 2).bit_length())
+    network = ipaddress.ip_network(f"{host_ip(0)}/{prefix}", strict=False)
+    mapper.get_local_network_info = lambda interface=None: {
+        'interface': 'bench0', 'local_ip': GATEWAY, 'gateway': GATEWAY,
+        'network_cidr': str(network), 'network_size': network.num_addresses,
+    }
+    mapper.bluetooth_scan = lambda: []
+
+    def arp_scan(network_cidr, on_device=None):
+        devices = []
+        step = args.sweep_seconds / max(1, args.hosts)
+        for i in range(args.hosts):
+            time.sleep(step)
+            device = {'ip': host_ip(i), 'mac': f"02:00:00:{i >> 16 & 255:02x}:{i >> 8 & 255:02x}:{i & 255:02x}",
+                      'discovered_by': 'benchmark'}
+            devices.append(device)
+            if on_device is not None:
+                on_device(device)
+        time.sleep(args.retry_seconds)
+        return devices
+
+    mapper.arp_scan = arp_scan
+    first = []
+    record_device = mapper._record_device
+
+    def timed_record(device_info, source_device):
+        if not first:
+            first.append(time.perf_counter())
+        record_device(device_info, source_device)
+
+    mapper._record_device = timed_record
+    started = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        ok = mapper.scan_network()
+    wall = time.perf_counter() - started
+    return {
+        'ok': ok,
+        'hosts': len(mapper.discovered_devices),
+        'wall_s': wall,
+        'first_s': first[0] - started if first else None,
+        'feed': mapper.scan_metadata.get('host_feed'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark pipelined ARP discovery and deep scans')
+    parser.add_argument('--hosts', type=int, default=200, help='Hosts that answer the sweep (default: 200)')
+    parser.add_argument('--sweep-seconds', type=float, default=6.0,
+                        help='Seconds over which ARP replies arrive (default: 6)')
+    parser.add_argument('--retry-seconds', type=float, default=2.0,
+                        help='Reply wait of the retry passes after the last new host (default: 2)')
+    parser.add_argument('--latency', type=float, default=0.2, help='Fake nmap seconds per host (default: 0.2)')
+    parser.add_argument('--parallel', type=int, default=6, help='Initial nmap workers (default: 6)')
+    parser.add_argument('--host-group', type=int, default=1, help='Hosts per nmap run (default: 1)')
+    args = parser.parse_args()
+
+    module = load_mapper()
+    with tempfile.TemporaryDirectory(prefix='ntm-pipeline-') as tmp:
+        workdir = Path(tmp)
+        os.environ['PATH'] = fake_nmap_path(workdir)
+        os.environ['FAKE_NMAP_LATENCY'] = str(args.latency)
+        print(f"🧪 {args.hosts} hosts answering over {args.sweep_seconds:.0f}s "
+              f"(+{args.retry_seconds:.0f}s retries), {args.latency}s nmap latency per host")
+        results = {
+            'batch': run_scan(module, workdir, args, pipelined=False),
+            'pipelined': run_scan(module, workdir, args, pipelined=True),
+        }
+
+    print(f"{'mode':<10} {'hosts':>6} {'first result (s)':>17} {'wall (s)':>9} {'ARP held back (s)':>18}")
+    for mode, result in results.items():
+        held = f"{result['feed']['producer_blocked_s']:.1f}" if result['feed'] else '-'
+        print(f"{mode:<10} {result['hosts']:>6} {result['first_s']:>17.2f} {result['wall_s']:>9.2f} {held:>18}")
+    batch, pipelined = results['batch'], results['pipelined']
+    print(f"⏩ First result {batch['first_s'] / pipelined['first_s']:.0f}x sooner, "
+          f"wall time {1 - pipelined['wall_s'] / batch['wall_s']:.0%} shorter")
+    if pipelined['hosts'] != batch['hosts'] or not (batch['ok'] and pipelined['ok']):
+        print("❌ Pipelined scan recorded a different set of hosts")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
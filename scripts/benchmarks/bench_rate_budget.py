@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Packet-Rate Budget Benchmark
+============================
+Scans synthetic hosts through the fake nmap (fake_nmap.py) with and
+without --rate-budget, logging every nmap run's start, end and --max-rate
+(FAKE_NMAP_LOG). Replays the log to find the most nmap processes that ran
+at once and the highest sum of their --max-rate caps, and checks that the
+sum never went over the budget. Without a budget every process only gets
+the per-process --nmap-min-rate floor, so the site-wide floor grows with the
+worker count.
+
+Usage: python3 bench_rate_budget.py [--hosts 200] [--budgets 2000,500] [--latency 0.05]
+"""
+
+import argparse
+import contextlib
+import ipaddress
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from common import load_mapper
+from nmap_xml_gen import GATEWAY, host_ip
+from run_benchmarks import fake_nmap_path
+
+
+def replay(log: Path):
+    """Peak concurrent nmap runs and peak summed --max-rate (None if uncapped)."""
+    events = []
+    for line in log.read_text().splitlines():
+        event, stamp, _pid, rate = line.split()
+        events.append((float(stamp), event == 'start', None if rate == '-' else float(rate)))
+    # Ends sort before starts at the same instant
+    events.sort(key=lambda event: (event[0], event[1]))
+    running = peak_running = 0
+    total = peak_total = 0.0
+    capped = True
+    for _stamp, start, rate in events:
+        capped = capped and rate is not None
+        running += 1 if start else -1
+        total += (rate or 0.0) if start else -(rate or 0.0)
+        peak_running = max(peak_running, running)
+        peak_total = max(peak_total, total)
+    return peak_running, round(peak_total, 2) if capped else None
+
+
+def run_scan(module, workdir: Path, args, budget):
+    """One scan under ``budget`` pps (None for no ceiling)."""
+    log = workdir / f"nmap-{budget or 'none'}.log"
+    os.environ['FAKE_NMAP_LOG'] = str(log)
+    mapper = module.NetworkTopologyMapper(
+        output_file=str(workdir / 'topology.json'),
+        journal=False,
+        nmap_parallelism=args.parallel,
+        nmap_min_rate=args.min_rate,
+        rate_budget=budget,
+    )
+    prefix = max(8, 32 - (args.hosts + 2).bit_length())
+    network = ipaddress.ip_network(f"{host_ip(0)}/{prefix}", strict=False)
+    arp_devices = [
+        {'ip': host_ip(i), 'mac': f"02:00:00:{i >> 16 & 255:02x}:{i >> 8 & 255:02x}:{i & 255:02x}",
+         'discovered_by': 'benchmark'}
+        for i in range(args.hosts)
+    ]
+    mapper.get_local_network_info = lambda interface=None: {
+        'interface': 'bench0', 'local_ip': GATEWAY, 'gateway': GATEWAY,
+        'network_cidr': str(network), 'network_size': network.num_addresses,
+    }
+    mapper.arp_scan = lambda network_cidr, on_device=None: list(arp_devices)
+    mapper.bluetooth_scan = lambda: []
+
+    started = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        mapper.scan_network()
+    wall = time.perf_counter() - started
+    peak_running, peak_rate = replay(log)
+    return {
+        'hosts': len(mapper.discovered_devices),
+        'wall_s': wall,
+        'peak_running': peak_running,
+        'peak_rate': peak_rate,
+        'governor': mapper.scan_metadata.get('rate_budget'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the site-wide packet-rate budget')
+    parser.add_argument('--hosts', type=int, default=200, help='Hosts to scan (default: 200)')
+    parser.add_argument('--budgets', default='2000,500', help='Budgets in packets/s to compare (default: 2000,500)')
+    parser.add_argument('--parallel', type=int, default=6, help='Initial nmap workers (default: 6)')
+    parser.add_argument('--min-rate', type=int, default=300, help='Per-process --nmap-min-rate (default: 300)')
+    parser.add_argument('--latency', type=float, default=0.05, help='Fake nmap seconds per host (default: 0.05)')
+    args = parser.parse_args()
+
+    module = load_mapper()
+    budgets = [None] + [float(budget) for budget in args.budgets.split(',') if budget]
+    with tempfile.TemporaryDirectory(prefix='ntm-rate-') as tmp:
+        workdir = Path(tmp)
+        os.environ['PATH'] = fake_nmap_path(workdir)
+        os.environ['FAKE_NMAP_LATENCY'] = str(args.latency)
+        print(f"🧪 {args.hosts} hosts, {args.parallel} initial workers, --nmap-min-rate {args.min_rate}")
+        results = [(budget, run_scan(module, workdir, args, budget)) for budget in budgets]
+
+    print(f"{'budget (pps)':<13} {'hosts':>6} {'wall (s)':>9} {'peak nmap':>10} {'peak Σ max-rate':>16} "
+          f"{'Σ min-rate floor':>17}")
+    failed = False
+    for budget, result in results:
+        peak_rate = f"{result['peak_rate']:.0f}" if result['peak_rate'] is not None else 'uncapped'
+        floor = result['peak_running'] * args.min_rate
+        if budget is not None:
+            floor = min(budget, floor)
+        label = f"{budget:g}" if budget is not None else 'none'
+        print(f"{label:<13} {result['hosts']:>6} {result['wall_s']:>9.2f} {result['peak_running']:>10} "
+              f"{peak_rate:>16} {floor:>17.0f}")
+        if budget is not None and (result['peak_rate'] is None or result['peak_rate'] > budget):
+            failed = True
+    if failed:
+        print("❌ Concurrent nmap --max-rate caps exceeded the budget")
+        return 1
+    print("✓ Summed --max-rate of concurrent nmap runs stayed within every budget")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+CLI Startup Benchmark
+=====================
+Measures how long a fresh interpreter takes to import the mapper and reach
+argument parsing in main(), and which heavy backends got imported on the way.
+
+Usage: python3 bench_startup.py [--runs 20] [--budget-ms 100]
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+from common import MAPPER_PATH
+
+# Runs in a fresh interpreter: time from first line to parse_args(), then
+# stop before any scanning happens.
+PROBE = r'''
+import time
+started = time.perf_counter()
+import argparse, importlib.util, json, sys
+
+def stop(self, args=None, namespace=None):
+    elapsed = time.perf_counter() - started
+    heavy = sorted(m for m in ('scapy', 'yaml', 'asyncio', 'multiprocessing', 'xml.etree.ElementTree',
+                               'concurrent.futures', 'opentelemetry') if m in sys.modules)
+    print(json.dumps({'elapsed': elapsed, 'heavy': heavy}))
+    sys.stdout.flush()
+    import os
+    os._exit(0)
+
+argparse.ArgumentParser.parse_args = stop
+spec = importlib.util.spec_from_file_location('network_topology_mapper', sys.argv[1])
+module = importlib.util.module_from_spec(spec)
+sys.modules['network_topology_mapper'] = module
+spec.loader.exec_module(module)
+sys.argv = ['network-topology-mapper.py', '--help']
+module.main()
+'''
+
+
+def probe() -> dict:
+    """Run one cold start and return its timing record."""
+    result = subprocess.run(
+        [sys.executable, '-c', PROBE, str(MAPPER_PATH)],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark CLI startup time')
+    parser.add_argument('--runs', type=int, default=20, help='Cold starts to measure (default: 20)')
+    parser.add_argument('--budget-ms', type=float, default=100.0,
+                        help='Fail when the median exceeds this (default: 100)')
+    args = parser.parse_args()
+
+    probe()  # warm the bytecode cache
+    records = [probe() for _ in range(args.runs)]
+    timings = sorted(record['elapsed'] * 1000 for record in records)
+    median = statistics.median(timings)
+    heavy = sorted({name for record in records for name in record['heavy']})
+
+    print(f"⏱️  import + main() -> parse_args: median {median:.1f} ms, "
+          f"min {timings[0]:.1f} ms, max {timings[-1]:.1f} ms over {args.runs} runs")
+    print(f"📦 Heavy modules loaded at startup: {', '.join(heavy) if heavy else 'none'}")
+
+    if median > args.budget_ms:
+        print(f"❌ Over the {args.budget_ms:.0f} ms budget")
+        return 1
+    print(f"✓ Within the {args.budget_ms:.0f} ms budget")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Topology Inference Benchmark
+============================
+Times determine_network_topology() on synthetic inventories whose devices
+sit behind a shared pool of routers, with 2-8 traceroute hops each: a cold
+build, then an incremental update after a rescan in which --churn of the
+devices appeared, disappeared or changed route or type. The updated graph
+must equal one built from scratch.
+
+Usage: python3 bench_topology.py [--devices 100000] [--routers 2000] [--churn 0.01]
+"""
+
+import argparse
+import contextlib
+import io
+import ipaddress
+import random
+import sys
+import time
+
+from common import load_mapper
+
+FIRST_DEVICE = int(ipaddress.IPv4Address('10.0.0.1'))
+
+
+def synthetic_device(module, rng: random.Random, ip: str, core, edge):
+    """One device behind a random route through the router pool."""
+    path = [core[0]] + rng.sample(core, min(len(core), rng.randint(0, 3)))
+    path += [rng.choice(edge) for _ in range(rng.randint(1, 3))]
+    if rng.random() < 0.05:
+        path.insert(rng.randrange(len(path)), '')  # silent hop
+    path.append(ip)
+    return module.Device.from_dict({
+        'ip': ip,
+        'device_type': rng.choice(['general purpose'] * 8 + ['router', 'switch', 'WAP']),
+        'services': [{'service': rng.choice(['ssh', 'http', 'https', 'smb'])}],
+        'os_detection': {'vendor': rng.choice(['Linux', 'Microsoft', 'Cisco'])},
+        'traceroute': [{'ttl': str(n + 1), 'ip': hop, 'hostname': '', 'rtt': '1.0'} for n, hop in enumerate(path)],
+    })
+
+
+def router_pool(routers: int):
+    core = [f"10.255.{i // 250}.{i % 250 + 1}" for i in range(max(1, routers // 20))]
+    edge = [f"10.254.{i // 250}.{i % 250 + 1}" for i in range(routers)]
+    return core, edge
+
+
+def synthetic_devices(module, count: int, routers: int, seed: int = 7):
+    """Build a discovered_devices dict with realistic traceroute fan-in."""
+    rng = random.Random(seed)
+    core, edge = router_pool(routers)
+    devices = {}
+    for i in range(count):
+        ip = str(ipaddress.IPv4Address(FIRST_DEVICE + i))
+        devices[ip] = synthetic_device(module, rng, ip, core, edge)
+    return devices
+
+
+def rescanned(module, devices, routers: int, churn: float, seed: int = 8):
+    """The inventory after a rescan: a ``churn`` share of devices left, arrived or changed."""
+    rng = random.Random(seed)
+    core, edge = router_pool(routers)
+    after = dict(devices)
+    changes = max(1, int(len(devices) * churn))
+    ips = list(devices)
+    for ip in rng.sample(ips, min(len(ips), changes)):
+        if rng.random() < 0.3:
+            del after[ip]
+        else:
+            after[ip] = synthetic_device(module, rng, ip, core, edge)
+    for i in range(changes // 3):
+        ip = str(ipaddress.IPv4Address(FIRST_DEVICE + len(devices) + i))
+        after[ip] = synthetic_device(module, rng, ip, core, edge)
+    return after
+
+
+def graph_state(topology, graph):
+    """Order-independent view of a topology and its graph."""
+    return (
+        {name: sorted(topology[name]) for name in ('routers', 'switches', 'endpoints', 'access_points')},
+        sorted((edge['from'], edge['to'], edge['type']) for edge in topology['connections']),
+        graph.node_count,
+        graph.edge_count,
+        graph.degree_centrality(),
+        graph.transit_centrality(),
+    )
+
+
+def build(module, devices):
+    """(mapper, topology, seconds) for a cold build on a fresh mapper."""
+    mapper = module.NetworkTopologyMapper(journal=False)
+    mapper.discovered_devices = devices
+    mapper.scan_metadata['network_info'] = {'gateway': '10.255.0.1'}
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        topology = mapper.determine_network_topology()
+    return mapper, topology, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark topology inference')
+    parser.add_argument('--devices', type=int, default=100000, help='Synthetic devices (default: 100000)')
+    parser.add_argument('--routers', type=int, default=2000, help='Distinct edge routers (default: 2000)')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs, best is reported (default: 3)')
+    parser.add_argument('--churn', type=float, default=0.01,
+                        help='Share of devices changed by the rescan (default: 0.01)')
+    args = parser.parse_args()
+
+    module = load_mapper()
+    print(f"🧪 Generating {args.devices} synthetic devices...")
+    devices = synthetic_devices(module, args.devices, args.routers)
+
+    timings = []
+    for _ in range(args.repeat):
+        mapper, topology, elapsed = build(module, devices)
+        timings.append(elapsed)
+
+    graph = mapper.topology_graph
+    best = min(timings)
+    print(f"✓ {args.devices} devices -> {graph.node_count} nodes, {graph.edge_count} edges, "
+          f"{len(topology['connections'])} connections")
+    print(f"⏱️  best {best:.3f}s of {args.repeat} runs ({args.devices / best:,.0f} devices/s)")
+
+    # The same mapper after a rescan, against a graph built from nothing
+    after = rescanned(module, devices, args.routers, args.churn)
+    mapper.discovered_devices = after
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        updated = mapper.determine_network_topology()
+    incremental = time.perf_counter() - started
+    fresh_mapper, fresh, rebuild = build(module, after)
+    print(f"⏱️  rescan with {args.churn:.0%} churn: incremental update {incremental:.3f}s "
+          f"vs. rebuild {rebuild:.3f}s ({rebuild / max(incremental, 1e-9):.1f}x)")
+    if graph_state(updated, mapper.topology_graph) != graph_state(fresh, fresh_mapper.topology_graph):
+        print("❌ Incrementally updated topology differs from a rebuild")
+        return 1
+    print("✓ Incrementally updated topology matches a rebuild")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
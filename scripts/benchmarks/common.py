@@ -0,0 +1,22 @@
+"""
+Shared helpers for the network-topology-mapper benchmarks.
+"""
+
+import importlib.util
+import sys
+from pathlib import Path
+
+MAPPER_PATH = Path(__file__).resolve().parent.parent / "network-topology-mapper.py"
+
+
+def load_mapper():
+    """Import network-topology-mapper.py (its file name is not importable)."""
+    module = sys.modules.get("network_topology_mapper")
+    if module is not None:
+        return module
+    spec = importlib.util.spec_from_file_location("network_topology_mapper", MAPPER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    # Registered before exec so worker processes can pickle its functions
+    sys.modules["network_topology_mapper"] = module
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Fake nmap
+=========
+Stand-in `nmap` for benchmarks: understands the flags the mapper passes
+(-oX, -p, -sn, -iL, targets/CIDRs) and answers with synthetic XML from
+nmap_xml_gen, or with hosts replayed from an existing XML file.
+
+Install it as `nmap` on PATH (the runner does this with a symlink). Tuned
+through environment variables:
+
+  FAKE_NMAP_LATENCY       seconds per host before it is written (default: 0)
+  FAKE_NMAP_SWEEP_LATENCY seconds per host for --open port sweeps (default: FAKE_NMAP_LATENCY)
+  FAKE_NMAP_STARTUP       seconds before any output (default: 0)
+  FAKE_NMAP_FAILURE_RATE  fraction of hosts reported timedout="true" (default: 0)
+  FAKE_NMAP_CRASH_RATE    fraction of runs that die half-way with exit 1 (default: 0)
+  FAKE_NMAP_REPLAY        nmap XML file whose hosts are replayed by IP
+  FAKE_NMAP_SEED          generator seed (default: 1)
+  FAKE_NMAP_LOG           append "start|end <time> <pid> <max-rate>" lines here
+"""
+
+import ipaddress
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from nmap_xml_gen import host_xml, write_nmap_xml  # noqa: E402
+
+# Flags that take a value we do not otherwise need
+VALUE_FLAGS = {
+    '-e', '--host-timeout', '--max-retries', '--min-rate', '--max-rate', '--min-parallelism',
+    '--max-parallelism', '--initial-rtt-timeout', '--max-rtt-timeout', '--min-hostgroup',
+    '--max-hostgroup', '--script', '-T',
+}
+MAX_CIDR_HOSTS = 4096
+
+
+def parse_args(argv):
+    options = {'output': None, 'ports': None, 'ping_only': False, 'sweep': False, 'targets': [], 'max_rate': None}
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        if arg == '-oX':
+            options['output'] = argv[i + 1]
+            i += 2
+            continue
+        if arg == '-p':
+            options['ports'] = argv[i + 1]
+            i += 2
+            continue
+        if arg == '-iL':
+            with open(argv[i + 1]) as f:
+                options['targets'].extend(line.strip() for line in f if line.strip())
+            i += 2
+            continue
+        if arg == '-sn':
+            options['ping_only'] = True
+        if arg == '--open':
+            options['sweep'] = True
+        if arg == '--max-rate':
+            options['max_rate'] = argv[i + 1]
+        if arg in VALUE_FLAGS:
+            i += 2
+            continue
+        if not arg.startswith('-'):
+            options['targets'].append(arg)
+        i += 1
+    return options
+
+
+def expand(targets):
+    for target in targets:
+        if '/' in target:
+            network = ipaddress.ip_network(target, strict=False)
+            for index, host in enumerate(network.hosts()):
+                if index >= MAX_CIDR_HOSTS:
+                    break
+                yield str(host)
+        else:
+            yield target
+
+
+def port_list(spec):
+    """Explicit -p lists are honoured; -p- and ranges fall back to the generator."""
+    if not spec or spec == '-' or '-' in spec:
+        return None
+    return [int(port) for port in spec.replace('T:', '').split(',') if port.isdigit()]
+
+
+def load_replay(path):
+    """Index a replay file's <host> elements by IPv4 address, as raw XML text."""
+    import xml.etree.ElementTree as ET
+
+    hosts = {}
+    for _event, elem in ET.iterparse(path):
+        if elem.tag != 'host':
+            continue
+        for address in elem.findall('address'):
+            if address.get('addrtype') in ('ipv4', 'ipv6'):
+                hosts[address.get('addr')] = ET.tostring(elem, encoding='unicode')
+                break
+        elem.clear()
+    return hosts
+
+
+def log_run(event, options):
+    """One O_APPEND write per line, so concurrent runs can share the log."""
+    path = os.environ.get('FAKE_NMAP_LOG')
+    if path:
+        line = f"{event} {time.time():.6f} {os.getpid()} {options['max_rate'] or '-'}\n"
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, line.encode())
+        finally:
+            os.close(fd)
+
+
+def main():
+    options = parse_args(sys.argv[1:])
+    log_run('start', options)
+    latency = float(os.environ.get('FAKE_NMAP_LATENCY', '0'))
+    if options['sweep']:
+        latency = float(os.environ.get('FAKE_NMAP_SWEEP_LATENCY', latency))
+    failure_rate = float(os.environ.get('FAKE_NMAP_FAILURE_RATE', '0'))
+    crash_rate = float(os.environ.get('FAKE_NMAP_CRASH_RATE', '0'))
+    seed = int(os.environ.get('FAKE_NMAP_SEED', '1'))
+    replay = load_replay(os.environ['FAKE_NMAP_REPLAY']) if os.environ.get('FAKE_NMAP_REPLAY') else None
+    rng = random.Random()
+
+    time.sleep(float(os.environ.get('FAKE_NMAP_STARTUP', '0')))
+    targets = list(expand(options['targets']))
+    crash_at = rng.randrange(len(targets) + 1) if targets and rng.random() < crash_rate else None
+    ports = port_list(options['ports'])
+
+    out = sys.stdout if options['output'] in (None, '-') else open(options['output'], 'w')
+
+    def hosts():
+        for index, ip in enumerate(targets):
+            if index == crash_at:
+                out.flush()
+                print(f"nmap: simulated crash after {index} hosts", file=sys.stderr)
+                sys.exit(1)
+            if latency:
+                time.sleep(latency)
+            yield ip
+
+    def render(ip):
+        if rng.random() < failure_rate:
+            return host_xml(ip, seed=seed, timed_out=True)
+        if replay is not None and ip in replay:
+            return replay[ip]
+        return host_xml(ip, seed=seed, port_list=ports, ping_only=options['ping_only'])
+
+    try:
+        write_nmap_xml(out, hosts(), args='nmap ' + ' '.join(sys.argv[1:]), render=render)
+        out.flush()
+    finally:
+        log_run('end', options)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Synthetic nmap XML Generator
+============================
+Writes realistic `nmap -oX` documents: open ports with service, product,
+version and CPE details, an OS match per device profile, uptime and a
+traceroute through a shared pool of routers. Every host is derived from its
+IP and the seed, so the same host always looks the same across files and
+runs (which is what lets the fake nmap "replay" a network).
+
+Usage: python3 nmap_xml_gen.py --hosts 1000 -o scan.xml [--ports 6] [--depth 4]
+"""
+
+import argparse
+import ipaddress
+import random
+import sys
+import time
+from typing import Callable, Iterable, List, Optional, TextIO
+from xml.sax.saxutils import quoteattr
+
+FIRST_HOST = int(ipaddress.IPv4Address('10.0.0.2'))
+GATEWAY = '10.0.0.1'
+
+# (port, service, product, version, cpe)
+SERVICES = [
+    (22, 'ssh', 'OpenSSH', '8.9p1 Ubuntu 3ubuntu0.6', 'cpe:/a:openbsd:openssh:8.9p1'),
+    (53, 'domain', 'dnsmasq', '2.86', 'cpe:/a:thekelleys:dnsmasq:2.86'),
+    (80, 'http', 'nginx', '1.18.0', 'cpe:/a:igor_sysoev:nginx:1.18.0'),
+    (443, 'https', 'Apache httpd', '2.4.52', 'cpe:/a:apache:http_server:2.4.52'),
+    (139, 'netbios-ssn', 'Samba smbd', '4.6.2', 'cpe:/a:samba:samba'),
+    (445, 'microsoft-ds', 'Microsoft Windows 10 microsoft-ds', '', 'cpe:/o:microsoft:windows_10'),
+    (3389, 'ms-wbt-server', 'Microsoft Terminal Services', '', 'cpe:/o:microsoft:windows'),
+    (631, 'ipp', 'CUPS', '2.4', 'cpe:/a:apple:cups:2.4'),
+    (9100, 'jetdirect', '', '', ''),
+    (1883, 'mqtt', 'Mosquitto', '2.0.11', 'cpe:/a:eclipse:mosquitto:2.0.11'),
+    (3306, 'mysql', 'MySQL', '8.0.36', 'cpe:/a:mysql:mysql:8.0.36'),
+    (5432, 'postgresql', 'PostgreSQL DB', '14.11', 'cpe:/a:postgresql:postgresql:14'),
+    (6379, 'redis', 'Redis key-value store', '6.0.16', 'cpe:/a:redislabs:redis:6.0.16'),
+    (8080, 'http-proxy', 'Jetty', '9.4.44', 'cpe:/a:eclipse:jetty:9.4.44'),
+    (161, 'snmp', 'net-snmp', '5.9.1', 'cpe:/a:net-snmp:net-snmp:5.9.1'),
+    (23, 'telnet', 'Cisco router telnetd', '', 'cpe:/o:cisco:ios'),
+    (1900, 'upnp', 'MiniUPnP', '2.2.1', 'cpe:/a:miniupnp_project:miniupnpd:2.2.1'),
+]
+
+# (weight, os name, type, vendor, family, generation, preferred ports)
+PROFILES = [
+    (40, 'Linux 5.4 - 5.15', 'general purpose', 'Linux', 'Linux', '5.X', [22, 80, 443, 3306, 5432, 6379, 8080]),
+    (30, 'Microsoft Windows 10 1809 - 21H2', 'general purpose', 'Microsoft', 'Windows', '10', [139, 445, 3389]),
+    (8, 'HP LaserJet printer', 'printer', 'HP', 'embedded', '', [80, 631, 9100, 161]),
+    (8, 'Linux 3.2 - 4.14 (embedded)', 'media device', 'Linux', 'Linux', '3.X', [80, 1883, 1900]),
+    (6, 'Cisco IOS 15.X', 'router', 'Cisco', 'IOS', '15.X', [22, 23, 161, 443]),
+    (5, 'Cisco Catalyst switch', 'switch', 'Cisco', 'IOS', '12.X', [22, 23, 161]),
+    (3, 'Ubiquiti UniFi AP', 'WAP', 'Ubiquiti', 'Linux', '3.X', [22, 80, 443]),
+]
+PROFILE_WEIGHTS = [profile[0] for profile in PROFILES]
+SERVICE_BY_PORT = {service[0]: service for service in SERVICES}
+
+
+def host_ip(index: int) -> str:
+    """The index-th synthetic host address (10.0.0.2 upwards)."""
+    return str(ipaddress.IPv4Address(FIRST_HOST + index))
+
+
+def host_rng(ip: str, seed: int) -> random.Random:
+    return random.Random(int(ipaddress.IPv4Address(ip)) * 7919 + seed)
+
+
+def host_xml(
+    ip: str,
+    seed: int = 1,
+    ports: int = 6,
+    depth: int = 4,
+    routers: int = 64,
+    port_list: Optional[List[int]] = None,
+    ping_only: bool = False,
+    timed_out: bool = False,
+) -> str:
+    """Render one <host> element for ``ip``; identical for identical inputs."""
+    rng = host_rng(ip, seed)
+    now = int(time.time())
+    octets = ip.split('.')
+    mac = f"02:00:{int(octets[0]):02X}:{int(octets[1]):02X}:{int(octets[2]):02X}:{int(octets[3]):02X}"
+    weight, os_name, os_type, vendor, family, generation, preferred = rng.choices(PROFILES, PROFILE_WEIGHTS)[0]
+
+    parts = [
+        f'<host starttime="{now - 60}" endtime="{now}"'
+        + (' timedout="true" comment="Timed out">' if timed_out else '>'),
+        '<status state="up" reason="arp-response" reason_ttl="0"/>',
+        f'<address addr="{ip}" addrtype="ipv4"/>',
+        f'<address addr="{mac}" addrtype="mac" vendor="{vendor}"/>',
+        f'<hostnames><hostname name="{family.lower()}-{octets[2]}-{octets[3]}.lan" type="PTR"/></hostnames>',
+    ]
+    if timed_out or ping_only:
+        parts.append('</host>')
+        return ''.join(parts)
+
+    if port_list is None:
+        count = max(1, min(len(SERVICES), int(rng.gauss(ports, ports / 3 or 1))))
+        chosen = set(rng.sample(preferred, min(len(preferred), count)))
+        while len(chosen) < count:
+            chosen.add(rng.choice(SERVICES)[0])
+        port_list = sorted(chosen)
+
+    parts.append('<ports><extraports state="closed" count="%d"/>' % (65535 - len(port_list)))
+    for port in port_list:
+        service = SERVICE_BY_PORT.get(port, (port, 'unknown', '', '', ''))
+        _, name, product, version, cpe = service
+        attrs = f'name="{name}"'
+        if product:
+            attrs += f' product={quoteattr(product)}'
+        if version:
+            attrs += f' version={quoteattr(version)}'
+        parts.append(
+            f'<port protocol="tcp" portid="{port}"><state state="open" reason="syn-ack" reason_ttl="64"/>'
+            f'<service {attrs} method="probed" conf="10">'
+            + (f'<cpe>{cpe}</cpe>' if cpe else '')
+            + '</service></port>'
+        )
+    parts.append('</ports>')
+
+    parts.append(
+        f'<os><osmatch name={quoteattr(os_name)} accuracy="{rng.randint(85, 100)}" line="1">'
+        f'<osclass type={quoteattr(os_type)} vendor="{vendor}" osfamily="{family}" osgen="{generation}" accuracy="95">'
+        f'<cpe>cpe:/o:{vendor.lower()}:{family.lower()}</cpe></osclass></osmatch></os>'
+    )
+    parts.append(f'<uptime seconds="{rng.randint(600, 9000000)}" lastboot="Mon Jan  1 00:00:00 2024"/>')
+
+    hops = [GATEWAY]
+    for _ in range(max(0, rng.randint(depth // 2, depth) - 1)):
+        router = rng.randrange(routers)
+        hops.append(f"10.255.{router // 250}.{router % 250 + 1}")
+    hops.append(ip)
+    parts.append('<trace port="22" proto="tcp">')
+    for ttl, hop in enumerate(hops, 1):
+        parts.append(f'<hop ttl="{ttl}" ipaddr="{hop}" rtt="{ttl * 0.8 + rng.random():.2f}"/>')
+    parts.append('</trace><distance value="%d"/></host>' % len(hops))
+    return ''.join(parts)
+
+
+def write_nmap_xml(
+    out: TextIO,
+    hosts: Iterable[str],
+    args: str = 'nmap -A -p- -oX -',
+    render: Optional[Callable[..., str]] = None,
+    **host_options,
+) -> int:
+    """Write a complete nmaprun document for ``hosts``; returns the host count.
+
+    ``render`` replaces host_xml for callers that substitute some hosts.
+    """
+    render = render or host_xml
+    started = int(time.time())
+    out.write('<?xml version="1.0" encoding="UTF-8"?>\n<!DOCTYPE nmaprun>\n')
+    out.write(f'<nmaprun scanner="nmap" args={quoteattr(args)} start="{started}" version="7.94" xmloutputversion="1.05">\n')
+    count = 0
+    for ip in hosts:
+        out.write(render(ip, **host_options))
+        out.write('\n')
+        count += 1
+    out.write(f'<runstats><finished time="{int(time.time())}" exit="success"/>'
+              f'<hosts up="{count}" down="0" total="{count}"/></runstats>\n</nmaprun>\n')
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic nmap XML')
+    parser.add_argument('--hosts', type=int, default=1000, help='Hosts in the document (default: 1000)')
+    parser.add_argument('--ports', type=int, default=6, help='Mean open ports per host (default: 6)')
+    parser.add_argument('--depth', type=int, default=4, help='Maximum traceroute depth (default: 4)')
+    parser.add_argument('--routers', type=int, default=64, help='Distinct transit routers (default: 64)')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed (default: 1)')
+    parser.add_argument('-o', '--output', default='-', help='Output file, - for stdout (default: -)')
+    args = parser.parse_args()
+
+    hosts = (host_ip(i) for i in range(args.hosts))
+    options = dict(seed=args.seed, ports=args.ports, depth=args.depth, routers=args.routers)
+    if args.output == '-':
+        write_nmap_xml(sys.stdout, hosts, **options)
+    else:
+        with open(args.output, 'w') as f:
+            count = write_nmap_xml(f, hosts, **options)
+        print(f"✓ Wrote {count} hosts to {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
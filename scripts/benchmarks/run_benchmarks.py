@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Scanner Benchmark Runner
+========================
+Measures the mapper's main paths at several inventory sizes without root or
+a live network, using synthetic nmap XML (nmap_xml_gen.py) and, for the
+end-to-end scan, the fake nmap (fake_nmap.py) placed first on PATH:
+
+  parse     _parse_nmap_xml_hosts() over one N-host XML document
+  topology  determine_network_topology() on the parsed devices
+  export    containerlab + compose generation and save_results()
+  scan      scan_network() + save_results() against the fake nmap
+
+Before timing anything it runs the correctness checks of the fixture
+benchmarks (CHECKS) and exits non-zero if any of them fails; --checks-only
+stops there.
+
+Each (stage, size) runs in a fresh interpreter so peak RSS is its own.
+Reports wall time, hosts/s and peak RSS; --json writes the raw numbers.
+"child RSS" is the largest child process, which for forked nmap runs
+includes the pages briefly shared with the parent before exec.
+
+Usage: python3 run_benchmarks.py [--sizes 10,1000,50000] [--stages parse,topology,export,scan] [--checks-only]
+"""
+
+import argparse
+import contextlib
+import importlib
+import ipaddress
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from common import load_mapper
+from nmap_xml_gen import GATEWAY, host_ip, write_nmap_xml
+
+BENCH_DIR = Path(__file__).resolve().parent
+STAGES = ['parse', 'topology', 'export', 'scan']
+# Benchmarks whose run_checks(module) returns failures against fixed fixtures
+CHECKS = {
+    'passive discovery': 'bench_passive_discovery',
+    'IPv6 discovery': 'bench_ipv6_discovery',
+}
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF) -> float:
+    """Peak resident set size in MB (ru_maxrss is KB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def xml_for(size: int, workdir: Path, ports: int, depth: int) -> Path:
+    """Generate (once per work directory) the N-host XML document."""
+    path = workdir / f"hosts-{size}-p{ports}-d{depth}.xml"
+    if not path.exists():
+        with open(path, 'w') as f:
+            write_nmap_xml(f, (host_ip(i) for i in range(size)), ports=ports, depth=depth)
+    return path
+
+
+def parsed_devices(module, mapper, xml_file: Path):
+    """Parse the XML into discovered_devices records (ip -> Device)."""
+    devices = mapper._parse_nmap_xml_hosts(str(xml_file))
+    return {ip: module.Device.from_dict({**mapper._empty_device_info(ip), **info}) for ip, info in devices.items()}
+
+
+def fake_nmap_path(workdir: Path) -> str:
+    """A directory whose `nmap` is fake_nmap.py, for the front of PATH."""
+    bin_dir = workdir / 'bin'
+    bin_dir.mkdir(exist_ok=True)
+    link = bin_dir / 'nmap'
+    if not link.exists():
+        link.symlink_to(BENCH_DIR / 'fake_nmap.py')
+    return f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}"
+
+
+def run_checks() -> int:
+    """Run every CHECKS entry; the number that failed."""
+    module = load_mapper()
+    failed = 0
+    for name, bench in CHECKS.items():
+        try:
+            failures = importlib.import_module(bench).run_checks(module)
+        except Exception as e:
+            failures = [f"{type(e).__name__}: {e}"]
+        for failure in failures:
+            print(f"❌ {name}: {failure}")
+        if failures:
+            failed += 1
+        else:
+            print(f"✓ {name} checks passed")
+    return failed
+
+
+def run_stage(args) -> dict:
+    """Worker side: run one stage at one size and return its measurements."""
+    module = load_mapper()
+    workdir = Path(args.workdir)
+    xml_file = xml_for(args.size, workdir, args.ports, args.depth)
+    output = workdir / f"out-{args.stage}-{args.size}" / 'topology.json'
+    mapper = module.NetworkTopologyMapper(
+        output_file=str(output),
+        journal=args.stage == 'scan',
+        nmap_parallelism=args.parallel,
+        nmap_host_group_size=args.host_group,
+        scan_mode=args.scan_mode,
+    )
+    mapper.scan_metadata['network_info'] = {'gateway': GATEWAY}
+    devnull = open(os.devnull, 'w')
+
+    if args.stage in ('topology', 'export'):
+        mapper.discovered_devices = parsed_devices(module, mapper, xml_file)
+    if args.stage == 'export':
+        with contextlib.redirect_stdout(devnull):
+            mapper.scan_metadata['topology'] = mapper.determine_network_topology()
+
+    if args.stage == 'scan':
+        prefix = max(8, 32 - (args.size + 2).bit_length())
+        network = ipaddress.ip_network(f"{host_ip(0)}/{prefix}", strict=False)
+        arp_devices = [
+            {'ip': host_ip(i), 'mac': f"02:00:00:{i >> 16 & 255:02x}:{i >> 8 & 255:02x}:{i & 255:02x}",
+             'discovered_by': 'benchmark'}
+            for i in range(args.size)
+        ]
+        mapper.get_local_network_info = lambda interface=None: {
+            'interface': 'bench0', 'local_ip': GATEWAY, 'gateway': GATEWAY,
+            'network_cidr': str(network), 'network_size': network.num_addresses,
+        }
+
+        def arp_scan(network_cidr, on_device=None):
+            if on_device is not None:
+                for device in arp_devices:
+                    on_device(device)
+            return list(arp_devices)
+
+        mapper.arp_scan = arp_scan
+        mapper.bluetooth_scan = lambda: []
+        os.environ['PATH'] = fake_nmap_path(workdir)
+        os.environ.setdefault('FAKE_NMAP_LATENCY', str(args.latency))
+        os.environ.setdefault('FAKE_NMAP_FAILURE_RATE', str(args.failure_rate))
+
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(devnull):
+        if args.stage == 'parse':
+            hosts = len(parsed_devices(module, mapper, xml_file))
+        elif args.stage == 'topology':
+            mapper.determine_network_topology()
+            hosts = len(mapper.discovered_devices)
+        elif args.stage == 'export':
+            mapper.generate_containerlab_format()
+            mapper.generate_docker_compose_format()
+            mapper.save_results()
+            hosts = len(mapper.discovered_devices)
+        else:
+            mapper.scan_network()
+            mapper.save_results()
+            hosts = len(mapper.discovered_devices)
+    wall = time.perf_counter() - started
+
+    return {
+        'stage': args.stage,
+        'size': args.size,
+        'hosts': hosts,
+        'wall_s': round(wall, 4),
+        'hosts_per_s': round(hosts / wall, 1) if wall else None,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'children_peak_rss_mb': round(peak_rss_mb(resource.RUSAGE_CHILDREN), 1),
+        'xml_mb': round(xml_file.stat().st_size / 1e6, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the network topology mapper')
+    parser.add_argument('--sizes', default='10,1000,50000', help='Host counts (default: 10,1000,50000)')
+    parser.add_argument('--stages', default=','.join(STAGES), help=f"Stages to run (default: {','.join(STAGES)})")
+    parser.add_argument('--ports', type=int, default=6, help='Mean open ports per host (default: 6)')
+    parser.add_argument('--depth', type=int, default=4, help='Maximum traceroute depth (default: 4)')
+    parser.add_argument('--host-group', type=int, default=256, help='Hosts per fake nmap run in the scan stage (default: 256)')
+    parser.add_argument('--parallel', type=int, default=6, help='Initial nmap workers in the scan stage (default: 6)')
+    parser.add_argument('--scan-mode', choices=['single-pass', 'two-phase'], default='single-pass',
+                        help='Scan mode for the scan stage (default: single-pass)')
+    parser.add_argument('--latency', type=float, default=0.0, help='Fake nmap seconds per host (default: 0)')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Fake nmap host timeout rate (default: 0)')
+    parser.add_argument('--workdir', help='Keep generated XML and outputs here (default: a temporary directory)')
+    parser.add_argument('--json', help='Also write the results to this JSON file')
+    parser.add_argument('--checks-only', action='store_true',
+                        help='Run only the correctness checks, without timing any stage (default: checks, then stages)')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--stage', help=argparse.SUPPRESS)
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_stage(args)))
+        return 0
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    stages = [stage for stage in args.stages.split(',') if stage]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    if run_checks():
+        print("❌ Correctness checks failed; not timing anything")
+        return 1
+    if args.checks_only:
+        return 0
+
+    with tempfile.TemporaryDirectory(prefix='ntm-bench-') as tmp:
+        workdir = Path(args.workdir or tmp)
+        workdir.mkdir(parents=True, exist_ok=True)
+        passthrough = [
+            '--ports', str(args.ports), '--depth', str(args.depth), '--host-group', str(args.host_group),
+            '--parallel', str(args.parallel), '--scan-mode', args.scan_mode, '--latency', str(args.latency),
+            '--failure-rate', str(args.failure_rate), '--workdir', str(workdir),
+        ]
+
+        print(f"{'stage':<9} {'hosts':>7} {'wall (s)':>10} {'hosts/s':>11} {'peak RSS':>10} {'child RSS':>10}")
+        results = []
+        for size in sizes:
+            for stage in stages:
+                completed = subprocess.run(
+                    [sys.executable, __file__, '--worker', '--stage', stage, '--size', str(size)] + passthrough,
+                    capture_output=True,
+                    text=True,
+                )
+                if completed.returncode != 0:
+                    print(f"{stage:<9} {size:>7} ❌ failed:\n{completed.stderr.strip()}")
+                    continue
+                result = json.loads(completed.stdout.strip().splitlines()[-1])
+                results.append(result)
+                children = f"{result['children_peak_rss_mb']:.0f} MB" if stage == 'scan' else '-'
+                print(f"{stage:<9} {result['hosts']:>7} {result['wall_s']:>10.3f} {result['hosts_per_s']:>11,.0f} "
+                      f"{result['peak_rss_mb']:>7.0f} MB {children:>10}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'argv': sys.argv[1:], 'results': results}, f, indent=2)
+        print(f"✓ Results written to {args.json}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -10,29 +10,3155 @@ For authorized local testing only.
 """
 
 import json
+import os
 import subprocess
 import sys
 import re
 import ipaddress
 import argparse
+import hashlib
+import shutil
 import socket
-from datetime import datetime
-from typing import Dict, List, Any, Optional
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import struct
+import threading
+import time
+from array import array
+from collections import deque
+from datetime import datetime, timezone
+from importlib.util import find_spec
+from typing import TYPE_CHECKING, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Any, NamedTuple, Optional, Sequence, Tuple, Union
 from pathlib import Path
-import xml.etree.ElementTree as ET
 
-ARP: Any = None
-Ether: Any = None
-srp: Any = None
-conf: Any = None
+# Heavy backends (scapy, PyYAML, ElementTree, asyncio, multiprocessing) are
+# imported by the phase that needs them so that --help, argument errors and
+# offline runs start instantly.
+if TYPE_CHECKING:
+    import asyncio
+    import xml.etree.ElementTree as ET
 
-try:
-    from scapy.all import ARP, Ether, srp, conf  # type: ignore[import-not-found]
-    SCAPY_AVAILABLE = True
-except ImportError:
-    print("⚠️  scapy not available - ARP scanning will use system arp command")
-    SCAPY_AVAILABLE = False
+SCAPY_AVAILABLE = find_spec('scapy') is not None
+_scapy_module: Any = None
+
+
+def _load_scapy() -> Any:
+    """Import scapy.all on first use; returns None when it is unusable."""
+    global _scapy_module, SCAPY_AVAILABLE
+    if _scapy_module is None and SCAPY_AVAILABLE:
+        try:
+            import scapy.all as scapy_all  # type: ignore[import-not-found]
+            _scapy_module = scapy_all
+        except Exception as e:
+            print(f"⚠️  scapy failed to load ({e}) - ARP scanning will use nmap")
+            SCAPY_AVAILABLE = False
+    return _scapy_module
+
+
+def _intern(value: Any) -> Any:
+    """Share one copy of repeated strings (service names, OS names, router IPs)."""
+    return sys.intern(value) if type(value) is str else value
+
+
+def _ip_sort_key(ip: str) -> Tuple[int, int]:
+    """Sort key for device addresses: IPv4 in numeric order, then IPv6."""
+    address = ipaddress.ip_address(ip)
+    return address.version, int(address)
+
+
+class Service:
+    """One nmap <port> that carried a <service> element."""
+    
+    __slots__ = ('port', 'protocol', 'state', 'service', 'product', 'version', 'extrainfo', 'cpe')
+    
+    def __init__(self, port: int, protocol: str = 'tcp', state: str = 'unknown', service: str = '',
+                 product: str = '', version: str = '', extrainfo: str = '', cpe: Tuple[str, ...] = ()):
+        self.port = port
+        self.protocol = _intern(protocol)
+        self.state = _intern(state)
+        self.service = _intern(service)
+        self.product = _intern(product)
+        self.version = _intern(version)
+        self.extrainfo = _intern(extrainfo)
+        self.cpe = tuple(_intern(entry) for entry in cpe)
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Service':
+        return cls(
+            data.get('port', 0), data.get('protocol', 'tcp'), data.get('state', 'unknown'),
+            data.get('service', ''), data.get('product', ''), data.get('version', ''),
+            data.get('extrainfo', ''), data.get('cpe') or (),
+        )
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'port': self.port,
+            'protocol': self.protocol,
+            'state': self.state,
+            'service': self.service,
+            'product': self.product,
+            'version': self.version,
+            'extrainfo': self.extrainfo,
+            'cpe': list(self.cpe),
+        }
+
+
+class Hop:
+    """One traceroute hop; TTL and RTT are numbers unless nmap wrote something odd."""
+    
+    __slots__ = ('ttl', 'ip', 'hostname', 'rtt')
+    
+    def __init__(self, ttl: Any, ip: str, hostname: str = '', rtt: Any = None):
+        self.ttl = ttl
+        self.ip = _intern(ip)
+        self.hostname = _intern(hostname)
+        self.rtt = rtt
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Hop':
+        # Keep the original text whenever the number would not print back identically
+        ttl = data.get('ttl', '')
+        if type(ttl) is str and ttl.isdigit() and str(int(ttl)) == ttl:
+            ttl = int(ttl)
+        rtt = data.get('rtt', '')
+        if type(rtt) is str and rtt:
+            try:
+                if '%.2f' % float(rtt) == rtt:
+                    rtt = float(rtt)
+            except ValueError:
+                pass
+        return cls(ttl, data.get('ip', ''), data.get('hostname', ''), rtt)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'ttl': str(self.ttl) if type(self.ttl) is int else self.ttl,
+            'ip': self.ip,
+            'hostname': self.hostname,
+            'rtt': '%.2f' % self.rtt if type(self.rtt) is float else self.rtt,
+        }
+
+
+class Device:
+    """Compact in-memory record for one discovered device.
+    
+    ``discovered_devices`` holds these instead of the nested dicts built by
+    the parsers: open ports are an unsigned-short array, services and hops
+    are slotted records with interned strings, and numbers are stored as
+    numbers. to_dict() gives back the exact dict the device was built from
+    (the JSON output schema); keys without a dedicated slot, and port
+    entries that are not plain open ports, are kept verbatim in ``extra``.
+    """
+    
+    __slots__ = (
+        'ip', 'scan_time', 'open_ports', 'port_protocols', 'services', 'os_detection', 'device_type',
+        'distance_hops', 'scan_error', 'hostname', 'traceroute', 'uptime_seconds', 'mac',
+        'discovered_by', 'extra',
+    )
+    
+    # Optional keys whose slot is None when the key was absent
+    OPTIONAL = ('scan_error', 'hostname', 'traceroute', 'uptime_seconds', 'mac', 'discovered_by')
+    SCALARS = frozenset(['scan_time', 'device_type', 'distance_hops', 'scan_error', 'hostname',
+                         'uptime_seconds', 'mac', 'discovered_by'])
+    _OS_CACHE: Dict[Tuple[Tuple[str, Any], ...], Dict[str, Any]] = {}
+    
+    def __init__(self, ip: str):
+        self.ip = ip
+        self.scan_time = ''
+        self.open_ports = array('H')
+        self.port_protocols: Optional[Tuple[str, ...]] = None
+        self.services: Tuple[Service, ...] = ()
+        self.os_detection: Dict[str, Any] = {}
+        self.device_type = 'unknown'
+        self.distance_hops: Optional[int] = None
+        self.scan_error: Optional[str] = None
+        self.hostname: Optional[str] = None
+        self.traceroute: Optional[Tuple[Hop, ...]] = None
+        self.uptime_seconds: Any = None
+        self.mac: Optional[str] = None
+        self.discovered_by: Optional[str] = None
+        self.extra: Optional[Dict[str, Any]] = None
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Device':
+        """Build from a parser/journal/cache dict (not modified)."""
+        device = cls(data['ip'])
+        extra: Dict[str, Any] = {}
+        for key, value in data.items():
+            if key == 'ip':
+                continue
+            if key == 'ports':
+                if not device._set_ports(value):
+                    extra[key] = value
+            elif key == 'services':
+                device.services = tuple(Service.from_dict(service) for service in value)
+            elif key == 'traceroute':
+                device.traceroute = tuple(Hop.from_dict(hop) for hop in value)
+            elif key == 'os_detection' and type(value) is dict:
+                device.os_detection = cls._shared_os(value)
+            elif key == 'uptime_seconds' and type(value) is str and value.isdigit() and str(int(value)) == value:
+                device.uptime_seconds = int(value)
+            elif key in cls.SCALARS and (value is not None or key == 'distance_hops'):
+                setattr(device, key, _intern(value))
+            else:
+                # Unknown keys, and None where a slot's None means "absent"
+                extra[key] = value
+        device.extra = extra or None
+        return device
+    
+    def _set_ports(self, ports: List[Dict[str, Any]]) -> bool:
+        """Pack open-port entries into arrays; False if any entry does not fit."""
+        numbers = array('H')
+        protocols = []
+        for entry in ports:
+            if (len(entry) != 3 or entry.get('state') != 'open' or type(entry.get('port')) is not int
+                    or not 0 <= entry['port'] <= 65535 or type(entry.get('protocol')) is not str):
+                return False
+            numbers.append(entry['port'])
+            protocols.append(_intern(entry['protocol']))
+        self.open_ports = numbers
+        self.port_protocols = None if all(protocol == 'tcp' for protocol in protocols) else tuple(protocols)
+        return True
+    
+    @classmethod
+    def _shared_os(cls, os_detection: Dict[str, Any]) -> Dict[str, Any]:
+        """One shared dict per distinct OS match (treated as read-only)."""
+        if not os_detection:
+            return {}
+        try:
+            key = tuple(os_detection.items())
+            shared = cls._OS_CACHE.get(key)
+        except TypeError:
+            return dict(os_detection)
+        if shared is None:
+            shared = cls._OS_CACHE[key] = {k: _intern(v) for k, v in os_detection.items()}
+        return shared
+    
+    @property
+    def ports(self) -> List[int]:
+        """Open port numbers."""
+        if self.extra and 'ports' in self.extra:
+            return [entry['port'] for entry in self.extra['ports'] if entry.get('state', 'open') == 'open']
+        return list(self.open_ports)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """The device in the JSON output schema."""
+        extra = self.extra or {}
+        if 'ports' in extra:
+            ports = extra['ports']
+        else:
+            protocols = self.port_protocols or ('tcp',) * len(self.open_ports)
+            ports = [
+                {'port': port, 'protocol': protocol, 'state': 'open'}
+                for port, protocol in zip(self.open_ports, protocols)
+            ]
+        data: Dict[str, Any] = {
+            'ip': self.ip,
+            'scan_time': self.scan_time,
+            'ports': ports,
+            'services': [service.to_dict() for service in self.services],
+            'os_detection': dict(self.os_detection),
+            'device_type': self.device_type,
+            'distance_hops': self.distance_hops,
+        }
+        for key in self.OPTIONAL:
+            value = getattr(self, key)
+            if value is None:
+                continue
+            if key == 'traceroute':
+                value = [hop.to_dict() for hop in value]
+            elif key == 'uptime_seconds' and type(value) is int:
+                value = str(value)
+            data[key] = value
+        for key, value in extra.items():
+            if key != 'ports':
+                data[key] = value
+        return data
+
+
+class NmapXmlStream:
+    """Incremental nmap XML parser that hands back each <host> once it closes.
+    
+    Bytes are fed as they arrive from nmap's stdout (or a file); completed
+    host elements are parsed and then dropped from the tree so memory stays
+    flat however large the document grows.
+    """
+    
+    def __init__(self, parse_host):
+        import xml.etree.ElementTree as ET
+        
+        self._parse_host = parse_host
+        self._parser = ET.XMLPullParser(events=('start', 'end'))
+        self._parse_error = ET.ParseError
+        self._root: Optional['ET.Element'] = None
+        self.error: Optional[str] = None
+    
+    @property
+    def root(self) -> Optional['ET.Element']:
+        """The document's root (<nmaprun>) element once it has started."""
+        return self._root
+    
+    def feed(self, data: bytes) -> List[Tuple[str, Dict[str, Any]]]:
+        """Consume a chunk of XML and return the hosts it completed."""
+        if self.error is not None:
+            return []
+        try:
+            self._parser.feed(data)
+        except self._parse_error as e:
+            self.error = str(e)
+        return self._drain()
+    
+    def close(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """Finish the document; a truncated tail is recorded in .error."""
+        if self.error is None:
+            try:
+                self._parser.close()
+            except self._parse_error as e:
+                self.error = str(e)
+        return self._drain()
+    
+    def _drain(self) -> List[Tuple[str, Dict[str, Any]]]:
+        hosts = []
+        try:
+            for event, elem in self._parser.read_events():
+                if event == 'start':
+                    if self._root is None:
+                        self._root = elem
+                    continue
+                if elem.tag != 'host':
+                    continue
+                ip, info = self._parse_host(elem)
+                if ip:
+                    hosts.append((ip, info))
+                elem.clear()
+                if self._root is not None and elem in self._root:
+                    self._root.remove(elem)
+        except self._parse_error as e:
+            self.error = str(e)
+        return hosts
+
+
+class ScanCache:
+    """On-disk cache of per-device scan results keyed by (MAC, IP).
+    
+    Each entry remembers the open-port signature seen by the port sweep.
+    A later run reuses the cached service/OS data only while the entry is
+    younger than the TTL and the signature is unchanged; the least recently
+    used entries are evicted once the cache grows past ``max_entries``.
+    """
+    
+    VERSION = 1
+    
+    def __init__(self, path: str, ttl: int = 86400, max_entries: int = 10000):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.stats = {'hits': 0, 'misses': 0, 'stale': 0, 'evicted': 0}
+        self._updated: set = set()
+        self._lock = threading.Lock()
+        self._loaded = False
+    
+    @staticmethod
+    def key(mac: str, ip: str) -> str:
+        """Cache key for a device: lower-cased MAC plus IP."""
+        return f"{(mac or '').lower()}|{ip}"
+    
+    @staticmethod
+    def signature(ports: List[Dict[str, Any]]) -> str:
+        """Stable fingerprint of a host's open ports."""
+        spec = ",".join(sorted(f"{p.get('protocol', 'tcp')}/{p['port']}" for p in ports))
+        return hashlib.sha1(spec.encode()).hexdigest()
+    
+    def load(self):
+        """Read the cache file once, starting empty if it is missing or unreadable.
+        
+        Later calls keep the entries already in memory, so a cache shared
+        by several runs in one process (the monitoring daemon) stays warm.
+        """
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            if data.get('version') == self.VERSION:
+                self.entries = data.get('entries', {})
+        except Exception as e:
+            print(f"⚠️  Ignoring unreadable scan cache {self.path}: {e}")
+    
+    def lookup(self, mac: str, ip: str, signature: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of the cached device if it is fresh and unchanged."""
+        with self._lock:
+            entry = self.entries.get(self.key(mac, ip))
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            if time.time() - entry['stored_at'] > self.ttl or entry['signature'] != signature:
+                self.stats['stale'] += 1
+                return None
+            self.stats['hits'] += 1
+            entry['last_used'] = time.time()
+            return json.loads(json.dumps(entry['device']))
+    
+    def store(self, mac: str, ip: str, signature: str, device: Dict[str, Any]):
+        """Remember a freshly scanned device."""
+        now = time.time()
+        with self._lock:
+            key = self.key(mac, ip)
+            self.entries[key] = {
+                'signature': signature,
+                'stored_at': now,
+                'last_used': now,
+                'device': device,
+            }
+            self._updated.add(key)
+    
+    def export_updates(self) -> Dict[str, Any]:
+        """Entries stored during this run plus counters, for merging elsewhere."""
+        with self._lock:
+            return {
+                'entries': {k: self.entries[k] for k in self._updated if k in self.entries},
+                'stats': dict(self.stats),
+            }
+    
+    def merge(self, updates: Dict[str, Any]):
+        """Fold in the updates a segment worker process made to its copy."""
+        with self._lock:
+            self.entries.update(updates['entries'])
+            for name, count in updates['stats'].items():
+                self.stats[name] += count
+    
+    def save(self):
+        """Evict expired and least recently used entries, then write atomically."""
+        with self._lock:
+            now = time.time()
+            expired = [k for k, e in self.entries.items() if now - e['stored_at'] > self.ttl]
+            for k in expired:
+                del self.entries[k]
+            overflow = len(self.entries) - self.max_entries
+            if overflow > 0:
+                for k in sorted(self.entries, key=lambda k: self.entries[k]['last_used'])[:overflow]:
+                    del self.entries[k]
+            self.stats['evicted'] += len(expired) + max(0, overflow)
+            
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_name(self.path.name + '.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump({'version': self.VERSION, 'entries': self.entries}, f)
+            os.replace(tmp_path, self.path)
+    
+    def summary(self) -> Dict[str, Any]:
+        """Hit/miss/stale counters for scan_metadata."""
+        return {'path': str(self.path), 'entries': len(self.entries), **self.stats}
+
+
+class ScanJournal:
+    """Append-only JSON-lines checkpoint of a scan in progress.
+    
+    Every completed host is written (and flushed to the OS) as soon as it
+    is recorded, so an interrupted run can be resumed with only the
+    pending hosts rescanned. fsync is batched by record count and time to
+    keep durable writes out of the scan loop's way.
+    """
+    
+    def __init__(self, path: Path, fsync_every: int = 32, fsync_interval: float = 2.0):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._file = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def for_output(cls, output_file: str) -> 'ScanJournal':
+        """Journal path that sits next to the --output file."""
+        output_path = Path(output_file)
+        return cls(output_path.parent / f"{output_path.stem}.journal.jsonl")
+    
+    def load(self) -> Dict[str, Any]:
+        """Replay an existing journal into {'discovery': ..., 'devices': {...}, 'failed': {...}}.
+        
+        Only clean results count as finished: hosts whose latest record
+        carries a scan_error (nmap deadline, failed run) go to ``failed``
+        so a resumed scan tries them again.
+        """
+        state: Dict[str, Any] = {'discovery': None, 'devices': {}, 'failed': set()}
+        bluetooth = None
+        if not self.path.exists():
+            return state
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn final line from a hard kill; everything before it is intact
+                    break
+                if record.get('type') == 'discovery':
+                    state['discovery'] = record
+                elif record.get('type') == 'bluetooth':
+                    bluetooth = record
+                elif record.get('type') == 'device':
+                    device = record['device']
+                    if 'scan_error' in device:
+                        state['devices'].pop(device['ip'], None)
+                        state['failed'].add(device['ip'])
+                    else:
+                        state['devices'][device['ip']] = device
+                        state['failed'].discard(device['ip'])
+        # The Bluetooth scan runs alongside discovery, so its record may come first or not at all
+        if state['discovery'] is not None and bluetooth is not None:
+            state['discovery']['bluetooth_devices'] = bluetooth['bluetooth_devices']
+        return state
+    
+    def open(self, append: bool):
+        """Start writing, continuing an existing journal when resuming."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'a' if append else 'w')
+    
+    def append(self, record: Dict[str, Any]):
+        """Write one record; fsync once enough records or time have piled up."""
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(json.dumps(record) + '\n')
+            self._file.flush()
+            self._unsynced += 1
+            if (self._unsynced >= self.fsync_every
+                    or time.monotonic() - self._last_sync >= self.fsync_interval):
+                self._sync()
+    
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+    
+    def close(self):
+        """Flush outstanding records to disk and stop writing."""
+        with self._lock:
+            if self._file is None:
+                return
+            self._sync()
+            self._file.close()
+            self._file = None
+    
+    def discard(self):
+        """Remove the journal once the final results are safely saved."""
+        self.close()
+        if self.path.exists():
+            self.path.unlink()
+
+
+class NdjsonResultWriter:
+    """Streams scan results as newline-delimited JSON.
+    
+    One {"type": "device"} record is written and flushed per device as soon
+    as it is recorded, so readers can tail the file during the scan. The
+    metadata, topology, Bluetooth and generated formats follow as trailing
+    records once the scan is saved.
+    """
+    
+    def __init__(self, path: Path):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+    
+    def open(self):
+        """Create (or truncate) the output file."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'w')
+    
+    def write(self, record_type: str, payload: Dict[str, Any]):
+        """Write one record and flush it so tailing readers see it at once."""
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(json.dumps({'type': record_type, **payload}) + '\n')
+            self._file.flush()
+    
+    def write_device(self, device_info: Dict[str, Any]):
+        """Emit a completed device record."""
+        self.write('device', {'ip': device_info['ip'], 'device': device_info})
+    
+    def write_lazy(self, record_type: str, value: Any):
+        """Write a {"type": record_type, record_type: value} record, streaming value (see JsonStream)."""
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(f'{{"type": {json.dumps(record_type)}, {json.dumps(record_type)}: ')
+            JsonStream(self._file, indent=None).write(value)
+            self._file.write('}\n')
+            self._file.flush()
+    
+    def close(self):
+        """Close the output file."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def _load_yaml() -> Any:
+    """Import PyYAML on first use; returns None when it is not installed."""
+    if find_spec('yaml') is None:
+        return None
+    import yaml
+    return yaml
+
+
+class LazyMap(NamedTuple):
+    """A mapping written item by item by JsonStream/YamlStream.
+    
+    ``pairs`` may be a generator, consumed once in order. Writers never
+    hold more than one batch of it, so large sections (devices, nodes,
+    services) are not materialised as a whole.
+    """
+    pairs: Iterable[Tuple[str, Any]]
+
+
+class LazyList(NamedTuple):
+    """A sequence written item by item by JsonStream/YamlStream."""
+    items: Iterable[Any]
+
+
+class JsonStream:
+    """Writes JSON identical to json.dump(value, indent=...) incrementally.
+    
+    Plain values are encoded in one piece; LazyMap/LazyList values are
+    encoded one item at a time as their generators produce them.
+    """
+    
+    def __init__(self, out: Any, indent: Optional[int] = 2):
+        self.out = out
+        self.indent = indent
+    
+    def write(self, value: Any, level: int = 0):
+        if isinstance(value, LazyMap):
+            self._container('{', '}', ((f"{json.dumps(key)}: ", item) for key, item in value.pairs), level)
+        elif isinstance(value, LazyList):
+            self._container('[', ']', (('', item) for item in value.items), level)
+        else:
+            text = json.dumps(value, indent=self.indent)
+            if self.indent and level and '\n' in text:
+                text = text.replace('\n', '\n' + ' ' * (self.indent * level))
+            self.out.write(text)
+    
+    def _container(self, opening: str, closing: str, entries: Iterable[Tuple[str, Any]], level: int):
+        if self.indent is None:
+            newline, separator = '', ', '
+        else:
+            newline, separator = '\n' + ' ' * (self.indent * (level + 1)), ','
+        first = True
+        for prefix, item in entries:
+            self.out.write(opening + newline + prefix if first else separator + newline + prefix)
+            first = False
+            self.write(item, level + 1)
+        if first:
+            self.out.write(opening + closing)
+        elif self.indent is None:
+            self.out.write(closing)
+        else:
+            self.out.write('\n' + ' ' * (self.indent * level) + closing)
+
+
+class YamlStream:
+    """Block-style YAML writer for LazyMap/LazyList trees.
+    
+    Output matches yaml.dump(..., default_flow_style=False): keys of
+    eagerly listed mappings are sorted, and generators must already yield
+    their keys in sorted order. Plain values are emitted in batches with
+    the libyaml C emitter (CSafeDumper) when PyYAML was built with it.
+    """
+    
+    def __init__(self, out: Any, yaml_module: Any, batch_size: int = 512):
+        self.out = out
+        self.yaml = yaml_module
+        self.dumper = getattr(yaml_module, 'CSafeDumper', yaml_module.SafeDumper)
+        self.batch_size = batch_size
+    
+    def write(self, value: LazyMap):
+        self._mapping(value, None, 0)
+    
+    def _dump(self, value: Any, indent: int):
+        text = self.yaml.dump(value, Dumper=self.dumper, default_flow_style=False)
+        if indent:
+            # Blank lines inside multi-line scalars stay empty, as the emitter writes them
+            text = re.sub(r'(?m)^(?=.)', ' ' * indent, text)
+        self.out.write(text)
+    
+    def _mapping(self, value: LazyMap, key: Optional[str], level: int):
+        pairs = value.pairs
+        if isinstance(pairs, list):
+            pairs = sorted(pairs, key=lambda pair: pair[0])
+        child = level if key is None else level + 1
+        started = key is None
+        batch: Dict[str, Any] = {}
+        for name, item in pairs:
+            nested = isinstance(item, (LazyMap, LazyList))
+            if batch and (nested or len(batch) >= self.batch_size):
+                started = self._emit(batch, key, level, started, child * 2)
+                batch = {}
+            if nested:
+                if not started:
+                    self._header(key, level)
+                    started = True
+                if isinstance(item, LazyMap):
+                    self._mapping(item, name, child)
+                else:
+                    self._sequence(item, name, child)
+            else:
+                batch[name] = item
+        if batch:
+            started = self._emit(batch, key, level, started, child * 2)
+        if not started:
+            self._header(key, level, ' {}')
+    
+    def _sequence(self, value: LazyList, key: str, level: int):
+        # Block sequences under a key are not indented ("key:\n- item")
+        started = False
+        batch: List[Any] = []
+        for item in value.items:
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                started = self._emit(batch, key, level, started, level * 2)
+                batch = []
+        if batch:
+            started = self._emit(batch, key, level, started, level * 2)
+        if not started:
+            self._header(key, level, ' []')
+    
+    def _emit(self, chunk: Any, key: Optional[str], level: int, started: bool, indent: int) -> bool:
+        if not started:
+            self._header(key, level)
+        self._dump(chunk, indent)
+        return True
+    
+    def _header(self, key: str, level: int, value: str = ''):
+        # The key as the emitter would write it (quoted if it needs to be)
+        text = self.yaml.dump(key, Dumper=self.dumper).split('\n', 1)[0]
+        self.out.write(f"{' ' * (level * 2)}{text}:{value}\n")
+
+
+class SqliteResultSink:
+    """Bulk loads scan results into an Inspector Twin project store.
+    
+    Everything is written in one WAL-mode transaction, so the app never
+    sees a half-loaded scan. Devices are upserted into ``scan_devices``
+    keyed on (project, IP, MAC) with batched executemany over one cached
+    prepared statement: repeated scans update rows in place, keeping each
+    device's id and first_seen_at. The scan's twin graph replaces the
+    project's "Network Scan" topology, and one ``network_scans`` row keeps
+    the metadata and the generated containerlab / compose formats.
+    """
+    
+    # Mirrors migration 003 in packages/project-store/src/migrations.ts
+    MIGRATION = '003_add_scan_inventory'
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS network_scans (
+          id TEXT PRIMARY KEY,
+          project_id TEXT NOT NULL,
+          topology_id TEXT,
+          scan_time TEXT,
+          device_count INTEGER NOT NULL,
+          metadata_json TEXT NOT NULL,
+          containerlab_json TEXT,
+          docker_compose_json TEXT,
+          created_at TEXT NOT NULL,
+          FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE,
+          FOREIGN KEY (topology_id) REFERENCES topologies(id) ON DELETE SET NULL
+        );
+        
+        CREATE TABLE IF NOT EXISTS scan_devices (
+          id TEXT PRIMARY KEY,
+          project_id TEXT NOT NULL,
+          scan_id TEXT,
+          ip TEXT NOT NULL,
+          mac TEXT NOT NULL DEFAULT '',
+          hostname TEXT,
+          device_type TEXT,
+          os_name TEXT,
+          open_ports_json TEXT NOT NULL,
+          device_json TEXT NOT NULL,
+          first_seen_at TEXT NOT NULL,
+          last_seen_at TEXT NOT NULL,
+          UNIQUE (project_id, ip, mac),
+          FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE,
+          FOREIGN KEY (scan_id) REFERENCES network_scans(id) ON DELETE SET NULL
+        );
+        
+        CREATE INDEX IF NOT EXISTS idx_network_scans_project_id ON network_scans(project_id);
+        CREATE INDEX IF NOT EXISTS idx_scan_devices_project_id ON scan_devices(project_id);
+        CREATE INDEX IF NOT EXISTS idx_scan_devices_mac ON scan_devices(mac)
+    """
+    DEVICE_UPSERT = """
+        INSERT INTO scan_devices (
+          id, project_id, scan_id, ip, mac, hostname, device_type, os_name,
+          open_ports_json, device_json, first_seen_at, last_seen_at
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (project_id, ip, mac) DO UPDATE SET
+          scan_id = excluded.scan_id,
+          hostname = excluded.hostname,
+          device_type = excluded.device_type,
+          os_name = excluded.os_name,
+          open_ports_json = excluded.open_ports_json,
+          device_json = excluded.device_json,
+          last_seen_at = excluded.last_seen_at
+    """
+    TOPOLOGY_NAME = 'Network Scan'
+    
+    def __init__(self, path: Path, project_id: str, batch_size: int = 1000):
+        self.path = path
+        self.project_id = project_id
+        self.batch_size = max(1, batch_size)
+    
+    @staticmethod
+    def _now() -> str:
+        # Same format as the app's new Date().toISOString()
+        return datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+    
+    @staticmethod
+    def _json(value: Any) -> str:
+        import io
+        
+        buffer = io.StringIO()
+        JsonStream(buffer, indent=None).write(value)
+        return buffer.getvalue()
+    
+    def write(self, devices: Iterable[Device], graph: LazyMap, metadata: Dict[str, Any],
+              formats: Dict[str, LazyMap]) -> Dict[str, Any]:
+        """Load one scan; returns the scan and topology ids and the device count."""
+        import sqlite3
+        import uuid
+        
+        if not self.path.exists():
+            raise FileNotFoundError(f"project store {self.path} does not exist")
+        now = self._now()
+        conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+        try:
+            conn.execute('PRAGMA foreign_keys = ON')
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._migrate(conn)
+                self._ensure_project(conn, now)
+                topology_id = self._upsert_topology(conn, graph, now)
+                scan_id = str(uuid.uuid4())
+                conn.execute(
+                    'INSERT INTO network_scans (id, project_id, topology_id, scan_time, device_count, '
+                    'metadata_json, containerlab_json, docker_compose_json, created_at) '
+                    'VALUES (?, ?, ?, ?, 0, ?, ?, ?, ?)',
+                    (scan_id, self.project_id, topology_id, metadata.get('scan_time'),
+                     json.dumps(metadata, default=str), self._json(formats['containerlab']),
+                     self._json(formats['docker_compose']), now),
+                )
+                count = self._upsert_devices(conn, devices, scan_id, now)
+                conn.execute('UPDATE network_scans SET device_count = ? WHERE id = ?', (count, scan_id))
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        finally:
+            conn.close()
+        return {'scan_id': scan_id, 'topology_id': topology_id, 'devices': count}
+    
+    def _migrate(self, conn: Any):
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if not {'migrations', 'projects', 'topologies'} <= tables:
+            raise ValueError(f"{self.path} is not an Inspector Twin project store (open it in the app once first)")
+        if conn.execute('SELECT 1 FROM migrations WHERE name = ?', (self.MIGRATION,)).fetchone():
+            return
+        # executescript() would commit the open transaction, so run statement by statement
+        for statement in self.SCHEMA.split(';'):
+            if statement.strip():
+                conn.execute(statement)
+        conn.execute('INSERT INTO migrations (name) VALUES (?)', (self.MIGRATION,))
+    
+    def _ensure_project(self, conn: Any, now: str):
+        cursor = conn.execute(
+            'INSERT OR IGNORE INTO projects (id, name, description, created_at, updated_at) VALUES (?, ?, ?, ?, ?)',
+            (self.project_id, self.project_id, 'Created by network-topology-mapper', now, now),
+        )
+        if cursor.rowcount:
+            print(f"  Created project {self.project_id}")
+    
+    def _upsert_topology(self, conn: Any, graph: LazyMap, now: str) -> str:
+        import uuid
+        
+        # One scan topology per project, so reruns replace it instead of piling up copies
+        topology_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"inspector-twin:scan-topology:{self.project_id}"))
+        conn.execute(
+            'INSERT INTO topologies (id, project_id, name, graph_json, created_at, updated_at) '
+            'VALUES (?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (id) DO UPDATE SET graph_json = excluded.graph_json, updated_at = excluded.updated_at',
+            (topology_id, self.project_id, self.TOPOLOGY_NAME, self._json(graph), now, now),
+        )
+        return topology_id
+    
+    def _device_rows(self, devices: Iterable[Device], scan_id: str, now: str) -> Iterator[Tuple[Any, ...]]:
+        import uuid
+        
+        for device in devices:
+            yield (
+                str(uuid.uuid4()), self.project_id, scan_id, device.ip, (device.mac or '').lower(),
+                device.hostname, device.device_type, device.os_detection.get('name'),
+                json.dumps(device.ports), json.dumps(device.to_dict()), now, now,
+            )
+    
+    def _upsert_devices(self, conn: Any, devices: Iterable[Device], scan_id: str, now: str) -> int:
+        from itertools import islice
+        
+        rows = self._device_rows(devices, scan_id, now)
+        count = 0
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                return count
+            conn.executemany(self.DEVICE_UPSERT, batch)
+            count += len(batch)
+
+
+class ScanArchive:
+    """Compressed, content-addressed history of scan results in one SQLite file.
+    
+    Each device record is split into its stable state and the fields that
+    change on every scan (scan_time, uptime, traceroute RTTs). The stable
+    state is stored once per distinct SHA-256, zlib-compressed against a
+    shared preset dictionary, with its open ports indexed. A scan is then
+    a row per device pointing at that state, indexed by IP, MAC and time,
+    so unchanged devices cost one small row per scan, and history and diff
+    queries only decompress states that actually differ.
+    """
+    
+    SCHEMA_VERSION = 1
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value BLOB NOT NULL);
+        CREATE TABLE IF NOT EXISTS scans (
+          id INTEGER PRIMARY KEY,
+          scan_time TEXT NOT NULL UNIQUE,
+          source TEXT,
+          device_count INTEGER NOT NULL,
+          metadata_id INTEGER NOT NULL REFERENCES objects(id),
+          topology_id INTEGER REFERENCES objects(id),
+          archived_at TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS objects (
+          id INTEGER PRIMARY KEY,
+          hash BLOB NOT NULL UNIQUE,
+          data BLOB NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS object_ports (
+          object_id INTEGER NOT NULL,
+          port INTEGER NOT NULL,
+          PRIMARY KEY (port, object_id)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS observations (
+          scan_id INTEGER NOT NULL,
+          ip TEXT NOT NULL,
+          mac TEXT NOT NULL,
+          object_id INTEGER NOT NULL,
+          volatile TEXT,
+          PRIMARY KEY (scan_id, ip)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_observations_ip ON observations(ip, scan_id);
+        CREATE INDEX IF NOT EXISTS idx_observations_mac ON observations(mac, scan_id);
+        CREATE INDEX IF NOT EXISTS idx_observations_object ON observations(object_id)
+    """
+    # Preset compression dictionary: the boilerplate every device record repeats.
+    # Stored in each archive when it is created, so changing it never breaks old archives.
+    ZDICT = (
+        b'{"accuracy":"100%","family":"Linux","generation":"5.X","name":"Linux 5.4 - 5.15","type":"general purpose",'
+        b'"vendor":"Linux"}{"accuracy":"95%","family":"Windows","generation":"10","name":"Microsoft Windows 10",'
+        b'"vendor":"Microsoft"}"cpe:/o:linux:linux_kernel","cpe:/a:openbsd:openssh","cpe:/o:microsoft:windows"'
+        b'{"cpe":[],"extrainfo":"","port":443,"product":"","protocol":"tcp","service":"https","state":"open",'
+        b'"version":""},{"cpe":[],"extrainfo":"protocol 2.0","port":22,"product":"OpenSSH","protocol":"tcp",'
+        b'"service":"ssh","state":"open","version":""},{"port":80,"protocol":"tcp","state":"open"},'
+        b'{"port":443,"protocol":"tcp","state":"open"},{"port":22,"protocol":"tcp","state":"open"}],'
+        b'"services":[{"cpe":[],"extrainfo":"","port":80,"product":"nginx","protocol":"tcp","service":"http",'
+        b'"state":"open","version":""}],"traceroute":[{"hostname":"","ip":"192.168.1.1","ttl":"1"},'
+        b'{"hostname":"","ip":"10.0.0.1","ttl":"2"}],"discovered_by":"arp_raw","distance_hops":1,'
+        b'"device_type":"general purpose","hostname":"","ip":"192.168.1.","mac":"00:11:22:33:44:55",'
+        b'"os_detection":{},"ports":[{"port":'
+    )
+    VOLATILE = ('scan_time', 'uptime_seconds')
+    
+    def __init__(self, path: Path):
+        self.path = path
+        self.conn: Any = None
+        self._zdict = b''
+    
+    def __enter__(self) -> 'ScanArchive':
+        import sqlite3
+        
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path), isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        for statement in self.SCHEMA.split(';'):
+            if statement.strip():
+                self.conn.execute(statement)
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'zdict'").fetchone()
+        if row is None:
+            self.conn.execute("INSERT INTO meta (key, value) VALUES ('zdict', ?)", (self.ZDICT,))
+            self.conn.execute("INSERT INTO meta (key, value) VALUES ('schema_version', ?)", (self.SCHEMA_VERSION,))
+            row = (self.ZDICT,)
+        self._zdict = bytes(row[0])
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.conn.close()
+        self.conn = None
+    
+    # Storage
+    
+    def _compress(self, data: bytes) -> bytes:
+        import zlib
+        
+        compressor = zlib.compressobj(9, zdict=self._zdict)
+        return compressor.compress(data) + compressor.flush()
+    
+    def _decompress(self, blob: bytes) -> Any:
+        import zlib
+        
+        decompressor = zlib.decompressobj(zdict=self._zdict)
+        return json.loads(decompressor.decompress(blob) + decompressor.flush())
+    
+    def _store(self, value: Any, ports: Optional[Iterable[int]] = None) -> int:
+        """Id of the object holding ``value``, adding it if it is new."""
+        data = json.dumps(value, sort_keys=True, separators=(',', ':'), default=str).encode()
+        digest = hashlib.sha256(data).digest()
+        row = self.conn.execute('SELECT id FROM objects WHERE hash = ?', (digest,)).fetchone()
+        if row is not None:
+            return row[0]
+        object_id = self.conn.execute(
+            'INSERT INTO objects (hash, data) VALUES (?, ?)', (digest, self._compress(data))
+        ).lastrowid
+        if ports:
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO object_ports (object_id, port) VALUES (?, ?)',
+                ((object_id, port) for port in set(ports)),
+            )
+        return object_id
+    
+    def _load(self, object_id: Optional[int]) -> Any:
+        if object_id is None:
+            return None
+        return self._decompress(self.conn.execute('SELECT data FROM objects WHERE id = ?', (object_id,)).fetchone()[0])
+    
+    @classmethod
+    def split_device(cls, device: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+        """(stable state, per-scan fields) of a device record."""
+        stable = dict(device)
+        volatile = {key: stable.pop(key) for key in cls.VOLATILE if key in stable}
+        if stable.get('traceroute'):
+            hops = [dict(hop) for hop in stable['traceroute']]
+            rtts = [hop.pop('rtt', None) for hop in hops]
+            if any(rtt is not None for rtt in rtts):
+                volatile['rtt'] = rtts
+            stable['traceroute'] = hops
+        return stable, volatile or None
+    
+    @staticmethod
+    def join_device(stable: Dict[str, Any], volatile: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Inverse of split_device()."""
+        device = dict(stable)
+        if volatile:
+            rtts = volatile.get('rtt')
+            if rtts is not None:
+                device['traceroute'] = [
+                    hop if rtt is None else {**hop, 'rtt': rtt} for hop, rtt in zip(device['traceroute'], rtts)
+                ]
+            device.update((key, value) for key, value in volatile.items() if key != 'rtt')
+        return device
+    
+    @staticmethod
+    def open_ports(device: Dict[str, Any]) -> List[int]:
+        return [
+            entry['port'] for entry in device.get('ports', [])
+            if isinstance(entry, dict) and entry.get('state', 'open') == 'open' and type(entry.get('port')) is int
+        ]
+    
+    def add_scan(self, metadata: Dict[str, Any], devices: Iterable[Dict[str, Any]],
+                 source: Optional[str] = None) -> Optional[int]:
+        """Archive one scan in a single transaction; None if it was already archived."""
+        scan_time = metadata.get('scan_time') or datetime.now().isoformat()
+        if self.conn.execute('SELECT 1 FROM scans WHERE scan_time = ?', (scan_time,)).fetchone():
+            return None
+        rest = {key: value for key, value in metadata.items() if key not in ('scan_time', 'topology')}
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            topology = metadata.get('topology')
+            scan_id = self.conn.execute(
+                'INSERT INTO scans (scan_time, source, device_count, metadata_id, topology_id, archived_at) '
+                'VALUES (?, ?, 0, ?, ?, ?)',
+                (scan_time, source, self._store(rest), None if topology is None else self._store(topology),
+                 datetime.now().isoformat()),
+            ).lastrowid
+            rows = []
+            for device in devices:
+                stable, volatile = self.split_device(device)
+                rows.append((
+                    scan_id, device['ip'], (device.get('mac') or '').lower(),
+                    self._store(stable, self.open_ports(stable)),
+                    None if volatile is None else json.dumps(volatile, separators=(',', ':')),
+                ))
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO observations (scan_id, ip, mac, object_id, volatile) VALUES (?, ?, ?, ?, ?)',
+                rows,
+            )
+            self.conn.execute('UPDATE scans SET device_count = ? WHERE id = ?', (len(rows), scan_id))
+            self.conn.execute('COMMIT')
+        except BaseException:
+            self.conn.execute('ROLLBACK')
+            raise
+        return scan_id
+    
+    # Queries
+    
+    def scans(self) -> List[Tuple[int, str, int, Optional[str]]]:
+        """(id, scan_time, device_count, source) of every scan, oldest first."""
+        return self.conn.execute(
+            'SELECT id, scan_time, device_count, source FROM scans ORDER BY scan_time'
+        ).fetchall()
+    
+    def resolve(self, ref: str) -> Tuple[int, str]:
+        """(id, scan_time) for 'latest', a scan id ('#12' or '12') or the latest scan whose time starts with ``ref``.
+        
+        A bare number that is not a scan id is a time prefix: '2025' is the last scan of 2025.
+        """
+        row = None
+        if ref == 'latest':
+            row = self.conn.execute('SELECT id, scan_time FROM scans ORDER BY scan_time DESC LIMIT 1').fetchone()
+        elif ref.startswith('#') and ref[1:].isdigit():
+            row = self.conn.execute('SELECT id, scan_time FROM scans WHERE id = ?', (int(ref[1:]),)).fetchone()
+        else:
+            if ref.isdigit():
+                row = self.conn.execute('SELECT id, scan_time FROM scans WHERE id = ?', (int(ref),)).fetchone()
+            if row is None:
+                row = self.conn.execute(
+                    'SELECT id, scan_time FROM scans WHERE scan_time >= ? AND scan_time < ? '
+                    'ORDER BY scan_time DESC LIMIT 1',
+                    (ref, ref + '￿'),
+                ).fetchone()
+        if row is None:
+            raise KeyError(f"no archived scan matches {ref!r}")
+        return row
+    
+    def _host_column(self, host: str) -> Tuple[str, str]:
+        if re.fullmatch(r'[0-9A-Fa-f]{2}([:-][0-9A-Fa-f]{2}){5}', host):
+            return 'mac', host.lower().replace('-', ':')
+        return 'ip', host
+    
+    def host_history(self, host: str) -> List[Dict[str, Any]]:
+        """Every change to a device (by IP or MAC) across all scans, oldest first.
+        
+        Each entry covers a run of scans with the same state: its first and
+        last scan time, the stable state (None while absent) and the
+        changes from the previous state.
+        """
+        column, value = self._host_column(host)
+        seen = dict(
+            (scan_id, (ip, object_id)) for scan_id, ip, object_id in self.conn.execute(
+                f'SELECT scan_id, ip, object_id FROM observations WHERE {column} = ?', (value,)
+            )
+        )
+        history: List[Dict[str, Any]] = []
+        current: Any = 'unset'
+        previous_state = None
+        for scan_id, scan_time, _count, _source in self.scans():
+            ip, object_id = seen.get(scan_id, (None, None))
+            key = (ip, object_id)
+            if key == current:
+                history[-1]['last_scan_time'] = scan_time
+                history[-1]['scans'] += 1
+                continue
+            if current == 'unset' and object_id is None:
+                continue  # before the device first appeared
+            current = key
+            state = self._load(object_id)
+            history.append({
+                'scan_id': scan_id,
+                'scan_time': scan_time,
+                'last_scan_time': scan_time,
+                'ip': ip,
+                'present': object_id is not None,
+                'scans': 1,
+                'changes': self.device_changes(previous_state, state) if state is not None else ['not seen'],
+                'state': state,
+            })
+            if state is not None:
+                previous_state = state
+        return history
+    
+    def port_history(self, port: int, host: Optional[str] = None) -> List[Dict[str, Any]]:
+        """First and last scan each device (optionally one IP/MAC) had ``port`` open."""
+        query = (
+            'SELECT o.ip, MIN(s.scan_time), MAX(s.scan_time), COUNT(*) FROM object_ports p '
+            'JOIN observations o ON o.object_id = p.object_id JOIN scans s ON s.id = o.scan_id '
+            'WHERE p.port = ?'
+        )
+        params: List[Any] = [port]
+        if host:
+            column, value = self._host_column(host)
+            query += f' AND o.{column} = ?'
+            params.append(value)
+        query += ' GROUP BY o.ip ORDER BY MIN(s.scan_time)'
+        return [
+            {'ip': ip, 'first_seen': first, 'last_seen': last, 'scans': scans}
+            for ip, first, last, scans in self.conn.execute(query, params)
+        ]
+    
+    def diff(self, old_ref: str, new_ref: str) -> Dict[str, Any]:
+        """Devices added, removed and changed between two scans.
+        
+        Devices are matched by IP and compared by state id, so only the
+        states of changed devices are decompressed.
+        """
+        old_id, old_time = self.resolve(old_ref)
+        new_id, new_time = self.resolve(new_ref)
+        query = 'SELECT ip, mac, object_id FROM observations WHERE scan_id = ?'
+        old = {ip: (mac, object_id) for ip, mac, object_id in self.conn.execute(query, (old_id,))}
+        new = {ip: (mac, object_id) for ip, mac, object_id in self.conn.execute(query, (new_id,))}
+        
+        added = []
+        changed = []
+        for ip, (mac, object_id) in new.items():
+            if ip not in old:
+                state = self._load(object_id)
+                added.append({'ip': ip, 'mac': mac, 'ports': self.open_ports(state)})
+            elif old[ip][1] != object_id:
+                changes = self.device_changes(self._load(old[ip][1]), self._load(object_id))
+                changed.append({'ip': ip, 'mac': mac, 'changes': changes})
+        removed = [{'ip': ip, 'mac': mac} for ip, (mac, _object_id) in old.items() if ip not in new]
+        key = lambda entry: _ip_sort_key(entry['ip'])  # noqa: E731
+        return {
+            'old': {'id': old_id, 'scan_time': old_time, 'devices': len(old)},
+            'new': {'id': new_id, 'scan_time': new_time, 'devices': len(new)},
+            'added': sorted(added, key=key),
+            'removed': sorted(removed, key=key),
+            'changed': sorted(changed, key=key),
+            'unchanged': len(new) - len(added) - len(changed),
+        }
+    
+    @classmethod
+    def device_changes(cls, old: Optional[Dict[str, Any]], new: Dict[str, Any]) -> List[str]:
+        """Readable differences between two stable device states."""
+        if old is None:
+            ports = ', '.join(map(str, cls.open_ports(new))) or 'none'
+            return [f"first seen: ports {ports}"]
+        changes = []
+        old_ports, new_ports = set(cls.open_ports(old)), set(cls.open_ports(new))
+        if old_ports != new_ports:
+            delta = [f"+{port}" for port in sorted(new_ports - old_ports)]
+            delta += [f"-{port}" for port in sorted(old_ports - new_ports)]
+            changes.append(f"ports {' '.join(delta)}")
+        old_services = {service.get('port'): service for service in old.get('services', [])}
+        for service in new.get('services', []):
+            before = old_services.get(service.get('port'))
+            if before is None or before == service:
+                continue
+            describe = lambda s: ' '.join(filter(None, (s.get('service'), s.get('product'), s.get('version'))))  # noqa: E731
+            changes.append(f"service {service.get('port')}: {describe(before) or '?'} → {describe(service) or '?'}")
+        old_os = (old.get('os_detection') or {}).get('name', '')
+        new_os = (new.get('os_detection') or {}).get('name', '')
+        if old_os != new_os:
+            changes.append(f"os: {old_os or '?'} → {new_os or '?'}")
+        for key in ('mac', 'hostname', 'device_type', 'distance_hops'):
+            if old.get(key) != new.get(key):
+                changes.append(f"{key}: {old.get(key) or '?'} → {new.get(key) or '?'}")
+        handled = {'ports', 'services', 'os_detection', 'mac', 'hostname', 'device_type', 'distance_hops'}
+        other = sorted(key for key in set(old) | set(new) if key not in handled and old.get(key) != new.get(key))
+        if other:
+            changes.append(f"changed: {', '.join(other)}")
+        return changes
+    
+    def scan_results(self, ref: str) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]:
+        """(scan metadata, devices by IP) of an archived scan, as originally saved."""
+        scan_id, scan_time = self.resolve(ref)
+        metadata_id, topology_id = self.conn.execute(
+            'SELECT metadata_id, topology_id FROM scans WHERE id = ?', (scan_id,)
+        ).fetchone()
+        metadata = {'scan_time': scan_time, **self._load(metadata_id)}
+        if topology_id is not None:
+            metadata['topology'] = self._load(topology_id)
+        states: Dict[int, Dict[str, Any]] = {}
+        devices = {}
+        for ip, object_id, volatile in self.conn.execute(
+            'SELECT ip, object_id, volatile FROM observations WHERE scan_id = ?', (scan_id,)
+        ):
+            if object_id not in states:
+                states[object_id] = self._load(object_id)
+            devices[ip] = self.join_device(states[object_id], json.loads(volatile) if volatile else None)
+        return metadata, devices
+    
+    @staticmethod
+    def read_results(path: Path) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """(metadata, device records) from a saved JSON or NDJSON results file."""
+        with open(path) as f:
+            first = f.readline()
+            f.seek(0)
+            if first.startswith('{"type"'):
+                metadata: Dict[str, Any] = {}
+                devices: Dict[str, Dict[str, Any]] = {}
+                for line in f:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    if record['type'] == 'device':
+                        devices[record['ip']] = record['device']
+                    elif record['type'] == 'metadata':
+                        metadata = record['metadata']
+                return metadata, list(devices.values())
+            results = json.load(f)
+        metadata = dict(results.get('metadata', {}))
+        metadata.setdefault('topology', results.get('topology'))
+        return metadata, list(results.get('devices', {}).values())
+
+
+class NmapJob(NamedTuple):
+    """One nmap invocation over a host group."""
+    kind: str  # 'sweep', 'deep' or 'probe'
+    targets: List[str]
+    cmd: List[str]
+    timeout: float
+
+
+class AdaptiveConcurrency:
+    """AIMD limit on how many nmap processes run at once.
+    
+    Jobs that finish cleanly and well inside their deadline raise the limit
+    additively (about +1 per ``limit`` fast completions). When the share of
+    failed jobs (timeouts, non-zero exit codes) in the recent window climbs
+    past ``failure_threshold`` the limit is halved. Jobs started before the
+    last decrease cannot trigger another one, so a single congested burst
+    backs off once instead of collapsing to the minimum. The failure rate
+    is only judged once ``min_samples`` outcomes have been seen.
+    """
+    
+    def __init__(
+        self,
+        initial: int,
+        minimum: int = 1,
+        maximum: Optional[int] = None,
+        adaptive: bool = True,
+        window: int = 20,
+        min_samples: int = 5,
+        failure_threshold: float = 0.2,
+        fast_fraction: float = 0.5,
+    ):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum or initial)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.adaptive = adaptive
+        self.min_samples = min_samples
+        self.failure_threshold = failure_threshold
+        self.fast_fraction = fast_fraction
+        self.active = 0
+        self.peak = int(self.limit)
+        self.increases = 0
+        self.decreases = 0
+        self.busy_seconds = 0.0
+        self._outcomes: deque = deque(maxlen=window)
+        self._last_decrease = float('-inf')
+        self._changed: Optional['asyncio.Condition'] = None
+    
+    async def acquire(self) -> float:
+        """Wait for a free slot; returns the job's start time."""
+        import asyncio
+        
+        if self._changed is None:
+            self._changed = asyncio.Condition()
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.active < int(self.limit))
+            self.active += 1
+        return time.monotonic()
+    
+    async def release(self, started: float, ok: bool, deadline: float):
+        """Free a slot and feed the job's outcome into the controller."""
+        duration = time.monotonic() - started
+        self.busy_seconds += duration
+        self._outcomes.append(ok)
+        failure_rate = self._outcomes.count(False) / len(self._outcomes)
+        congested = len(self._outcomes) >= self.min_samples and failure_rate > self.failure_threshold
+        
+        if self.adaptive:
+            if not ok and congested and started > self._last_decrease:
+                self.limit = max(float(self.minimum), self.limit / 2)
+                self._last_decrease = time.monotonic()
+                self.decreases += 1
+            elif ok and duration < deadline * self.fast_fraction and not congested:
+                previous = int(self.limit)
+                self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+                if int(self.limit) > previous:
+                    self.increases += 1
+                    self.peak = max(self.peak, int(self.limit))
+        
+        async with self._changed:
+            self.active -= 1
+            self._changed.notify_all()
+    
+    def summary(self) -> Dict[str, Any]:
+        """Controller behaviour for scan_metadata."""
+        return {
+            'final_limit': int(self.limit),
+            'peak_limit': self.peak,
+            'range': [self.minimum, self.maximum],
+            'increases': self.increases,
+            'decreases': self.decreases,
+            'busy_seconds': round(self.busy_seconds, 3),
+        }
+
+
+class HostFeed:
+    """Bounded, deduplicating hand-off of discovered hosts to the deep scan.
+    
+    Discovery put()s each host as soon as it answers, from any thread;
+    hosts already fed are dropped. put() blocks while ``capacity`` hosts
+    are waiting, so a sweep that outruns the scanners pauses instead of
+    queueing the whole network. Hosts in ``skip`` (already scanned) are
+    never fed. The scan pulls host groups with next_group() on its event
+    loop until the feed is closed and drained.
+    """
+    
+    POLL_INTERVAL = 0.02
+    _CLOSED = object()
+    
+    def __init__(self, capacity: int, skip: Iterable[str] = ()):
+        import queue
+        
+        self.capacity = max(1, capacity)
+        self._queue: Any = queue.Queue(maxsize=self.capacity)
+        self._seen: set = set(skip)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._cancelled = threading.Event()
+        self.fed = 0
+        self.duplicates = 0
+        self.blocked_seconds = 0.0
+        self.started = time.monotonic()
+        self.first_fed: Optional[float] = None
+    
+    def put(self, device: Dict[str, Any]) -> bool:
+        """Queue a host for scanning; False if it was already fed or the scan stopped."""
+        import queue
+        
+        with self._lock:
+            if device['ip'] in self._seen:
+                self.duplicates += 1
+                return False
+            self._seen.add(device['ip'])
+        started = time.monotonic()
+        while not self._cancelled.is_set():
+            try:
+                self._queue.put(device, timeout=0.1)
+            except queue.Full:
+                continue
+            with self._lock:
+                self.blocked_seconds += time.monotonic() - started
+                self.fed += 1
+                if self.first_fed is None:
+                    self.first_fed = time.monotonic()
+            return True
+        return False
+    
+    def close(self):
+        """Signal that discovery has finished."""
+        import queue
+        
+        while not self._cancelled.is_set():
+            try:
+                self._queue.put(self._CLOSED, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+    
+    def cancel(self):
+        """Stop the hand-off (the scan ended early); blocked producers return."""
+        self._cancelled.set()
+    
+    async def next_group(self, size: int, linger: float = 0.25) -> List[Dict[str, Any]]:
+        """Up to ``size`` hosts, waiting at most ``linger`` s to fill a group; [] when done."""
+        import asyncio
+        import queue
+        
+        group: List[Dict[str, Any]] = []
+        deadline = None
+        while len(group) < size and not self._closed and not self._cancelled.is_set():
+            try:
+                device = self._queue.get_nowait()
+            except queue.Empty:
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+                await asyncio.sleep(self.POLL_INTERVAL)
+                continue
+            if device is self._CLOSED:
+                self._closed = True
+                break
+            group.append(device)
+            if deadline is None:
+                deadline = time.monotonic() + linger
+        return group
+    
+    def summary(self) -> Dict[str, Any]:
+        """Hand-off behaviour for scan_metadata."""
+        return {
+            'capacity': self.capacity,
+            'hosts': self.fed,
+            'duplicates': self.duplicates,
+            'producer_blocked_s': round(self.blocked_seconds, 3),
+            'first_host_s': round(self.first_fed - self.started, 3) if self.first_fed is not None else None,
+        }
+
+
+class TopologyGraph:
+    """Indexed L3 topology graph built from traceroute paths.
+    
+    Nodes are interned to integer ids, edges live in a hashed set (kept in
+    insertion order for stable output) with forward and reverse adjacency
+    indexes, and identical hop paths are stored once and reference counted.
+    Everything is O(1) per hop, so inference stays linear in the number of
+    traceroute hops instead of quadratic in the number of edges.
+    
+    Paths and categorizations can be withdrawn again: edges count the paths
+    that use them and nodes count the paths and categories they are in, so
+    a rescan updates the graph host by host. A node left without edges,
+    paths or categories drops out of the graph but keeps its id.
+    """
+    
+    CATEGORIES = ('routers', 'switches', 'access_points', 'endpoints')
+    
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._nodes: List[str] = []
+        self._refs: List[int] = []
+        self._edges: Dict[Tuple[int, int], str] = {}
+        self._edge_refs: Dict[Tuple[int, int], int] = {}
+        self._out: List[set] = []
+        self._in: List[set] = []
+        self._paths: Dict[Tuple[int, ...], int] = {}
+        self._categories: Dict[str, Dict[str, None]] = {name: {} for name in self.CATEGORIES}
+    
+    def node(self, ip: str) -> int:
+        """Intern an address and return its node id."""
+        node_id = self._ids.get(ip)
+        if node_id is None:
+            node_id = len(self._nodes)
+            self._ids[ip] = node_id
+            self._nodes.append(ip)
+            self._refs.append(0)
+            self._out.append(set())
+            self._in.append(set())
+        return node_id
+    
+    def _live(self, node_id: int) -> bool:
+        return bool(self._refs[node_id] or self._out[node_id] or self._in[node_id])
+    
+    def add_edge(self, src: str, dst: str, edge_type: str = 'l3_route') -> bool:
+        """Add a directed edge; returns False if it was already present."""
+        key = (self.node(src), self.node(dst))
+        if key in self._edges:
+            self._edge_refs[key] += 1
+            return False
+        self._edges[key] = edge_type
+        self._edge_refs[key] = 1
+        self._out[key[0]].add(key[1])
+        self._in[key[1]].add(key[0])
+        return True
+    
+    @staticmethod
+    def _path_edges(path: Tuple[int, ...]) -> List[Tuple[int, int]]:
+        """Edges of an interned path: consecutive responding hops, then the last one to the target."""
+        edges = []
+        prev_hop = -1
+        for hop in path[:-1]:
+            if hop >= 0 and prev_hop >= 0:
+                edges.append((prev_hop, hop))
+            prev_hop = hop
+        if prev_hop >= 0 and prev_hop != path[-1]:
+            edges.append((prev_hop, path[-1]))
+        return edges
+    
+    def add_path(self, hop_ips: Sequence[str], target: str):
+        """Add the edges of one traceroute towards ``target``.
+        
+        An empty hop (no reply) breaks the chain, and the last responding
+        hop is linked to the target. Repeated paths are only counted.
+        """
+        node = self.node
+        path = tuple([node(ip) if ip else -1 for ip in hop_ips]) + (node(target),)
+        if path in self._paths:
+            self._paths[path] += 1
+            return
+        self._paths[path] = 1
+        refs = self._refs
+        for node_id in path:
+            if node_id >= 0:
+                refs[node_id] += 1
+        edges = self._edges
+        edge_refs = self._edge_refs
+        out, into = self._out, self._in
+        for key in self._path_edges(path):
+            if key in edges:
+                edge_refs[key] += 1
+            else:
+                edges[key] = 'l3_route'
+                edge_refs[key] = 1
+                out[key[0]].add(key[1])
+                into[key[1]].add(key[0])
+        
+    def remove_path(self, hop_ips: Sequence[str], target: str):
+        """Withdraw one add_path(); edges no other path uses are removed."""
+        ids = self._ids
+        if target not in ids or any(ip and ip not in ids for ip in hop_ips):
+            return
+        path = tuple(ids[ip] if ip else -1 for ip in hop_ips) + (ids[target],)
+        refs = self._paths.get(path)
+        if refs is None:
+            return
+        if refs > 1:
+            self._paths[path] = refs - 1
+            return
+        del self._paths[path]
+        for node_id in path:
+            if node_id >= 0:
+                self._refs[node_id] -= 1
+        for key in self._path_edges(path):
+            self._edge_refs[key] -= 1
+            if not self._edge_refs[key]:
+                del self._edges[key], self._edge_refs[key]
+                self._out[key[0]].discard(key[1])
+                self._in[key[1]].discard(key[0])
+    
+    def categorize(self, ip: str, category: str):
+        """Place a device in one of the topology categories."""
+        members = self._categories[category]
+        if ip not in members:
+            members[ip] = None
+            self._refs[self.node(ip)] += 1
+    
+    def uncategorize(self, ip: str, category: str):
+        """Take a device out of a topology category."""
+        members = self._categories[category]
+        if ip in members:
+            del members[ip]
+            self._refs[self._ids[ip]] -= 1
+    
+    def category(self, name: str) -> List[str]:
+        """Devices in a category, in the order they were categorized."""
+        return list(self._categories[name])
+    
+    def neighbors(self, ip: str) -> List[str]:
+        """Addresses adjacent to ``ip`` in either direction."""
+        node_id = self._ids.get(ip)
+        if node_id is None:
+            return []
+        return [self._nodes[n] for n in self._out[node_id] | self._in[node_id]]
+    
+    def degree(self, ip: str) -> int:
+        """Number of distinct neighbours of ``ip``."""
+        node_id = self._ids.get(ip)
+        if node_id is None:
+            return 0
+        return len(self._out[node_id] | self._in[node_id])
+    
+    def degree_centrality(self) -> Dict[str, float]:
+        """Degree of every node normalised by the largest possible degree."""
+        live = [(ip, node_id) for ip, node_id in self._ids.items() if self._live(node_id)]
+        scale = max(1, len(live) - 1)
+        return {ip: len(self._out[node_id] | self._in[node_id]) / scale for ip, node_id in live}
+    
+    def transit_centrality(self) -> Dict[str, int]:
+        """How many observed traceroutes pass *through* each node.
+        
+        Computed from the interned hop paths, so it is linear in the number
+        of distinct paths; high values mark the routers everything crosses.
+        """
+        counts: Dict[int, int] = {}
+        for path, refs in self._paths.items():
+            for node_id in set(path[:-1]):
+                if node_id >= 0 and node_id != path[-1]:
+                    counts[node_id] = counts.get(node_id, 0) + refs
+        return {self._nodes[node_id]: count for node_id, count in counts.items()}
+    
+    def connections(self) -> List[Dict[str, str]]:
+        """Edges in the topology['connections'] format."""
+        nodes = self._nodes
+        return [
+            {'from': nodes[src], 'to': nodes[dst], 'type': edge_type}
+            for (src, dst), edge_type in self._edges.items()
+        ]
+    
+    @property
+    def node_count(self) -> int:
+        """Number of distinct addresses in the graph."""
+        return sum(1 for node_id in range(len(self._nodes)) if self._live(node_id))
+    
+    @property
+    def edge_count(self) -> int:
+        """Number of distinct directed edges."""
+        return len(self._edges)
+
+
+class LinuxNetworkConfig:
+    """Native Linux view of interfaces, addresses, neighbors and default routes.
+    
+    Addresses for every interface and family come from a single netlink
+    RTM_GETADDR dump (falling back to SIOCGIFADDR/SIOCGIFNETMASK ioctls and
+    /proc/net/if_inet6), the neighbor cache from an RTM_GETNEIGH dump, and
+    default routes from /proc/net/route and /proc/net/ipv6_route, so no
+    route/ifconfig/ip subprocesses are needed.
+    """
+    
+    RTM_NEWADDR = 20
+    RTM_GETADDR = 22
+    RTM_NEWNEIGH = 28
+    RTM_GETNEIGH = 30
+    NLMSG_ERROR = 2
+    NLMSG_DONE = 3
+    NLM_F_REQUEST = 0x1
+    NLM_F_DUMP = 0x300
+    IFA_ADDRESS = 1
+    IFA_LOCAL = 2
+    NDA_DST = 1
+    NDA_LLADDR = 2
+    # Neighbor states without a usable link-layer address
+    NUD_UNUSABLE = 0x01 | 0x20 | 0x40  # INCOMPLETE, FAILED, NOARP
+    SIOCGIFADDR = 0x8915
+    SIOCGIFNETMASK = 0x891B
+    
+    def __init__(self):
+        self._addresses: Optional[List[Dict[str, Any]]] = None
+    
+    def addresses(self) -> List[Dict[str, Any]]:
+        """Every IPv4/IPv6 address as {interface, family, address, prefixlen}."""
+        if self._addresses is None:
+            try:
+                self._addresses = self._netlink_addresses()
+            except OSError:
+                self._addresses = self._ioctl_addresses()
+        return self._addresses
+    
+    def _netlink_dump(self, request_type: int, body: bytes) -> Iterator[Tuple[int, bytes]]:
+        """(message type, payload) for every message of a netlink dump request."""
+        request = struct.pack('=IHHII', 16 + len(body), request_type, self.NLM_F_REQUEST | self.NLM_F_DUMP, 1, 0)
+        with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, 0) as sock:
+            sock.bind((0, 0))
+            sock.send(request + body)
+            while True:
+                for msg_type, payload in self._netlink_messages(sock.recv(65536)):
+                    if msg_type == self.NLMSG_DONE:
+                        return
+                    if msg_type == self.NLMSG_ERROR:
+                        raise OSError(f"netlink dump request {request_type} failed")
+                    yield msg_type, payload
+    
+    @classmethod
+    def _netlink_messages(cls, data: bytes) -> Iterator[Tuple[int, bytes]]:
+        """Split one netlink datagram into (message type, payload); a truncated header reads as NLMSG_DONE."""
+        offset = 0
+        while offset + 16 <= len(data):
+            msg_len, msg_type = struct.unpack_from('=IH', data, offset)
+            if msg_len < 16:
+                yield cls.NLMSG_DONE, b''
+                return
+            yield msg_type, data[offset + 16:offset + msg_len]
+            offset += (msg_len + 3) & ~3
+    
+    @staticmethod
+    def _attributes(payload: bytes, offset: int) -> Dict[int, bytes]:
+        """Route attributes (type -> value) from ``offset`` to the end of a message."""
+        attrs = {}
+        while offset + 4 <= len(payload):
+            attr_len, attr_type = struct.unpack_from('=HH', payload, offset)
+            if attr_len < 4:
+                break
+            attrs[attr_type] = payload[offset + 4:offset + attr_len]
+            offset += (attr_len + 3) & ~3
+        return attrs
+    
+    def _netlink_addresses(self) -> List[Dict[str, Any]]:
+        names = {index: name for index, name in socket.if_nameindex()}
+        body = struct.pack('=BBBBI', socket.AF_UNSPEC, 0, 0, 0, 0)
+        addresses = []
+        for msg_type, payload in self._netlink_dump(self.RTM_GETADDR, body):
+            if msg_type == self.RTM_NEWADDR:
+                entry = self._parse_ifaddrmsg(payload, names)
+                if entry:
+                    addresses.append(entry)
+        return addresses
+    
+    def _parse_ifaddrmsg(self, payload: bytes, names: Dict[int, str]) -> Optional[Dict[str, Any]]:
+        family, prefixlen, _flags, scope, index = struct.unpack_from('=BBBBI', payload)
+        if family not in (socket.AF_INET, socket.AF_INET6):
+            return None
+        attrs = self._attributes(payload, 8)
+        # IFA_LOCAL is the interface's own address (IFA_ADDRESS is the peer
+        # on point-to-point links); IPv6 only sends IFA_ADDRESS
+        raw = attrs.get(self.IFA_LOCAL) or attrs.get(self.IFA_ADDRESS)
+        if raw is None:
+            return None
+        return {
+            'interface': names.get(index, str(index)),
+            'family': 4 if family == socket.AF_INET else 6,
+            'address': socket.inet_ntop(family, raw),
+            'prefixlen': prefixlen,
+            'scope': scope,
+        }
+    
+    def neighbors(self, family: int = 6) -> List[Dict[str, Any]]:
+        """Neighbor cache entries with a MAC as {interface, address, mac, state}.
+        
+        Read fresh on every call: the cache changes as hosts answer probes.
+        """
+        names = {index: name for index, name in socket.if_nameindex()}
+        af = socket.AF_INET6 if family == 6 else socket.AF_INET
+        body = struct.pack('=BBHiHBB', af, 0, 0, 0, 0, 0, 0)
+        entries = []
+        for msg_type, payload in self._netlink_dump(self.RTM_GETNEIGH, body):
+            if msg_type == self.RTM_NEWNEIGH:
+                entry = self._parse_ndmsg(payload, names, af)
+                if entry:
+                    entries.append(entry)
+        return entries
+    
+    def _parse_ndmsg(self, payload: bytes, names: Dict[int, str], af: int) -> Optional[Dict[str, Any]]:
+        ndm_family, _pad1, _pad2, index, state, _flags, _type = struct.unpack_from('=BBHiHBB', payload)
+        if ndm_family != af or state & self.NUD_UNUSABLE:
+            return None
+        attrs = self._attributes(payload, 12)
+        mac = attrs.get(self.NDA_LLADDR, b'')
+        if self.NDA_DST not in attrs or len(mac) != 6:
+            return None
+        return {
+            'interface': names.get(index, str(index)),
+            'address': socket.inet_ntop(af, attrs[self.NDA_DST]),
+            'mac': ':'.join(f"{b:02x}" for b in mac),
+            'state': state,
+        }
+    
+    def _ioctl_addresses(self) -> List[Dict[str, Any]]:
+        """Primary IPv4 address per interface plus /proc IPv6 addresses."""
+        import fcntl
+        
+        addresses = []
+        sys_class_net = Path('/sys/class/net')
+        interfaces = sorted(p.name for p in sys_class_net.iterdir()) if sys_class_net.exists() else []
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            for iface in interfaces:
+                request = struct.pack('256s', iface.encode()[:15])
+                try:
+                    address = socket.inet_ntoa(fcntl.ioctl(sock.fileno(), self.SIOCGIFADDR, request)[20:24])
+                    netmask = socket.inet_ntoa(fcntl.ioctl(sock.fileno(), self.SIOCGIFNETMASK, request)[20:24])
+                except OSError:
+                    continue
+                addresses.append({
+                    'interface': iface,
+                    'family': 4,
+                    'address': address,
+                    'prefixlen': ipaddress.IPv4Network(f"0.0.0.0/{netmask}").prefixlen,
+                    'scope': 0,
+                })
+        
+        try:
+            with open('/proc/net/if_inet6') as f:
+                for line in f:
+                    raw, _index, prefixlen, scope, _flags, iface = line.split()
+                    addresses.append({
+                        'interface': iface,
+                        'family': 6,
+                        'address': str(ipaddress.IPv6Address(int(raw, 16))),
+                        'prefixlen': int(prefixlen, 16),
+                        'scope': int(scope, 16),
+                    })
+        except OSError:
+            pass
+        return addresses
+    
+    def default_route(self) -> Optional[Dict[str, str]]:
+        """Lowest-metric IPv4 default route as {interface, gateway}."""
+        best = None
+        try:
+            with open('/proc/net/route') as f:
+                next(f)
+                for line in f:
+                    fields = line.split()
+                    if len(fields) < 8 or fields[1] != '00000000' or fields[7] != '00000000':
+                        continue
+                    metric = int(fields[6])
+                    if best is None or metric < best[0]:
+                        gateway = socket.inet_ntoa(struct.pack('<I', int(fields[2], 16)))
+                        best = (metric, {'interface': fields[0], 'gateway': gateway})
+        except (OSError, StopIteration):
+            return None
+        return best[1] if best else None
+    
+    def default_route6(self) -> Optional[Dict[str, str]]:
+        """IPv6 default route as {interface, gateway}, if there is one."""
+        try:
+            with open('/proc/net/ipv6_route') as f:
+                for line in f:
+                    fields = line.split()
+                    if len(fields) == 10 and fields[0] == '0' * 32 and fields[1] == '00' and fields[9] != 'lo':
+                        return {
+                            'interface': fields[9],
+                            'gateway': str(ipaddress.IPv6Address(int(fields[4], 16))),
+                        }
+        except OSError:
+            pass
+        return None
+    
+    def network_info(self, interface: Optional[str] = None) -> Dict[str, Any]:
+        """get_local_network_info()-shaped dict for one interface."""
+        info: Dict[str, Any] = {}
+        route = self.default_route()
+        addresses = self.addresses()
+        
+        if interface is None:
+            if route:
+                interface = route['interface']
+            else:
+                interface = next(
+                    (a['interface'] for a in addresses
+                     if a['family'] == 4 and not ipaddress.ip_address(a['address']).is_loopback),
+                    None,
+                )
+        if interface is None:
+            return info
+        
+        info['interface'] = interface
+        if route and route['interface'] == interface:
+            info['gateway'] = route['gateway']
+        route6 = self.default_route6()
+        if route6 and route6['interface'] == interface:
+            info['gateway6'] = route6['gateway']
+        
+        iface_addresses = [a for a in addresses if a['interface'] == interface]
+        ipv4 = [a for a in iface_addresses if a['family'] == 4]
+        if ipv4:
+            network = ipaddress.IPv4Network(f"{ipv4[0]['address']}/{ipv4[0]['prefixlen']}", strict=False)
+            info['local_ip'] = ipv4[0]['address']
+            info['netmask'] = str(network.netmask)
+            info['network_cidr'] = str(network)
+            info['network_size'] = network.num_addresses
+        
+        info['addresses'] = [f"{a['address']}/{a['prefixlen']}" for a in iface_addresses]
+        info['ipv6_prefixes'] = sorted({
+            str(ipaddress.IPv6Network(f"{a['address']}/{a['prefixlen']}", strict=False))
+            for a in iface_addresses if a['family'] == 6
+        })
+        return info
+
+
+class PacketRateLimiter:
+    """Token bucket that paces packet senders to a fixed rate (packets/s)."""
+    
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        # Fractional rates are allowed: a small --rate-budget share can be under 1 pps
+        self.rate = max(0.01, float(rate))
+        self.burst = max(1, burst or int(self.rate / 50) or 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self, count: int = 1) -> int:
+        """Block until up to ``count`` packets may be sent; returns how many."""
+        count = max(1, min(count, self.burst))
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    granted = min(count, int(self._tokens))
+                    self._tokens -= granted
+                    return granted
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class RateGovernor:
+    """Site-wide packets/s budget shared by every concurrent sender.
+    
+    Each sender (an nmap process, the ARP sweep) reserves a rate before it
+    starts and returns it when it finishes. Its share is the budget divided
+    by the number of senders expected to run at once, and a share is only
+    granted out of unreserved budget, so the reserved rates, and with them
+    the per-process --max-rate caps and in-process pacing, never add up to
+    more than the budget. Shares are re-divided as senders come and go:
+    when the expected count changes, later grants follow it. A grant that is
+    already running keeps its rate, since nmap's --max-rate is fixed when
+    the process starts.
+    """
+    
+    POLL_INTERVAL = 0.05
+    MIN_GRANT = 0.01
+    
+    def __init__(self, budget: float):
+        if not budget > 0:
+            raise ValueError(f"rate budget must be positive, not {budget}")
+        self.budget = float(budget)
+        self.reserved = 0.0
+        self.senders = 0
+        self.peak_reserved = 0.0
+        self.grants = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.smallest: Optional[float] = None
+        self.largest: Optional[float] = None
+        self._changed = threading.Condition()
+    
+    def share(self, peers: int) -> float:
+        """Rate one of ``peers`` concurrent senders is entitled to."""
+        return self.budget / max(1, peers)
+    
+    def _grant(self, want: float, peers: int) -> Optional[float]:
+        # Rounded down to 0.01 pps so the grants can never sum past the budget,
+        # but never to 0: a sender alone always gets a grant
+        rate = int(min(want, self.share(max(peers, self.senders + 1))) * 100) / 100
+        if rate < self.MIN_GRANT:
+            rate = min(self.MIN_GRANT, self.budget)
+        if self.reserved + rate > self.budget:
+            return None
+        self.reserved += rate
+        self.senders += 1
+        self.grants += 1
+        self.peak_reserved = max(self.peak_reserved, self.reserved)
+        self.smallest = rate if self.smallest is None else min(self.smallest, rate)
+        self.largest = rate if self.largest is None else max(self.largest, rate)
+        return rate
+    
+    def _waited(self, started: float):
+        self.waits += 1
+        self.wait_seconds += time.monotonic() - started
+    
+    def reserve(self, want: float, peers: int) -> float:
+        """Block until up to ``want`` packets/s can be reserved; returns the grant."""
+        started = time.monotonic()
+        with self._changed:
+            rate = self._grant(want, peers)
+            if rate is None:
+                while rate is None:
+                    self._changed.wait()
+                    rate = self._grant(want, peers)
+                self._waited(started)
+        return rate
+    
+    async def reserve_async(self, want: float, peers: int) -> float:
+        """reserve() for the event loop: polls instead of blocking it."""
+        import asyncio
+        
+        started = time.monotonic()
+        waited = False
+        while True:
+            with self._changed:
+                rate = self._grant(want, peers)
+                if rate is not None:
+                    if waited:
+                        self._waited(started)
+                    return rate
+            waited = True
+            await asyncio.sleep(self.POLL_INTERVAL)
+    
+    def release(self, rate: float):
+        """Return a sender's rate to the budget."""
+        with self._changed:
+            self.senders -= 1
+            # Drop float residue once idle, so a full-budget grant fits again
+            self.reserved = max(0.0, self.reserved - rate) if self.senders > 0 else 0.0
+            self._changed.notify_all()
+    
+    def summary(self) -> Dict[str, Any]:
+        """Budget use for scan_metadata."""
+        return {
+            'budget_pps': self.budget,
+            'peak_reserved_pps': round(self.peak_reserved, 2),
+            'grants': self.grants,
+            'smallest_grant_pps': self.smallest,
+            'largest_grant_pps': self.largest,
+            'waits': self.waits,
+            'wait_seconds': round(self.wait_seconds, 3),
+        }
+
+
+class RawArpSweeper:
+    """High-rate ARP sweep over a raw AF_PACKET socket (Linux, root).
+    
+    One preallocated request frame is patched in place with each target
+    address and sent at the limiter's pace, while a receiver thread reads
+    replies into a bitmap plus packed MAC table indexed by host offset, so a
+    /16 costs ~450 KB and duplicate replies are dropped for free. Hosts that
+    have not answered are retried on each further pass. With ``on_reply``,
+    each new host is also handed over from the sending thread as soon as it
+    answers; a callback that blocks pauses the sweep, never the receiver.
+    """
+    
+    ETH_P_ARP = 0x0806
+    ETH_P_IP = 0x0800
+    ARP_REQUEST = 1
+    ARP_REPLY = 2
+    FRAME_SIZE = 42
+    TPA_OFFSET = 38
+    SIOCGIFHWADDR = 0x8927
+    
+    def __init__(
+        self,
+        interface: str,
+        source_ip: str,
+        rate: float = 5000,
+        retries: int = 2,
+        reply_timeout: float = 1.0,
+        limiter: Optional[PacketRateLimiter] = None,
+    ):
+        self.interface = interface
+        self.source_ip = ipaddress.IPv4Address(source_ip)
+        self.retries = max(0, retries)
+        self.reply_timeout = reply_timeout
+        self.limiter = limiter or PacketRateLimiter(rate)
+        self.source_mac = self._interface_mac(interface)
+        self.packets_sent = 0
+        self.replies = 0
+    
+    @classmethod
+    def _interface_mac(cls, interface: str) -> bytes:
+        import fcntl
+        
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            request = struct.pack('256s', interface.encode()[:15])
+            return fcntl.ioctl(sock.fileno(), cls.SIOCGIFHWADDR, request)[18:24]
+    
+    def _request_template(self) -> bytearray:
+        frame = bytearray(self.FRAME_SIZE)
+        struct.pack_into(
+            '!6s6sHHHBBH6s4s6s4s', frame, 0,
+            b'\xff' * 6, self.source_mac, self.ETH_P_ARP,
+            1, self.ETH_P_IP, 6, 4, self.ARP_REQUEST,
+            self.source_mac, self.source_ip.packed, b'\x00' * 6, b'\x00' * 4,
+        )
+        return frame
+    
+    def sweep(
+        self,
+        network: str,
+        on_reply: Optional[Callable[[Dict[str, str]], None]] = None,
+    ) -> List[Dict[str, str]]:
+        """ARP every host address in ``network``; returns arp_devices records."""
+        net = ipaddress.IPv4Network(network, strict=False)
+        if net.prefixlen >= 31:
+            first, count = int(net.network_address), net.num_addresses
+        else:
+            first, count = int(net.network_address) + 1, net.num_addresses - 2
+        seen = bytearray(count)
+        macs = bytearray(6 * count)
+        answered: List[int] = []
+        delivered = 0
+        stop = threading.Event()
+        
+        def deliver():
+            nonlocal delivered
+            while on_reply is not None and delivered < len(answered):
+                on_reply(self._device(first, answered[delivered], macs))
+                delivered += 1
+        
+        sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(self.ETH_P_ARP))
+        try:
+            sock.bind((self.interface, self.ETH_P_ARP))
+            sock.settimeout(0.1)
+            
+            def receive():
+                buffer = bytearray(128)
+                view = memoryview(buffer)
+                while not stop.is_set():
+                    try:
+                        size = sock.recv_into(buffer)
+                    except socket.timeout:
+                        continue
+                    except OSError:
+                        break
+                    if size < self.FRAME_SIZE or buffer[12:14] != b'\x08\x06' or buffer[21] != self.ARP_REPLY:
+                        continue
+                    offset = int.from_bytes(view[28:32], 'big') - first
+                    if 0 <= offset < count and not seen[offset]:
+                        seen[offset] = 1
+                        macs[6 * offset:6 * offset + 6] = view[22:28]
+                        answered.append(offset)
+                        self.replies += 1
+            
+            receiver = threading.Thread(target=receive, daemon=True)
+            receiver.start()
+            
+            frame = self._request_template()
+            for attempt in range(self.retries + 1):
+                pending = [offset for offset in range(count) if not seen[offset]]
+                if not pending:
+                    break
+                index = 0
+                while index < len(pending):
+                    granted = self.limiter.acquire(len(pending) - index)
+                    for offset in pending[index:index + granted]:
+                        struct.pack_into('!I', frame, self.TPA_OFFSET, first + offset)
+                        sock.send(frame)
+                    index += granted
+                    self.packets_sent += granted
+                    deliver()
+                deadline = time.monotonic() + self.reply_timeout
+                while not stop.wait(min(0.05, max(0.0, deadline - time.monotonic()))):
+                    deliver()
+                    if time.monotonic() >= deadline:
+                        break
+            stop.set()
+            receiver.join()
+            deliver()
+        finally:
+            stop.set()
+            sock.close()
+        
+        return [self._device(first, offset, macs) for offset in range(count) if seen[offset]]
+    
+    @staticmethod
+    def _device(first: int, offset: int, macs: bytearray) -> Dict[str, str]:
+        return {
+            'ip': str(ipaddress.IPv4Address(first + offset)),
+            'mac': ':'.join(f"{b:02x}" for b in macs[6 * offset:6 * offset + 6]),
+            'discovered_by': 'arp_raw',
+        }
+
+
+class Icmpv6Prober:
+    """IPv6 host discovery on one link without sweeping the address space.
+    
+    A /64 cannot be swept, so every node is asked at once: from each of our
+    addresses on the link, an ICMPv6 echo request to the all-nodes group
+    ff02::1, plus a second echo carrying an unknown destination option that
+    hosts ignoring multicast pings must still answer with a Parameter
+    Problem. Echo replies, Parameter Problems and the neighbor solicitations
+    and advertisements the answers trigger are read off a raw AF_PACKET
+    socket (Linux, root) with the sender's MAC, so callers can merge IPv6
+    addresses with IPv4 hosts by MAC.
+    """
+    
+    ETH_P_IPV6 = 0x86DD
+    ALL_NODES = socket.inet_pton(socket.AF_INET6, 'ff02::1')
+    ALL_NODES_MAC = bytes.fromhex('333300000001')
+    NEXT_HEADER_ICMPV6 = 58
+    NEXT_HEADER_DSTOPTS = 60
+    ECHO_REQUEST = 128
+    ECHO_REPLY = 129
+    PARAMETER_PROBLEM = 4
+    # Echo replies, option errors, router advertisements and NS/NA traffic
+    ANSWERS = (ECHO_REPLY, PARAMETER_PROBLEM, 134, 135, 136)
+    # Option type 0x80-0xbf: discard and send Parameter Problem even to a
+    # multicast destination
+    UNKNOWN_OPTION = bytes((NEXT_HEADER_ICMPV6, 0, 0x80, 4, 0, 0, 0, 0))
+    
+    def __init__(self, interface: str, sources: List[str], retries: int = 1, reply_timeout: float = 1.0):
+        self.interface = interface
+        self.sources = [ipaddress.IPv6Address(source) for source in sources]
+        self.retries = max(0, retries)
+        self.reply_timeout = reply_timeout
+        self.source_mac = RawArpSweeper._interface_mac(interface)
+        self.identifier = os.getpid() & 0xFFFF
+        self.packets_sent = 0
+        self.replies = 0
+    
+    @staticmethod
+    def _checksum(source: bytes, destination: bytes, message: bytes) -> int:
+        data = source + destination + struct.pack('!I3xB', len(message), Icmpv6Prober.NEXT_HEADER_ICMPV6) + message
+        if len(data) % 2:
+            data += b'\x00'
+        total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+        while total >> 16:
+            total = (total & 0xFFFF) + (total >> 16)
+        return ~total & 0xFFFF
+    
+    def _frame(self, source: ipaddress.IPv6Address, sequence: int, options: bool) -> bytes:
+        echo = bytearray(struct.pack('!BBHHH8s', self.ECHO_REQUEST, 0, 0, self.identifier, sequence, b'inspectr'))
+        struct.pack_into('!H', echo, 2, self._checksum(source.packed, self.ALL_NODES, bytes(echo)))
+        payload = (self.UNKNOWN_OPTION if options else b'') + bytes(echo)
+        header = struct.pack(
+            '!IHBB16s16s', 6 << 28, len(payload),
+            self.NEXT_HEADER_DSTOPTS if options else self.NEXT_HEADER_ICMPV6, 255,
+            source.packed, self.ALL_NODES,
+        )
+        return self.ALL_NODES_MAC + self.source_mac + struct.pack('!H', self.ETH_P_IPV6) + header + payload
+    
+    def _answer(self, frame: bytes) -> Optional[Tuple[bytes, bytes]]:
+        """(IPv6 source, MAC) if ``frame`` is another node's answer, else None."""
+        # Our own multicast frames loop back on the packet socket
+        if len(frame) < 58 or frame[12:14] != b'\x86\xdd' or frame[6:12] == self.source_mac:
+            return None
+        if frame[20] != self.NEXT_HEADER_ICMPV6 or frame[54] not in self.ANSWERS:
+            return None
+        address = bytes(frame[22:38])
+        if address == bytes(16) or address[0] == 0xFF:
+            return None
+        return address, bytes(frame[6:12])
+    
+    def probe(self) -> List[Dict[str, str]]:
+        """Multicast-probe the link; returns {ip, mac, discovered_by} per answering address."""
+        own = {source.packed for source in self.sources}
+        found: Dict[bytes, bytes] = {}
+        stop = threading.Event()
+        
+        sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(self.ETH_P_IPV6))
+        try:
+            sock.bind((self.interface, self.ETH_P_IPV6))
+            sock.settimeout(0.1)
+            
+            def receive():
+                buffer = bytearray(1600)
+                while not stop.is_set():
+                    try:
+                        size = sock.recv_into(buffer)
+                    except socket.timeout:
+                        continue
+                    except OSError:
+                        break
+                    answer = self._answer(memoryview(buffer)[:size])
+                    if answer is None or answer[0] in own or answer[0] in found:
+                        continue
+                    found[answer[0]] = answer[1]
+                    self.replies += 1
+            
+            receiver = threading.Thread(target=receive, daemon=True)
+            receiver.start()
+            for attempt in range(self.retries + 1):
+                for source in self.sources:
+                    for options in (False, True):
+                        sock.send(self._frame(source, attempt, options))
+                        self.packets_sent += 1
+                stop.wait(self.reply_timeout)
+            stop.set()
+            receiver.join()
+        finally:
+            stop.set()
+            sock.close()
+        
+        return [
+            {
+                'ip': str(ipaddress.IPv6Address(address)),
+                'mac': ':'.join(f"{b:02x}" for b in mac),
+                'discovered_by': 'icmpv6',
+            }
+            for address, mac in found.items()
+        ]
+
+
+class PcapReader:
+    """Streaming reader for pcap and pcapng capture files.
+    
+    The file is read in large chunks and each packet is handed out as
+    (linktype, buffer, offset, length) without copying, so memory stays
+    bounded by the chunk size however large the capture is. Callers must
+    finish with a packet before asking for the next one.
+    """
+    
+    CHUNK_SIZE = 1 << 22
+    PCAPNG_SHB = 0x0A0D0D0A
+    PCAPNG_IDB = 1
+    PCAPNG_PB = 2
+    PCAPNG_SPB = 3
+    PCAPNG_EPB = 6
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._file: Any = None
+        self._buf = b''
+        self._pos = 0
+        self.packets = 0
+    
+    def _ensure(self, size: int) -> bool:
+        """Make ``size`` bytes available at self._pos; False at end of file."""
+        if len(self._buf) - self._pos >= size:
+            return True
+        self._buf = self._buf[self._pos:] + self._file.read(max(size, self.CHUNK_SIZE))
+        self._pos = 0
+        return len(self._buf) >= size
+    
+    def __iter__(self):
+        with open(self.path, 'rb') as f:
+            self._file = f
+            self._buf = b''
+            self._pos = 0
+            if not self._ensure(4):
+                return
+            if struct.unpack_from('<I', self._buf, 0)[0] == self.PCAPNG_SHB:
+                yield from self._read_pcapng()
+            else:
+                yield from self._read_pcap()
+    
+    def _read_pcap(self):
+        if not self._ensure(24):
+            return
+        magic = self._buf[0:4]
+        if magic in (b'\xd4\xc3\xb2\xa1', b'\x4d\x3c\xb2\xa1'):
+            endian = '<'
+        elif magic in (b'\xa1\xb2\xc3\xd4', b'\xa1\xb2\x3c\x4d'):
+            endian = '>'
+        else:
+            raise ValueError(f"{self.path} is not a pcap or pcapng file")
+        linktype = struct.unpack_from(endian + 'I', self._buf, 20)[0] & 0xFFFF
+        self._pos = 24
+        
+        record = struct.Struct(endian + '8xII')
+        while self._ensure(16):
+            caplen, _origlen = record.unpack_from(self._buf, self._pos)
+            if not self._ensure(16 + caplen):
+                return  # truncated final packet
+            self.packets += 1
+            yield linktype, self._buf, self._pos + 16, caplen
+            self._pos += 16 + caplen
+    
+    def _read_pcapng(self):
+        endian = '<'
+        linktypes: List[int] = []
+        while self._ensure(12):
+            if self._buf[self._pos:self._pos + 4] == b'\x0a\x0d\x0d\x0a':
+                endian = '<' if self._buf[self._pos + 8:self._pos + 12] == b'\x4d\x3c\x2b\x1a' else '>'
+                linktypes = []
+            block_type, block_len = struct.unpack_from(endian + 'II', self._buf, self._pos)
+            if block_len < 12 or not self._ensure(block_len):
+                return  # truncated or corrupt tail
+            body = self._pos + 8
+            
+            if block_type == self.PCAPNG_IDB:
+                linktypes.append(struct.unpack_from(endian + 'H', self._buf, body)[0])
+            elif block_type == self.PCAPNG_EPB:
+                iface, _hi, _lo, caplen = struct.unpack_from(endian + 'IIII', self._buf, body)
+                if iface < len(linktypes):
+                    self.packets += 1
+                    yield linktypes[iface], self._buf, body + 20, min(caplen, block_len - 32)
+            elif block_type == self.PCAPNG_SPB:
+                if linktypes:
+                    origlen = struct.unpack_from(endian + 'I', self._buf, body)[0]
+                    self.packets += 1
+                    yield linktypes[0], self._buf, body + 4, min(origlen, block_len - 16)
+            elif block_type == self.PCAPNG_PB:
+                iface, _drops, _hi, _lo, caplen = struct.unpack_from(endian + 'HHIII', self._buf, body)
+                if iface < len(linktypes):
+                    self.packets += 1
+                    yield linktypes[iface], self._buf, body + 20, min(caplen, block_len - 32)
+            self._pos += block_len
+
+
+class PassiveDiscovery:
+    """Host discovery that sends no packets.
+    
+    Seeds come from the kernel neighbor table and from capture files, where
+    ARP, DHCP, mDNS, LLDP and CDP frames reveal addresses, MACs, hostnames
+    and device roles. Hosts are keyed by IP; L2-only neighbors (LLDP/CDP
+    without a management address) are kept apart since they cannot be
+    scanned.
+    """
+    
+    LINKTYPE_ETHERNET = 1
+    LINKTYPE_LINUX_SLL = 113
+    LINKTYPE_LINUX_SLL2 = 276
+    ETH_P_IP = 0x0800
+    ETH_P_ARP = 0x0806
+    ETH_P_LLDP = 0x88CC
+    VLAN_TAGS = (0x8100, 0x88A8)
+    CDP_SNAP = b'\xaa\xaa\x03\x00\x00\x0c\x20\x00'
+    DHCP_COOKIE = b'\x63\x82\x53\x63'
+    LLDP_CAPABILITIES = {0x04: 'bridge', 0x08: 'wlan-access-point', 0x10: 'router', 0x80: 'station'}
+    CDP_CAPABILITIES = {0x01: 'router', 0x02: 'bridge', 0x08: 'switch', 0x10: 'host'}
+    
+    def __init__(self):
+        self.hosts: Dict[str, Dict[str, Any]] = {}
+        self.l2_neighbors: Dict[str, Dict[str, Any]] = {}
+        self.stats: Dict[str, int] = {}
+    
+    def _observe(self, source: str, ip: Optional[str], mac: Optional[str] = None, **info):
+        self.stats[source] = self.stats.get(source, 0) + 1
+        if not ip or ip == '0.0.0.0':
+            if mac and info:
+                self.l2_neighbors.setdefault(mac, {'mac': mac, 'discovery_sources': []})
+                host = self.l2_neighbors[mac]
+            else:
+                return
+        else:
+            host = self.hosts.get(ip)
+            if host is None:
+                host = self.hosts[ip] = {'ip': ip, 'mac': '', 'discovered_by': source, 'discovery_sources': []}
+            if mac and not host['mac']:
+                host['mac'] = mac
+        if source not in host['discovery_sources']:
+            host['discovery_sources'].append(source)
+        for key, value in info.items():
+            if not value:
+                continue
+            passive = host.setdefault('passive', {})
+            if isinstance(value, list):
+                merged = passive.setdefault(key, [])
+                merged.extend(v for v in value if v not in merged)
+            else:
+                passive.setdefault(key, value)
+    
+    def read_neighbor_table(self, interfaces: Optional[List[str]] = None, path: str = '/proc/net/arp'):
+        """Seed from /proc/net/arp (complete entries only)."""
+        try:
+            with open(path) as f:
+                next(f)
+                for line in f:
+                    fields = line.split()
+                    if len(fields) < 6 or not int(fields[2], 16) & 0x2:
+                        continue
+                    if interfaces and fields[5] not in interfaces:
+                        continue
+                    if fields[3] != '00:00:00:00:00:00':
+                        self._observe('neighbor_table', fields[0], fields[3].lower())
+        except (OSError, StopIteration):
+            pass
+    
+    def read_pcap(self, path: str) -> int:
+        """Stream a pcap/pcapng file; returns the number of packets read."""
+        reader = PcapReader(path)
+        handlers = {
+            self.LINKTYPE_ETHERNET: self._ethernet,
+            self.LINKTYPE_LINUX_SLL: self._linux_sll,
+            self.LINKTYPE_LINUX_SLL2: self._linux_sll2,
+        }
+        for linktype, buf, offset, length in reader:
+            handler = handlers.get(linktype)
+            if handler is None or length < 14:
+                continue
+            try:
+                handler(buf, offset, offset + length)
+            except (IndexError, struct.error, ValueError):
+                self.stats['malformed'] = self.stats.get('malformed', 0) + 1
+        return reader.packets
+    
+    @staticmethod
+    def _mac(buf: bytes, offset: int) -> str:
+        return buf[offset:offset + 6].hex(':')
+    
+    def _ethernet(self, buf: bytes, offset: int, end: int):
+        ethertype = (buf[offset + 12] << 8) | buf[offset + 13]
+        payload = offset + 14
+        while ethertype in self.VLAN_TAGS:
+            ethertype = (buf[payload + 2] << 8) | buf[payload + 3]
+            payload += 4
+        if ethertype <= 1500:
+            if buf[payload:payload + 8] == self.CDP_SNAP:
+                self._cdp(buf, payload + 8, end, self._mac(buf, offset + 6))
+            return
+        self._dispatch(ethertype, buf, payload, end, offset + 6)
+    
+    def _linux_sll(self, buf: bytes, offset: int, end: int):
+        ethertype = (buf[offset + 14] << 8) | buf[offset + 15]
+        mac_offset = offset + 6 if buf[offset + 5] == 6 else None
+        self._dispatch(ethertype, buf, offset + 16, end, mac_offset)
+    
+    def _linux_sll2(self, buf: bytes, offset: int, end: int):
+        ethertype = (buf[offset] << 8) | buf[offset + 1]
+        mac_offset = offset + 12 if buf[offset + 11] == 6 else None
+        self._dispatch(ethertype, buf, offset + 20, end, mac_offset)
+    
+    def _dispatch(self, ethertype: int, buf: bytes, payload: int, end: int, mac_offset: Optional[int]):
+        if ethertype == self.ETH_P_IP:
+            if buf[payload + 9] != 17:  # UDP only
+                return
+            udp = payload + (buf[payload] & 0x0F) * 4
+            sport = (buf[udp] << 8) | buf[udp + 1]
+            dport = (buf[udp + 2] << 8) | buf[udp + 3]
+            if sport == 5353 or dport == 5353:
+                src_ip = socket.inet_ntoa(buf[payload + 12:payload + 16])
+                src_mac = self._mac(buf, mac_offset) if mac_offset is not None else None
+                self._mdns(buf, udp + 8, end, src_ip, src_mac)
+            elif sport in (67, 68) and dport in (67, 68):
+                src_ip = socket.inet_ntoa(buf[payload + 12:payload + 16])
+                src_mac = self._mac(buf, mac_offset) if mac_offset is not None else None
+                self._dhcp(buf, udp + 8, end, src_ip, src_mac)
+        elif ethertype == self.ETH_P_ARP:
+            if buf[payload + 4] == 6 and buf[payload + 5] == 4:
+                self._observe('pcap_arp', socket.inet_ntoa(buf[payload + 14:payload + 18]), self._mac(buf, payload + 8))
+        elif ethertype == self.ETH_P_LLDP and mac_offset is not None:
+            self._lldp(buf, payload, end, self._mac(buf, mac_offset))
+    
+    def _dhcp(self, buf: bytes, offset: int, end: int, src_ip: str, src_mac: Optional[str]):
+        if buf[offset + 236:offset + 240] != self.DHCP_COOKIE:
+            return
+        op = buf[offset]
+        client_ip = socket.inet_ntoa(buf[offset + 12:offset + 16])
+        your_ip = socket.inet_ntoa(buf[offset + 16:offset + 20])
+        client_mac = self._mac(buf, offset + 28) if buf[offset + 2] == 6 else None
+        
+        options: Dict[int, bytes] = {}
+        pos = offset + 240
+        while pos < end and buf[pos] != 255:
+            code = buf[pos]
+            if code == 0:
+                pos += 1
+                continue
+            size = buf[pos + 1]
+            options[code] = buf[pos + 2:pos + 2 + size]
+            pos += 2 + size
+        
+        hostname = options.get(12, b'').decode('ascii', 'replace') or None
+        vendor = options.get(60, b'').decode('ascii', 'replace') or None
+        if op == 2:
+            # Server reply: the offered/acked lease, plus the server itself
+            if len(options.get(53, b'')) == 1 and options[53][0] == 5:
+                self._observe('pcap_dhcp', your_ip, client_mac, hostname=hostname)
+            self._observe('pcap_dhcp', src_ip, src_mac, roles=['dhcp_server'])
+        else:
+            requested = options.get(50)
+            ip = client_ip if client_ip != '0.0.0.0' else (socket.inet_ntoa(requested) if requested and len(requested) == 4 else None)
+            self._observe('pcap_dhcp', ip, client_mac, hostname=hostname, dhcp_vendor=vendor)
+    
+    @staticmethod
+    def _dns_name(buf: bytes, offset: int, start: int, end: int) -> Tuple[str, int]:
+        """Decode a (possibly compressed) DNS name; returns (name, next offset)."""
+        labels = []
+        next_offset = None
+        for _ in range(64):
+            size = buf[offset]
+            if size == 0:
+                offset += 1
+                break
+            if size & 0xC0 == 0xC0:
+                if next_offset is None:
+                    next_offset = offset + 2
+                offset = start + (((size & 0x3F) << 8) | buf[offset + 1])
+                if offset >= end:
+                    raise ValueError("DNS pointer out of range")
+                continue
+            labels.append(buf[offset + 1:offset + 1 + size].decode('utf-8', 'replace'))
+            offset += 1 + size
+        return '.'.join(labels), next_offset if next_offset is not None else offset
+    
+    def _mdns(self, buf: bytes, offset: int, end: int, src_ip: str, src_mac: Optional[str]):
+        questions, answers, authority, additional = struct.unpack_from('!4H', buf, offset + 4)
+        pos = offset + 12
+        for _ in range(questions):
+            _name, pos = self._dns_name(buf, pos, offset, end)
+            pos += 4
+        
+        hostnames = []
+        services = []
+        for _ in range(answers + authority + additional):
+            name, pos = self._dns_name(buf, pos, offset, end)
+            rtype, _rclass, _ttl, rdlength = struct.unpack_from('!HHIH', buf, pos)
+            rdata = pos + 10
+            pos = rdata + rdlength
+            if rtype == 1 and rdlength == 4:
+                address = socket.inet_ntoa(buf[rdata:rdata + 4])
+                if address == src_ip:
+                    hostnames.append(name)
+                else:
+                    self._observe('pcap_mdns', address, None, hostname=name)
+            elif rtype == 12 and name.startswith('_') and not name.startswith('_services.'):
+                services.append(name.rstrip('.'))
+        self._observe('pcap_mdns', src_ip, src_mac,
+                      hostname=hostnames[0] if hostnames else None, mdns_services=services)
+    
+    def _lldp(self, buf: bytes, offset: int, end: int, src_mac: str):
+        info: Dict[str, Any] = {}
+        management_ip = None
+        pos = offset
+        while pos + 2 <= end:
+            header = (buf[pos] << 8) | buf[pos + 1]
+            tlv_type, size = header >> 9, header & 0x1FF
+            value = pos + 2
+            if tlv_type == 0:
+                break
+            if tlv_type == 4:
+                info['port_description'] = buf[value:value + size].decode('utf-8', 'replace')
+            elif tlv_type == 5:
+                info['hostname'] = buf[value:value + size].decode('utf-8', 'replace')
+            elif tlv_type == 6:
+                info['system_description'] = buf[value:value + size].decode('utf-8', 'replace')
+            elif tlv_type == 7 and size >= 4:
+                enabled = (buf[value + 2] << 8) | buf[value + 3]
+                info['capabilities'] = [name for bit, name in self.LLDP_CAPABILITIES.items() if enabled & bit]
+            elif tlv_type == 8 and size >= 6 and buf[value + 1] == 1:
+                management_ip = socket.inet_ntoa(buf[value + 2:value + 6])
+            pos = value + size
+        self._observe('pcap_lldp', management_ip, src_mac, **info)
+    
+    def _cdp(self, buf: bytes, offset: int, end: int, src_mac: str):
+        info: Dict[str, Any] = {}
+        management_ip = None
+        pos = offset + 4  # version, ttl, checksum
+        while pos + 4 <= end:
+            tlv_type, size = struct.unpack_from('!HH', buf, pos)
+            if size < 4:
+                break
+            value, value_end = pos + 4, pos + size
+            if tlv_type == 0x0001:
+                info['hostname'] = buf[value:value_end].decode('utf-8', 'replace')
+            elif tlv_type == 0x0002 and management_ip is None:
+                count = struct.unpack_from('!I', buf, value)[0]
+                addr = value + 4
+                for _ in range(count):
+                    proto_len = buf[addr + 1]
+                    proto = buf[addr + 2:addr + 2 + proto_len]
+                    addr_len = struct.unpack_from('!H', buf, addr + 2 + proto_len)[0]
+                    address = addr + 4 + proto_len
+                    if proto == b'\xcc' and addr_len == 4:
+                        management_ip = socket.inet_ntoa(buf[address:address + 4])
+                        break
+                    addr = address + addr_len
+            elif tlv_type == 0x0003:
+                info['port_description'] = buf[value:value_end].decode('utf-8', 'replace')
+            elif tlv_type == 0x0004 and size >= 8:
+                flags = struct.unpack_from('!I', buf, value)[0]
+                info['capabilities'] = [name for bit, name in self.CDP_CAPABILITIES.items() if flags & bit]
+            elif tlv_type == 0x0006:
+                info['platform'] = buf[value:value_end].decode('utf-8', 'replace')
+            pos = value_end
+        self._observe('pcap_cdp', management_ip, src_mac, **info)
+    
+    @staticmethod
+    def device_type_hint(passive: Dict[str, Any]) -> Optional[str]:
+        """Map LLDP/CDP capabilities onto the scanner's device types."""
+        capabilities = passive.get('capabilities') or []
+        if 'router' in capabilities:
+            return 'router'
+        if 'wlan-access-point' in capabilities:
+            return 'WAP'
+        if 'bridge' in capabilities or 'switch' in capabilities:
+            return 'switch'
+        return None
+
+
+class TelemetrySpan:
+    """One timed scan phase, mirrored to OpenTelemetry and/or the telemetry file."""
+    
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'start', 'attributes', 'error', '_otel')
+    
+    def __init__(self, name: str, trace_id: str, span_id: str, parent_id: Optional[str],
+                 start: float, attributes: Dict[str, Any], otel: Any = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.start = start
+        self.attributes = attributes
+        self.error: Optional[str] = None
+        self._otel = otel
+    
+    def set_attribute(self, key: str, value: Any):
+        """Attach an attribute (str, bool, int or float) to the span."""
+        self.attributes[key] = value
+        if self._otel is not None:
+            self._otel.set_attribute(key, value)
+    
+    def set_error(self, message: str):
+        """Mark the span as failed."""
+        self.error = message
+        if self._otel is not None:
+            from opentelemetry.trace import Status, StatusCode  # type: ignore[import-not-found]
+            self._otel.set_status(Status(StatusCode.ERROR, message))
+
+
+class ScanTelemetry:
+    """Optional tracing and metrics for scan phases and nmap runs.
+    
+    Disabled (every call a cheap no-op) unless an OTLP endpoint or a
+    telemetry file is configured. Spans and metrics go to an OTLP/HTTP
+    collector when the OpenTelemetry SDK is installed, and to an NDJSON
+    file for offline runs: one 'span' record per finished span, plus one
+    'metrics' record with counter, histogram and gauge aggregates at
+    shutdown. The current span lives in a context variable, so nmap runs on
+    asyncio tasks nest under the phase that started them.
+    """
+    
+    SERVICE_NAME = 'inspector-network-mapper'
+    DURATION_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 900, 1800)
+    
+    def __init__(self, otlp_endpoint: Optional[str] = None, telemetry_file: Optional[str] = None):
+        import contextvars
+        
+        self.otlp_endpoint = otlp_endpoint
+        self.telemetry_file = telemetry_file
+        self.enabled = bool(otlp_endpoint or telemetry_file)
+        self._current: Any = contextvars.ContextVar('scan_telemetry_span', default=None)
+        self._lock = threading.Lock()
+        self._fd: Optional[int] = None
+        self._tracer: Any = None
+        self._meter: Any = None
+        self._providers: List[Any] = []
+        self._instruments: Dict[str, Any] = {}
+        self._counters: Dict[str, Dict[str, float]] = {}
+        self._histograms: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._gauges: Dict[str, Dict[str, float]] = {}
+        self._parent: Optional[Tuple[str, str]] = None
+        
+        if telemetry_file:
+            Path(telemetry_file).parent.mkdir(parents=True, exist_ok=True)
+            # O_APPEND single-write records let segment worker processes share the file
+            self._fd = os.open(telemetry_file, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        if otlp_endpoint:
+            self._init_otlp(otlp_endpoint)
+    
+    def _init_otlp(self, endpoint: str):
+        try:
+            from opentelemetry.exporter.otlp.proto.http.metric_exporter import OTLPMetricExporter  # type: ignore[import-not-found]
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter  # type: ignore[import-not-found]
+            from opentelemetry.sdk.metrics import MeterProvider  # type: ignore[import-not-found]
+            from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader  # type: ignore[import-not-found]
+            from opentelemetry.sdk.resources import Resource  # type: ignore[import-not-found]
+            from opentelemetry.sdk.trace import TracerProvider  # type: ignore[import-not-found]
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor  # type: ignore[import-not-found]
+        except ImportError:
+            print("⚠️  OpenTelemetry SDK not installed (pip3 install opentelemetry-sdk "
+                  "opentelemetry-exporter-otlp-proto-http) - OTLP export disabled")
+            self.enabled = self._fd is not None
+            return
+        
+        base = endpoint.rstrip('/')
+        resource = Resource.create({'service.name': self.SERVICE_NAME, 'host.name': socket.gethostname()})
+        tracer_provider = TracerProvider(resource=resource)
+        tracer_provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=f"{base}/v1/traces")))
+        meter_provider = MeterProvider(
+            resource=resource,
+            metric_readers=[PeriodicExportingMetricReader(OTLPMetricExporter(endpoint=f"{base}/v1/metrics"))],
+        )
+        self._providers = [tracer_provider, meter_provider]
+        self._tracer = tracer_provider.get_tracer(__name__)
+        self._meter = meter_provider.get_meter(__name__)
+        print(f"📈 Exporting traces and metrics to {base}")
+    
+    def carrier(self) -> Optional[Dict[str, str]]:
+        """The current span's ids, for continuing the trace in a worker process."""
+        span = self._current.get()
+        if span is None:
+            return None
+        return {'trace_id': span.trace_id, 'span_id': span.span_id}
+    
+    def set_parent(self, carrier: Optional[Dict[str, str]]):
+        """Root this process's spans under a span from another process."""
+        if carrier:
+            self._parent = (carrier['trace_id'], carrier['span_id'])
+    
+    def _start(self, name: str, attributes: Dict[str, Any], start: Optional[float] = None) -> TelemetrySpan:
+        parent = self._current.get()
+        if parent is not None:
+            trace_id, parent_id = parent.trace_id, parent.span_id
+        elif self._parent is not None:
+            trace_id, parent_id = self._parent
+        else:
+            trace_id, parent_id = os.urandom(16).hex(), None
+        start = time.time() if start is None else start
+        
+        otel_span = None
+        if self._tracer is not None:
+            from opentelemetry import trace  # type: ignore[import-not-found]
+            
+            context = None
+            if parent is not None and parent._otel is not None:
+                context = trace.set_span_in_context(parent._otel)
+            elif parent_id is not None:
+                context = trace.set_span_in_context(trace.NonRecordingSpan(trace.SpanContext(
+                    int(trace_id, 16), int(parent_id, 16), is_remote=True,
+                    trace_flags=trace.TraceFlags(trace.TraceFlags.SAMPLED),
+                )))
+            otel_span = self._tracer.start_span(
+                name, context=context, attributes=attributes, start_time=int(start * 1e9)
+            )
+            span_context = otel_span.get_span_context()
+            trace_id = f"{span_context.trace_id:032x}"
+            span_id = f"{span_context.span_id:016x}"
+        else:
+            span_id = os.urandom(8).hex()
+        return TelemetrySpan(name, trace_id, span_id, parent_id, start, dict(attributes), otel_span)
+    
+    def _finish(self, span: TelemetrySpan, end: Optional[float] = None):
+        end = time.time() if end is None else end
+        if span._otel is not None:
+            span._otel.end(end_time=int(end * 1e9))
+        self._write({
+            'type': 'span',
+            'name': span.name,
+            'trace_id': span.trace_id,
+            'span_id': span.span_id,
+            'parent_span_id': span.parent_id,
+            'start_time': round(span.start, 6),
+            'end_time': round(end, 6),
+            'duration_s': round(end - span.start, 6),
+            'status': 'error' if span.error else 'ok',
+            'error': span.error,
+            'attributes': span.attributes,
+            'pid': os.getpid(),
+        })
+    
+    def span(self, name: str, **attributes):
+        """Context manager timing one phase; yields a TelemetrySpan (or None when disabled)."""
+        import contextlib
+        
+        if not self.enabled:
+            return contextlib.nullcontext()
+        
+        @contextlib.contextmanager
+        def run():
+            span = self._start(name, attributes)
+            token = self._current.set(span)
+            try:
+                yield span
+            except BaseException as e:
+                span.set_error(f"{type(e).__name__}: {e}")
+                raise
+            finally:
+                self._current.reset(token)
+                self._finish(span)
+        
+        return run()
+    
+    def record_span(self, name: str, start: float, end: float, error: Optional[str] = None, **attributes):
+        """Record an already finished interval (wall-clock seconds) under the current span."""
+        if not self.enabled:
+            return
+        span = self._start(name, attributes, start)
+        if error:
+            span.set_error(error)
+        self._finish(span, end)
+    
+    @staticmethod
+    def _key(attributes: Dict[str, Any]) -> str:
+        return ','.join(f"{key}={attributes[key]}" for key in sorted(attributes)) or '-'
+    
+    def _instrument(self, kind: str, name: str, unit: str = '1'):
+        instrument = self._instruments.get(name)
+        if instrument is None and self._meter is not None:
+            factory = {
+                'counter': self._meter.create_counter,
+                'updown': self._meter.create_up_down_counter,
+                'histogram': self._meter.create_histogram,
+            }[kind]
+            instrument = self._instruments[name] = factory(name, unit=unit)
+        return instrument
+    
+    def add(self, name: str, value: float = 1, **attributes):
+        """Increment a monotonic counter (timeouts, failures, hosts)."""
+        self._count('counter', name, value, attributes)
+    
+    def adjust(self, name: str, delta: float, **attributes):
+        """Move an up/down counter such as the number of active nmap workers."""
+        self._count('updown', name, delta, attributes)
+    
+    def _count(self, kind: str, name: str, value: float, attributes: Dict[str, Any]):
+        if not self.enabled:
+            return
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            key = self._key(attributes)
+            series[key] = series.get(key, 0) + value
+        instrument = self._instrument(kind, name)
+        if instrument is not None:
+            instrument.add(value, attributes)
+    
+    def observe(self, name: str, value: float, unit: str = 's', **attributes):
+        """Record one histogram sample (e.g. a host's scan duration)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            stats = series.setdefault(self._key(attributes), {
+                'count': 0, 'sum': 0.0, 'min': value, 'max': value,
+                'buckets': [0] * (len(self.DURATION_BUCKETS) + 1),
+            })
+            stats['count'] += 1
+            stats['sum'] += value
+            stats['min'] = min(stats['min'], value)
+            stats['max'] = max(stats['max'], value)
+            bucket = next((i for i, bound in enumerate(self.DURATION_BUCKETS) if value <= bound),
+                          len(self.DURATION_BUCKETS))
+            stats['buckets'][bucket] += 1
+        instrument = self._instrument('histogram', name, unit)
+        if instrument is not None:
+            instrument.record(value, attributes)
+    
+    def gauge(self, name: str, value: float, **attributes):
+        """Record a point-in-time value such as worker utilisation."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges.setdefault(name, {})[self._key(attributes)] = value
+        instrument = self._instrument('histogram', name)
+        if instrument is not None:
+            instrument.record(value, attributes)
+    
+    def _write(self, record: Dict[str, Any]):
+        if self._fd is None:
+            return
+        line = (json.dumps(record, default=str) + '\n').encode()
+        with self._lock:
+            os.write(self._fd, line)
+    
+    def write_metrics(self):
+        """Write the metrics summary so far (cumulative, like OTLP counters)."""
+        if not self.enabled:
+            return
+        if self._counters or self._histograms or self._gauges:
+            self._write({
+                'type': 'metrics',
+                'time': round(time.time(), 6),
+                'pid': os.getpid(),
+                'duration_buckets': list(self.DURATION_BUCKETS),
+                'counters': self._counters,
+                'histograms': self._histograms,
+                'gauges': self._gauges,
+            })
+    
+    def shutdown(self):
+        """Write the metrics summary and flush exporters."""
+        if not self.enabled:
+            return
+        self.write_metrics()
+        for provider in self._providers:
+            try:
+                provider.shutdown()
+            except Exception as e:
+                print(f"⚠️  Telemetry export failed: {e}")
+        self._providers = []
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        self.enabled = False
+
+
+class ScanAborted(RuntimeError):
+    """A scan stage found the scan cannot go on (reported without a traceback)."""
+
+
+class PipelineStage(NamedTuple):
+    """One node of a StageGraph."""
+    name: str
+    run: Callable[..., Any]
+    after: Tuple[str, ...]
+    default: Any
+    inline: bool
+
+
+class StageGraph:
+    """Small dependency-aware executor for the phases of a scan or export.
+    
+    A stage starts as soon as every stage it runs ``after`` has finished,
+    and is called with their results as keyword arguments. Background
+    stages run on their own threads; ``inline`` stages (the critical path:
+    ARP, host scans, topology) run on the calling thread so interrupts,
+    asyncio and process pools behave as in a sequential run. A stage that
+    raises is recorded as failed: with a ``default`` its dependents carry
+    on with that value, otherwise they are skipped and run() re-raises the
+    error once no stage is still running. Timings and outcomes are kept in
+    ``timings`` for scan_metadata.
+    """
+    
+    REQUIRED = object()
+    
+    def __init__(self):
+        self._stages: Dict[str, PipelineStage] = {}
+        self.timings: Dict[str, Dict[str, Any]] = {}
+        self.errors: Dict[str, BaseException] = {}
+        self.wall_seconds = 0.0
+    
+    def add(self, name: str, run: Callable[..., Any], after: Iterable[str] = (),
+            default: Any = REQUIRED, inline: bool = False):
+        """Add a stage; dependencies must already have been added, so the graph stays acyclic."""
+        after = tuple(after)
+        missing = [dep for dep in after if dep not in self._stages]
+        if name in self._stages or missing:
+            raise ValueError(f"stage {name!r}: duplicate name or unknown dependencies {missing}")
+        self._stages[name] = PipelineStage(name, run, after, default, inline)
+    
+    def _call(self, stage: PipelineStage, inputs: Dict[str, Any], started: float) -> Any:
+        begin = time.perf_counter()
+        timing = self.timings[stage.name] = {'start_s': round(begin - started, 3), 'status': 'running'}
+        try:
+            result = stage.run(**inputs)
+            timing['status'] = 'ok'
+            return result
+        except Exception as e:
+            timing['status'] = 'failed'
+            timing['error'] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            timing['duration_s'] = round(time.perf_counter() - begin, 3)
+    
+    def run(self, raise_errors: bool = True) -> Dict[str, Any]:
+        """Run every stage; returns their results by name."""
+        import contextvars
+        import queue
+        
+        started = time.perf_counter()
+        results: Dict[str, Any] = {}
+        pending = dict(self._stages)
+        running = 0
+        finished: Any = queue.Queue()
+        
+        def finish(stage: PipelineStage, call: Callable[[], Any]):
+            try:
+                results[stage.name] = call()
+            except Exception as e:
+                self.errors[stage.name] = e
+                if stage.default is not self.REQUIRED:
+                    print(f"⚠️  Stage {stage.name} failed ({e}) - continuing without it")
+                    results[stage.name] = stage.default
+        
+        def background(stage: PipelineStage, inputs: Dict[str, Any]):
+            try:
+                finished.put((stage, self._call(stage, inputs, started), None))
+            except Exception as e:
+                finished.put((stage, None, e))
+        
+        def collect(stage: PipelineStage, result: Any, error: Optional[Exception]):
+            if error is None:
+                finish(stage, lambda: result)
+            else:
+                def fail():
+                    raise error
+                finish(stage, fail)
+        
+        try:
+            while pending or running:
+                if raise_errors and any(self._stages[name].default is self.REQUIRED for name in self.errors):
+                    break
+                ready = []
+                for name, stage in list(pending.items()):
+                    if any((dep in self.errors and dep not in results)
+                           or self.timings.get(dep, {}).get('status') == 'skipped' for dep in stage.after):
+                        del pending[name]
+                        self.timings[name] = {'status': 'skipped'}
+                    elif all(dep in results for dep in stage.after):
+                        del pending[name]
+                        inputs = {dep: results[dep] for dep in stage.after}
+                        if stage.inline:
+                            ready.append((stage, inputs))
+                        else:
+                            # Daemon threads, so a failed or interrupted run never waits for a
+                            # slow background stage (a 30 s Bluetooth scan) to exit
+                            threading.Thread(
+                                target=contextvars.copy_context().run, args=(background, stage, inputs),
+                                name=f"stage-{name}", daemon=True,
+                            ).start()
+                            running += 1
+                if ready:
+                    for stage, inputs in ready:
+                        finish(stage, lambda: self._call(stage, inputs, started))
+                elif running:
+                    collect(*finished.get())
+                    running -= 1
+                elif pending:
+                    break
+                while running and not finished.empty():
+                    collect(*finished.get())
+                    running -= 1
+        finally:
+            self.wall_seconds = time.perf_counter() - started
+        
+        if raise_errors:
+            for name, error in self.errors.items():
+                if self._stages[name].default is self.REQUIRED:
+                    raise error
+        return results
+    
+    def summary(self) -> Dict[str, Any]:
+        """Per-stage timings plus the wall time saved by running stages concurrently."""
+        busy = sum(timing.get('duration_s', 0) for timing in self.timings.values())
+        return {
+            'stages': self.timings,
+            'wall_s': round(self.wall_seconds, 3),
+            'stage_sum_s': round(busy, 3),
+        }
 
 
 class NetworkTopologyMapper:
@@ -42,6 +3168,8 @@ class NetworkTopologyMapper:
         self,
         output_file: str = "network-topology.json",
         interface: Optional[str] = None,
+        interfaces: Optional[List[str]] = None,
+        targets: Optional[List[str]] = None,
         nmap_timeout: int = 900,
         nmap_parallelism: int = 6,
         nmap_min_rate: Optional[int] = 300,
@@ -50,9 +3178,39 @@ class NetworkTopologyMapper:
         nmap_max_parallelism: Optional[int] = None,
         nmap_initial_rtt: Optional[str] = "250ms",
         nmap_max_rtt: Optional[str] = "1000ms",
+        nmap_host_group_size: int = 1,
+        scan_mode: str = "single-pass",
+        sweep_timeout: int = 300,
+        sweep_parallelism: Optional[int] = None,
+        cache_file: Optional[str] = None,
+        cache_ttl: int = 86400,
+        cache_max_entries: int = 10000,
+        journal: bool = True,
+        resume: bool = False,
+        output_format: str = "json",
+        max_workers: Optional[int] = None,
+        adaptive_concurrency: bool = True,
+        pipeline_discovery: bool = True,
+        arp_rate: int = 5000,
+        rate_budget: Optional[float] = None,
+        passive: bool = False,
+        pcap_files: Optional[List[str]] = None,
+        passive_only: bool = False,
+        ipv6: bool = False,
+        otlp_endpoint: Optional[str] = None,
+        telemetry_file: Optional[str] = None,
+        sqlite_path: Optional[str] = None,
+        project_id: Optional[str] = None,
+        archive_path: Optional[str] = None,
     ):
+        self._config = {
+            key: value for key, value in locals().items()
+            if key not in ('self', '__class__')
+        }
         self.output_file = output_file
-        self.interface = interface
+        self.interfaces = list(interfaces or ([interface] if interface else []))
+        self.interface = self.interfaces[0] if self.interfaces else None
+        self.targets = list(targets or [])
         self.nmap_timeout = nmap_timeout
         self.nmap_parallelism = max(1, nmap_parallelism)
         self.nmap_min_rate = nmap_min_rate
@@ -61,13 +3219,64 @@ class NetworkTopologyMapper:
         self.nmap_max_parallelism = nmap_max_parallelism
         self.nmap_initial_rtt = nmap_initial_rtt
         self.nmap_max_rtt = nmap_max_rtt
-        self.discovered_devices = {}
-        self.topology_edges = []
+        self.nmap_host_group_size = max(1, nmap_host_group_size)
+        self.scan_mode = scan_mode
+        self.sweep_timeout = sweep_timeout
+        self.sweep_parallelism = max(1, sweep_parallelism or self.nmap_parallelism)
+        self.max_workers = max_workers
+        self.adaptive_concurrency = adaptive_concurrency
+        self.pipeline_discovery = pipeline_discovery
+        self.arp_rate = max(1, arp_rate)
+        self.rate_budget = rate_budget
+        self.rate_governor = RateGovernor(rate_budget) if rate_budget is not None else None
+        self.passive = passive or passive_only
+        self.pcap_files = list(pcap_files or [])
+        self.passive_only = passive_only
+        self.ipv6 = ipv6
+        self._ipv6_scopes: Dict[str, str] = {}
+        self.scan_cache = ScanCache(cache_file, cache_ttl, cache_max_entries) if cache_file else None
+        self.journal = ScanJournal.for_output(output_file) if journal or resume else None
+        self.resume = resume
+        self.output_format = output_format
+        self.result_stream = NdjsonResultWriter(Path(output_file)) if output_format == 'ndjson' else None
+        self.store_sink = SqliteResultSink(Path(sqlite_path), project_id) if sqlite_path and project_id else None
+        self.archive_path = Path(archive_path) if archive_path else None
+        self.discovered_devices: Dict[str, Device] = {}
+        self._record_lock = threading.Lock()
+        self._device_sink: Optional[Callable[[Dict[str, Any], Dict[str, Any]], None]] = None
+        self._linux_network = LinuxNetworkConfig()
+        self._tool_paths: Dict[str, Optional[str]] = {}
+        self.topology_graph = TopologyGraph()
+        # What each device last contributed to topology_graph: (category, traceroute hops)
+        self._topology_inputs: Dict[str, Tuple[str, Tuple[str, ...]]] = {}
+        # Segments found by the first scan_network(); reused by later ones on this mapper
+        self._known_segments: Optional[List[Dict[str, Any]]] = None
+        self.telemetry = ScanTelemetry(otlp_endpoint, telemetry_file)
         self.scan_metadata: Dict[str, Any] = {
             "scan_time": datetime.now().isoformat(),
             "scanner_version": "1.0.0",
             "scan_type": "comprehensive",
         }
+    
+    def prepare_rescan(self, redetect: bool = False):
+        """Ready this mapper for another scan_network(), keeping its warm state.
+        
+        The previous run's device records and metadata are dropped, so every
+        host is swept again (unchanged ones are restored from the scan
+        cache). The detected segments, tool lookups, netlink handle, scan
+        cache and topology graph are kept, and determine_network_topology()
+        only applies what changed. ``redetect`` resolves the segments again.
+        """
+        self.discovered_devices = {}
+        self.scan_metadata = {
+            "scan_time": datetime.now().isoformat(),
+            "scanner_version": "1.0.0",
+            "scan_type": "comprehensive",
+        }
+        if self.rate_budget is not None:
+            self.rate_governor = RateGovernor(self.rate_budget)
+        if redetect:
+            self._known_segments = None
         
     def check_prerequisites(self) -> bool:
         """Verify required tools are available."""
@@ -96,20 +3305,25 @@ class NetworkTopologyMapper:
         return all_ok
     
     def _command_exists(self, command: str) -> bool:
-        """Check if a command exists in PATH."""
-        try:
-            subprocess.run(
-                ["which", command],
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-                check=True
-            )
-            return True
-        except subprocess.CalledProcessError:
-            return False
+        """Check if a command exists in PATH (looked up once per run)."""
+        if command not in self._tool_paths:
+            self._tool_paths[command] = shutil.which(command)
+        return self._tool_paths[command] is not None
     
-    def get_local_network_info(self) -> Dict[str, Any]:
-        """Get information about the local network."""
+    def get_local_network_info(self, interface: Optional[str] = None) -> Dict[str, Any]:
+        """Get information about the local network (optionally for one interface).
+        
+        On Linux this is read natively from netlink and /proc; other
+        platforms (or a Linux host where that fails) use route/ifconfig.
+        """
+        if sys.platform.startswith('linux'):
+            try:
+                info = self._linux_network.network_info(interface or self.interface)
+                if info.get('network_cidr'):
+                    return info
+            except Exception as e:
+                print(f"⚠️  Native network detection failed ({e}), falling back to route/ifconfig")
+        
         info = {}
         
         try:
@@ -129,8 +3343,10 @@ class NetworkTopologyMapper:
                         info['interface'] = line.split()[-1]
             
             # Get local IP and netmask
-            if 'interface' in info or self.interface:
-                iface = self.interface or info.get('interface', 'en0')
+            interface = interface or self.interface
+            if 'interface' in info or interface:
+                iface = interface or info.get('interface', 'en0')
+                info['interface'] = iface
                 result = subprocess.run(
                     ["ifconfig", iface],
                     capture_output=True,
@@ -164,21 +3380,59 @@ class NetworkTopologyMapper:
         
         return info
     
-    def arp_scan(self, network: str) -> List[Dict[str, str]]:
-        """Perform ARP scan to discover live hosts."""
+    def arp_scan(
+        self,
+        network: str,
+        on_device: Optional[Callable[[Dict[str, str]], None]] = None,
+    ) -> List[Dict[str, str]]:
+        """Perform ARP scan to discover live hosts.
+        
+        ``on_device`` is called once per host found: as each reply arrives
+        with the raw sweeper, or when the scapy / nmap fallback finishes.
+        Under a --rate-budget the sweep reserves its share of the budget
+        first and every fallback is paced to it.
+        """
         print(f"\n🔎 Performing ARP scan on {network}...")
-        devices = []
+        governor = self.rate_governor
+        if governor is None:
+            return self._arp_scan(network, on_device, None)
+        # Pipelined deep scans start while the sweep is still sending
+        peers = self.nmap_parallelism + 1 if self._pipeline_discovery() else 1
+        rate = governor.reserve(self.arp_rate, peers)
+        print(f"  🚦 ARP sweep paced to {rate:g} pps of the {governor.budget:g} pps budget")
+        try:
+            return self._arp_scan(network, on_device, rate)
+        finally:
+            governor.release(rate)
+            self.scan_metadata['rate_budget'] = governor.summary()
+    
+    def _arp_scan(
+        self,
+        network: str,
+        on_device: Optional[Callable[[Dict[str, str]], None]],
+        budget_rate: Optional[float],
+    ) -> List[Dict[str, str]]:
+        raw_devices = self._raw_arp_scan(network, on_device, budget_rate)
+        # A sweep that ran is final even when nobody answered; only an
+        # engine that could not run falls back to the next, slower one
+        swept = raw_devices is not None
+        devices = raw_devices or []
+        streamed = len(devices)
         
-        if SCAPY_AVAILABLE:
+        scapy = _load_scapy() if not swept else None
+        if scapy is not None:
             try:
                 # Scapy-based ARP scan
-                arp_request = ARP(pdst=network)
-                broadcast = Ether(dst="ff:ff:ff:ff:ff:ff")
+                arp_request = scapy.ARP(pdst=network)
+                broadcast = scapy.Ether(dst="ff:ff:ff:ff:ff:ff")
                 arp_request_broadcast = broadcast / arp_request
                 
                 # Set timeout and verbose off
-                conf.verb = 0
-                answered_list = srp(arp_request_broadcast, timeout=3, retry=2)[0]
+                scapy.conf.verb = 0
+                srp_kwargs: Dict[str, Any] = {'iface': self.interface} if self.interface else {}
+                if budget_rate:
+                    srp_kwargs['inter'] = 1 / budget_rate
+                answered_list = scapy.srp(arp_request_broadcast, timeout=3, retry=2, **srp_kwargs)[0]
                 
                 for sent, received in answered_list:
                     devices.append({
@@ -187,16 +3441,22 @@ class NetworkTopologyMapper:
                         'discovered_by': 'arp_scapy'
                     })
                     print(f"  Found: {received.psrc} ({received.hwsrc})")
+                swept = True
                 
             except Exception as e:
                 print(f"⚠️  Scapy ARP scan failed: {e}, falling back to system arp")
         
         # Fallback: use system arp-scan or nmap
-        if not devices:
+        if not swept:
             try:
                 # Try nmap for ARP scan (requires root)
+                cmd = ["nmap", "-sn", "-PR", network]
+                if self.interface:
+                    cmd.extend(["-e", self.interface])
+                if budget_rate:
+                    cmd.extend(["--max-rate", self._rate_arg(budget_rate)])
                 result = subprocess.run(
-                    ["nmap", "-sn", "-PR", network],
+                    cmd,
                     capture_output=True,
                     text=True,
                     timeout=120
@@ -225,13 +3485,56 @@ class NetworkTopologyMapper:
             except Exception as e:
                 print(f"⚠️  Nmap ARP scan failed: {e}")
         
+        if on_device is not None:
+            for device in devices[streamed:]:
+                on_device(device)
         print(f"✓ ARP scan complete: {len(devices)} devices found")
         return devices
     
-    def intensive_nmap_scan(self, target: str) -> Dict[str, Any]:
-        """Perform intensive nmap scan on a target."""
-        device_info = {
-            'ip': target,
+    def _raw_arp_scan(
+        self,
+        network: str,
+        on_device: Optional[Callable[[Dict[str, str]], None]] = None,
+        rate: Optional[float] = None,
+    ) -> Optional[List[Dict[str, str]]]:
+        """Sweep a directly attached network with RawArpSweeper, if possible.
+        
+        Returns None when the sweep could not run or failed, so the caller
+        can tell that apart from a sweep that found no hosts.
+        """
+        if not sys.platform.startswith('linux') or os.geteuid() != 0:
+            return None
+        try:
+            net = ipaddress.IPv4Network(network, strict=False)
+            local = next(
+                (a for a in self._linux_network.addresses()
+                 if a['family'] == 4
+                 and (self.interface is None or a['interface'] == self.interface)
+                 and ipaddress.IPv4Address(a['address']) in net
+                 and not ipaddress.IPv4Address(a['address']).is_loopback),
+                None,
+            )
+            if local is None:
+                return None
+            
+            rate = rate or self.arp_rate
+            sweeper = RawArpSweeper(local['interface'], local['address'], rate=rate)
+            started = time.monotonic()
+            devices = sweeper.sweep(network, on_device)
+            elapsed = time.monotonic() - started
+            for device in devices:
+                print(f"  Found: {device['ip']} ({device['mac']})")
+            print(f"  ⚡ Raw ARP sweep: {sweeper.packets_sent} requests on {local['interface']} "
+                  f"at ≤{rate:g} pps in {elapsed:.1f}s")
+            return devices
+        except Exception as e:
+            print(f"⚠️  Raw ARP sweep failed: {e}, falling back")
+            return None
+    
+    def _empty_device_info(self, ip: str) -> Dict[str, Any]:
+        """Baseline device record used before (or instead of) nmap results."""
+        return {
+            'ip': ip,
             'scan_time': datetime.now().isoformat(),
             'ports': [],
             'services': [],
@@ -239,94 +3542,394 @@ class NetworkTopologyMapper:
             'device_type': 'unknown',
             'distance_hops': None
         }
-        
-        print(f"  🔬 Scanning {target}...")
-        
-        try:
-            # Comprehensive nmap scan
-            # -sS: SYN stealth scan
-            # -sV: Version detection
-            # -O: OS detection
-            # -A: Aggressive scan (OS, version, script, traceroute)
-            # -T4: Faster timing
-            # --traceroute: Trace hops to target
-            # -oX: XML output
-            
-            xml_file = f"/tmp/nmap_{target.replace('.', '_')}.xml"
-            
-            cmd = [
-                "nmap",
-                "-sS",
-                "-sV",
-                "-O",
-                "-A",
-                "-vv",
-                "-T4",
-                "--reason",
-                "--host-timeout", f"{self.nmap_timeout}s",
-                "--max-retries", str(self.nmap_max_retries),
-                "--traceroute",
-                "--script=default,discovery,version and not (hostmap-robtex or http-robtex-shared-ns or targets-asn)",
-                "-p-",  # Scan all 65535 ports
-                "-oX", xml_file,
-                target
-            ]
+    
+    def _nmap_tuning_args(self, targets: List[str]) -> List[str]:
+        """Timing and parallelism flags shared by every nmap stage."""
+        args = []
+
+        if len(targets) > 1:
+            # Keep the whole group in one nmap host group so every host
+            # runs concurrently and the per-host timeout still bounds the run
+            args.extend(["--min-hostgroup", str(len(targets))])
 
-            if self.nmap_min_rate is not None:
-                cmd.extend(["--min-rate", str(self.nmap_min_rate)])
+        if self.nmap_min_rate is not None:
+            args.extend(["--min-rate", str(self.nmap_min_rate)])
 
-            if self.nmap_min_parallelism is not None:
-                cmd.extend(["--min-parallelism", str(self.nmap_min_parallelism)])
+        if self.nmap_min_parallelism is not None:
+            args.extend(["--min-parallelism", str(self.nmap_min_parallelism)])
 
-            if self.nmap_max_parallelism is not None:
-                cmd.extend(["--max-parallelism", str(self.nmap_max_parallelism)])
+        if self.nmap_max_parallelism is not None:
+            args.extend(["--max-parallelism", str(self.nmap_max_parallelism)])
+
+        if self.nmap_initial_rtt is not None:
+            args.extend(["--initial-rtt-timeout", str(self.nmap_initial_rtt)])
+
+        if self.nmap_max_rtt is not None:
+            args.extend(["--max-rtt-timeout", str(self.nmap_max_rtt)])
+
+        return args
+    
+    def _build_nmap_command(self, targets: List[str], ports: Optional[List[int]] = None) -> List[str]:
+        """Build the intensive nmap command line for one or more targets.
+        
+        ``ports`` restricts the scan to a known open-port list (two-phase
+        mode); by default all 65535 ports are scanned.
+        """
+        # Comprehensive nmap scan
+        # -sS: SYN stealth scan
+        # -sV: Version detection
+        # -O: OS detection
+        # -A: Aggressive scan (OS, version, script, traceroute)
+        # -T4: Faster timing
+        # --traceroute: Trace hops to target
+        # -oX -: XML output streamed on stdout
+        cmd = [
+            "nmap",
+            "-sS",
+            "-sV",
+            "-O",
+            "-A",
+            "-vv",
+            "-T4",
+            "--reason",
+            "--host-timeout", f"{self.nmap_timeout}s",
+            "--max-retries", str(self.nmap_max_retries),
+            "--traceroute",
+            "--script=default,discovery,version and not (hostmap-robtex or http-robtex-shared-ns or targets-asn)",
+        ]
 
-            if self.nmap_initial_rtt is not None:
-                cmd.extend(["--initial-rtt-timeout", str(self.nmap_initial_rtt)])
+        if ports:
+            cmd.extend(["-p", ",".join(str(port) for port in ports)])
+        else:
+            cmd.append("-p-")  # Scan all 65535 ports
 
-            if self.nmap_max_rtt is not None:
-                cmd.extend(["--max-rtt-timeout", str(self.nmap_max_rtt)])
-            print(f"    ➜ Nmap command: {' '.join(cmd)}")
+        cmd.extend(["-oX", "-"])
+        cmd.extend(self._nmap_tuning_args(targets))
+        cmd.extend(self._nmap_targets(targets))
+        return cmd
+    
+    def _build_port_sweep_command(self, targets: List[str]) -> List[str]:
+        """Build the stage-1 SYN-only sweep that just finds open TCP ports."""
+        # -Pn: hosts already answered ARP, skip host discovery
+        # -n: no reverse DNS, the deep scan resolves names
+        # --open: only report open ports
+        cmd = [
+            "nmap",
+            "-sS",
+            "-Pn",
+            "-n",
+            "-T4",
+            "--open",
+            "--host-timeout", f"{self.sweep_timeout}s",
+            "--max-retries", str(self.nmap_max_retries),
+            "-p-",
+            "-oX", "-",
+        ]
+        cmd.extend(self._nmap_tuning_args(targets))
+        cmd.extend(self._nmap_targets(targets))
+        return cmd
+    
+    def _nmap_targets(self, targets: List[str]) -> List[str]:
+        """Target arguments, with -6 and interface scopes for IPv6 host groups."""
+        if not any(':' in target for target in targets):
+            return list(targets)
+        return ["-6"] + [
+            f"{target}%{self._ipv6_scopes[target]}" if target in self._ipv6_scopes else target
+            for target in targets
+        ]
+    
+    def _build_host_probe_command(self, targets: List[str]) -> List[str]:
+        """Build the follow-up for hosts the sweep found no open ports on.
+        
+        There is nothing to deep-scan, but the hostname, hop distance and
+        traceroute the deep scan would have reported are still needed for
+        the output and topology.
+        """
+        # -sn: no port scan, only host discovery
+        # --traceroute: hops for the topology (DNS names are resolved, unlike the sweep)
+        cmd = [
+            "nmap",
+            "-sn",
+            "-T4",
+            "--traceroute",
+            "--host-timeout", f"{self.sweep_timeout}s",
+            "--max-retries", str(self.nmap_max_retries),
+            "-oX", "-",
+        ]
+        cmd.extend(self._nmap_tuning_args(targets))
+        cmd.extend(self._nmap_targets(targets))
+        return cmd
+    
+    def intensive_nmap_scan(self, target: str) -> Dict[str, Any]:
+        """Perform intensive nmap scan on a target."""
+        return self.intensive_nmap_scan_group([target])[target]
+    
+    def intensive_nmap_scan_group(
+        self,
+        targets: List[str],
+        on_result: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+        ports: Optional[List[int]] = None,
+    ) -> Dict[str, Dict[str, Any]]:
+        """Perform one intensive nmap run over a group of targets.
+        
+        Results are split back per IP and handed to ``on_result`` as soon as
+        nmap closes each <host>. Hosts that nmap timed out, or that are
+        missing from the output, carry a 'scan_error' of their own so a
+        single bad host does not discard the rest of the group.
+        """
+        import asyncio
+        
+        job = self._deep_scan_job(targets, ports)
+        return asyncio.run(self._nmap_group_async(job, on_result))[0]
+    
+    def port_sweep_group(
+        self,
+        targets: List[str],
+        on_result: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    ) -> Dict[str, Dict[str, Any]]:
+        """Stage 1 of the two-phase pipeline: SYN sweep for open ports only."""
+        import asyncio
+        
+        return asyncio.run(self._nmap_group_async(self._sweep_job(targets), on_result))[0]
+    
+    def _deep_scan_job(self, targets: List[str], ports: Optional[List[int]] = None) -> NmapJob:
+        """Intensive scan job for a host group, optionally limited to ``ports``."""
+        # Allow buffer over host timeout
+        return NmapJob('deep', targets, self._build_nmap_command(targets, ports), self.nmap_timeout + 60)
+    
+    def _sweep_job(self, targets: List[str]) -> NmapJob:
+        """Stage-1 port sweep job for a host group."""
+        return NmapJob('sweep', targets, self._build_port_sweep_command(targets), self.sweep_timeout + 60)
+    
+    def _host_probe_job(self, targets: List[str]) -> NmapJob:
+        """Name and route lookup job for swept hosts without open ports."""
+        return NmapJob('probe', targets, self._build_host_probe_command(targets), self.sweep_timeout + 60)
+    
+    def _group_label(self, targets: List[str]) -> str:
+        """Short human-readable name for a host group in progress output."""
+        if len(targets) == 1:
+            return targets[0]
+        return f"{len(targets)} hosts ({targets[0]} .. {targets[-1]})"
+    
+    async def _nmap_group_async(
+        self,
+        job: NmapJob,
+        on_result: Optional[Callable[[str, Dict[str, Any]], None]],
+    ) -> Tuple[Dict[str, Dict[str, Any]], bool]:
+        """Run one nmap job and split its output per IP.
+        
+        Returns the per-IP results and whether the run was healthy (no
+        process failure and no host timeouts) for the concurrency controller.
+        """
+        label = self._group_label(job.targets)
+        if job.kind == 'sweep':
+            print(f"  ⚡ Sweeping ports on {label}...")
+        elif job.kind == 'probe':
+            print(f"  🔎 Resolving and tracing {label}...")
+        else:
+            print(f"  🔬 Scanning {label}...")
+            print(f"    ➜ Nmap command: {' '.join(job.cmd)}")
             print(f"    ⏱️  Host timeout: {self.nmap_timeout}s")
-            
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=self.nmap_timeout + 60  # Allow buffer over host timeout
+        
+        results = {ip: self._empty_device_info(ip) for ip in job.targets}
+        pending = set(job.targets)
+        healthy = True
+        telemetry = self.telemetry
+        started = time.time()
+        
+        def record_host(ip: str, error: Optional[str]):
+            if not telemetry.enabled:
+                return
+            finished = time.time()
+            outcome = 'ok' if not error else ('timeout' if 'timeout' in error else 'failed')
+            telemetry.record_span('nmap.host', started, finished, error, ip=ip, stage=job.kind, outcome=outcome)
+            telemetry.observe('nmap.host.duration', finished - started, stage=job.kind, outcome=outcome)
+            if outcome == 'timeout':
+                telemetry.add('nmap.host.timeouts', stage=job.kind)
+        
+        def handle_host(ip: str, host_info: Dict[str, Any]):
+            nonlocal healthy
+            if ip not in pending:
+                return
+            pending.discard(ip)
+            results[ip].update(host_info)
+            if 'scan_error' in host_info:
+                healthy = False
+            record_host(ip, host_info.get('scan_error'))
+            if on_result:
+                on_result(ip, results[ip])
+        
+        with telemetry.span(f"nmap.{job.kind}", targets=len(job.targets), label=label) as span:
+            group_error = await self._run_nmap_async(job.cmd, job.timeout, handle_host, label, span)
+            if group_error and span is not None:
+                telemetry.add('nmap.run.failures', stage=job.kind)
+                span.set_error(group_error)
+        
+            for ip in job.targets:
+                if ip in pending:
+                    results[ip]['scan_error'] = group_error or "no result in nmap output"
+                    record_host(ip, results[ip]['scan_error'])
+                    if on_result:
+                        on_result(ip, results[ip])
+        
+        return results, healthy and group_error is None
+    
+    async def _run_nmap_async(
+        self,
+        cmd: List[str],
+        timeout: float,
+        on_host: Callable[[str, Dict[str, Any]], None],
+        label: str,
+        span: Optional[TelemetrySpan] = None,
+    ) -> Optional[str]:
+        """Run nmap with XML on stdout, parsing hosts as they are written.
+        
+        Returns an error description when the run failed as a whole, or
+        None on success. The process is killed on timeout and on
+        cancellation, keeping every host that completed before that. Time
+        spent parsing XML is added to ``span`` as ``xml_parse_seconds``.
+        """
+        import asyncio
+        
+        stderr_tail: deque = deque(maxlen=20)
+        
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
             )
-            
-            if result.returncode == 0 and Path(xml_file).exists():
-                device_info.update(self._parse_nmap_xml(xml_file))
-                Path(xml_file).unlink()  # Clean up
-            else:
-                print(f"    ⚠️  Nmap scan returned code {result.returncode}")
-                if result.stdout:
-                    print("    ⚠️  Nmap stdout (truncated):")
-                    print("\n".join(result.stdout.splitlines()[-20:]))
-                if result.stderr:
-                    print("    ⚠️  Nmap stderr (truncated):")
-                    print("\n".join(result.stderr.splitlines()[-20:]))
+        except Exception as e:
+            print(f"    ⚠️  Error scanning {label}: {e}")
+            return str(e)
+        
+        async def drain_stderr():
+            while True:
+                line = await proc.stderr.readline()
+                if not line:
+                    break
+                stderr_tail.append(line.decode(errors='replace').rstrip())
+        
+        stream = NmapXmlStream(self._parse_nmap_host)
+        parse_seconds = 0.0
+        
+        def parse(chunk: Optional[bytes]) -> List[Tuple[str, Dict[str, Any]]]:
+            nonlocal parse_seconds
+            parse_started = time.perf_counter()
+            hosts = stream.feed(chunk) if chunk is not None else stream.close()
+            parse_seconds += time.perf_counter() - parse_started
+            return hosts
+        
+        async def read_xml():
+            while True:
+                chunk = await proc.stdout.read(65536)
+                if not chunk:
+                    break
+                for ip, host_info in parse(chunk):
+                    on_host(ip, host_info)
+            for ip, host_info in parse(None):
+                on_host(ip, host_info)
+            await proc.wait()
+        
+        stderr_task = asyncio.ensure_future(drain_stderr())
+        try:
+            await asyncio.wait_for(read_xml(), timeout)
+        except asyncio.TimeoutError:
+            print(f"    ⚠️  Scan timeout for {label}")
+            return "scan timeout"
+        except Exception as e:
+            print(f"    ⚠️  Error scanning {label}: {e}")
+            return str(e)
+        finally:
+            # Also reached on cancellation (Ctrl-C): never leave nmap running
+            if proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+            stderr_task.cancel()
+            if span is not None:
+                span.set_attribute('xml_parse_seconds', round(parse_seconds, 6))
+        
+        if proc.returncode != 0:
+            print(f"    ⚠️  Nmap scan returned code {proc.returncode}")
+            if stderr_tail:
+                print("    ⚠️  Nmap stderr (truncated):")
+                print("\n".join(stderr_tail))
+            return f"nmap returned code {proc.returncode}"
+        
+        if stream.error:
+            print(f"    ⚠️  Error parsing nmap XML: {stream.error}")
+        
+        return None
+    
+    def _parse_nmap_xml(self, xml_file: str) -> Dict[str, Any]:
+        """Parse nmap XML output."""
+        hosts = self._parse_nmap_xml_hosts(xml_file)
+        return next(iter(hosts.values()), {})
+    
+    def _parse_nmap_xml_hosts(self, xml_file: str) -> Dict[str, Dict[str, Any]]:
+        """Parse nmap XML output holding any number of hosts, keyed by IP."""
+        hosts = {}
+        stream = NmapXmlStream(self._parse_nmap_host)
         
-        except subprocess.TimeoutExpired:
-            print(f"    ⚠️  Scan timeout for {target}")
+        try:
+            with open(xml_file, 'rb') as f:
+                for chunk in iter(lambda: f.read(65536), b''):
+                    hosts.update(stream.feed(chunk))
+            hosts.update(stream.close())
         except Exception as e:
-            print(f"    ⚠️  Error scanning {target}: {e}")
+            print(f"    ⚠️  Error parsing nmap XML: {e}")
+            return hosts
         
-        return device_info
+        if stream.error:
+            # Truncated document from an interrupted run: every <host> closed
+            # before the cut-off has already been collected
+            print(f"    ⚠️  Nmap XML ended early ({stream.error}); kept {len(hosts)} complete host(s)")
+        
+        return hosts
     
-    def _parse_nmap_xml(self, xml_file: str) -> Dict[str, Any]:
-        """Parse nmap XML output."""
+    def _parse_nmap_xml_archive(self, xml_file: str) -> Dict[str, Tuple[float, Dict[str, Any]]]:
+        """Parse a saved nmap XML file for offline ingest.
+        
+        Like _parse_nmap_xml_hosts, but each host also carries its MAC
+        address and vendor and is paired with the time nmap finished it
+        (host endtime/starttime, else the run start, else the file mtime)
+        so records from several files can be merged newest-first.
+        """
+        mtime = os.path.getmtime(xml_file)
+        
+        def parse_host(elem):
+            ip, info = self._parse_nmap_host(elem)
+            for address in elem.findall('address'):
+                if address.get('addrtype') == 'mac':
+                    info['mac'] = address.get('addr', '').lower()
+                    if address.get('vendor'):
+                        info['mac_vendor'] = address.get('vendor')
+            run = stream.root
+            stamp = elem.get('endtime') or elem.get('starttime') or (run.get('start') if run is not None else None)
+            return ip, (float(stamp) if stamp else mtime, info)
+        
+        hosts = {}
+        stream = NmapXmlStream(parse_host)
+        with open(xml_file, 'rb') as f:
+            for chunk in iter(lambda: f.read(65536), b''):
+                hosts.update(stream.feed(chunk))
+        hosts.update(stream.close())
+        if stream.error:
+            print(f"    ⚠️  {xml_file}: XML ended early ({stream.error}); kept {len(hosts)} complete host(s)")
+        return hosts
+    
+    def _parse_nmap_host(self, host: 'ET.Element') -> Tuple[Optional[str], Dict[str, Any]]:
+        """Parse a single nmap <host> element into (ip, device info)."""
         info = {}
+        ip = None
         
         try:
-            tree = ET.parse(xml_file)
-            root = tree.getroot()
+            for address in host.findall('address'):
+                if address.get('addrtype') in ('ipv4', 'ipv6'):
+                    # Scoped link-local targets may come back as fe80::1%eth0
+                    ip = address.get('addr', '').split('%')[0] or None
+                    break
             
-            # Get host info
-            host = root.find('host')
-            if host is None:
-                return info
+            if host.get('timedout') == 'true':
+                info['scan_error'] = 'host timeout'
             
             # Hostname
             hostnames = host.find('hostnames')
@@ -415,7 +4018,7 @@ class NetworkTopologyMapper:
         except Exception as e:
             print(f"    ⚠️  Error parsing nmap XML: {e}")
         
-        return info
+        return ip, info
     
     def bluetooth_scan(self) -> List[Dict[str, str]]:
         """Scan for nearby Bluetooth devices."""
@@ -456,92 +4059,93 @@ class NetworkTopologyMapper:
         print(f"✓ Bluetooth scan complete: {len(devices)} devices found")
         return devices
     
+    ROUTER_TYPES = frozenset(['router', 'firewall'])
+    SWITCH_TYPES = frozenset(['switch'])
+    ACCESS_POINT_TYPES = frozenset(['WAP', 'wireless-access-point'])
+    WEB_SERVICES = frozenset(['http', 'https', 'upnp'])
+    NETWORK_VENDORS = frozenset(['cisco', 'juniper', 'mikrotik', 'ubiquiti'])
+    
     def determine_network_topology(self) -> Dict[str, Any]:
-        """Analyze traceroute data to determine network structure."""
+        """Analyze traceroute data to determine network structure.
+        
+        topology_graph is updated in place: only devices whose category or
+        traceroute changed since the last call are withdrawn and re-added,
+        and devices that are gone are withdrawn, so a rescan of a mostly
+        unchanged network costs little.
+        """
         print("\n🗺️  Analyzing network topology...")
         
-        topology = {
-            'gateway': None,
-            'switches': [],
-            'routers': [],
-            'endpoints': [],
-            'access_points': [],
-            'connections': []
-        }
+        graph = self.topology_graph
+        applied = self._topology_inputs
         
         # Identify gateway
         network_info = self.scan_metadata.get('network_info', {})
-        if 'gateway' in network_info:
-            topology['gateway'] = network_info['gateway']
+        gateway = network_info.get('gateway')
         
-        # Categorize devices
+        current: Dict[str, Tuple[str, Tuple[str, ...]]] = {}
         for ip, device in self.discovered_devices.items():
-            device_type = device.get('device_type', 'unknown')
-            
-            if device_type in ['router', 'firewall']:
-                topology['routers'].append(ip)
-            elif device_type in ['switch']:
-                topology['switches'].append(ip)
-            elif device_type in ['WAP', 'wireless-access-point']:
-                topology['access_points'].append(ip)
-            else:
-                # Check services to infer device type
-                services = device.get('services', [])
-                service_names = [s.get('service', '') for s in services]
-                
-                if any(s in ['http', 'https', 'upnp'] for s in service_names):
-                    # Could be router/access point
-                    if device.get('os_detection', {}).get('vendor', '').lower() in ['cisco', 'juniper', 'mikrotik', 'ubiquiti']:
-                        topology['routers'].append(ip)
-                    else:
-                        topology['endpoints'].append(ip)
-                else:
-                    topology['endpoints'].append(ip)
-            
-            # Analyze traceroute for connections
-            traceroute = device.get('traceroute', [])
-            if traceroute:
-                prev_hop = None
-                for hop in traceroute:
-                    hop_ip = hop.get('ip')
-                    if hop_ip and prev_hop:
-                        connection = {
-                            'from': prev_hop,
-                            'to': hop_ip,
-                            'type': 'l3_route'
-                        }
-                        if connection not in topology['connections']:
-                            topology['connections'].append(connection)
-                    prev_hop = hop_ip
-                
-                # Connect last hop to target
-                if prev_hop and prev_hop != ip:
-                    topology['connections'].append({
-                        'from': prev_hop,
-                        'to': ip,
-                        'type': 'l3_route'
-                    })
+            inputs = (self._device_category(device), tuple([hop.ip for hop in device.traceroute]))
+            current[ip] = inputs
+            previous = applied.get(ip)
+            if previous == inputs:
+                continue
+            if previous is not None:
+                self._withdraw_topology(ip, previous)
+            
+            # Categorize the device and add its traceroute's connections
+            graph.categorize(ip, inputs[0])
+            if inputs[1]:
+                graph.add_path(inputs[1], ip)
+        for ip in applied.keys() - current.keys():
+            self._withdraw_topology(ip, applied[ip])
+        self._topology_inputs = current
         
-        return topology
+        return {
+            'gateway': gateway,
+            'switches': graph.category('switches'),
+            'routers': graph.category('routers'),
+            'endpoints': graph.category('endpoints'),
+            'access_points': graph.category('access_points'),
+            'connections': graph.connections()
+        }
     
-    def generate_containerlab_format(self) -> Dict[str, Any]:
-        """Generate containerlab-compatible topology definition."""
+    def _withdraw_topology(self, ip: str, inputs: Tuple[str, Tuple[str, ...]]):
+        """Take what a device contributed out of topology_graph."""
+        category, hops = inputs
+        self.topology_graph.uncategorize(ip, category)
+        if hops:
+            self.topology_graph.remove_path(hops, ip)
+    
+    def _device_category(self, device: Device) -> str:
+        """Topology category for a device from its type, services and vendor."""
+        device_type = device.device_type
         
-        clab_topology = {
-            'name': 'inspector-twin-network',
-            'topology': {
-                'nodes': {},
-                'links': []
-            }
-        }
+        if device_type in self.ROUTER_TYPES:
+            return 'routers'
+        if device_type in self.SWITCH_TYPES:
+            return 'switches'
+        if device_type in self.ACCESS_POINT_TYPES:
+            return 'access_points'
         
-        # Map discovered devices to containerlab nodes
-        for ip, device in self.discovered_devices.items():
-            node_name = f"node_{ip.replace('.', '_')}"
+        # Check services to infer device type: a web/UPnP interface from a
+        # network vendor is most likely a router or access point
+        if any(service.service in self.WEB_SERVICES for service in device.services):
+            if str(device.os_detection.get('vendor', '')).lower() in self.NETWORK_VENDORS:
+                return 'routers'
+        return 'endpoints'
+    
+    def _node_name(self, ip: str) -> str:
+        """containerlab node / compose service name for a device."""
+        return f"node_{re.sub(r'[.:]', '_', ip)}"
+        
+    def _containerlab_nodes(self, ips: Iterable[str]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """(node name, containerlab node) for each device, in the order of ``ips``."""
+        for ip in ips:
+            device = self.discovered_devices[ip]
             
             # Determine container image based on device type
-            device_type = device.get('device_type', 'unknown')
-            os_name = device.get('os_detection', {}).get('name', '').lower()
+            device_type = device.device_type
+            os_name = device.os_detection.get('name', '').lower()
             
             kind = 'linux'
             image = 'alpine:latest'
@@ -559,53 +4163,60 @@ class NetworkTopologyMapper:
                 kind = 'linux'
                 image = 'ubuntu:latest'
             
-            clab_topology['topology']['nodes'][node_name] = {
+            yield self._node_name(ip), {
                 'kind': kind,
                 'image': image,
-                'mgmt_ipv4': ip,
-                'ports': [p['port'] for p in device.get('ports', [])],
+                'mgmt_ipv6' if ':' in ip else 'mgmt_ipv4': ip,
+                'ports': device.ports,
                 'labels': {
-                    'discovered_mac': device.get('mac', ''),
-                    'discovered_os': device.get('os_detection', {}).get('name', ''),
+                    'discovered_mac': device.mac or '',
+                    'discovered_os': device.os_detection.get('name', ''),
                     'device_type': device_type
                 }
             }
         
-        # Generate links from topology connections
-        topology = self.scan_metadata.get('topology', {})
-        for idx, conn in enumerate(topology.get('connections', [])):
-            clab_topology['topology']['links'].append({
-                'endpoints': [
-                    f"node_{conn['from'].replace('.', '_')}:eth{idx}",
-                    f"node_{conn['to'].replace('.', '_')}:eth{idx}"
-                ]
-            })
+    def _containerlab_links(self) -> Iterator[Dict[str, Any]]:
+        """containerlab links for the topology connections.
         
-        return clab_topology
+        Each node numbers its own data interfaces from eth1 (eth0 is the
+        management interface), so no interface is used by two links.
+        """
+        next_interface: Dict[str, int] = {}
+        for conn in self.scan_metadata.get('topology', {}).get('connections', []):
+            endpoints = []
+            for ip in (conn['from'], conn['to']):
+                node = self._node_name(ip)
+                index = next_interface.get(node, 1)
+                next_interface[node] = index + 1
+                endpoints.append(f"{node}:eth{index}")
+            yield {'endpoints': endpoints}
     
-    def generate_docker_compose_format(self) -> Dict[str, Any]:
-        """Generate docker-compose compatible format."""
+    def _containerlab_document(self, ips: Iterable[str]) -> LazyMap:
+        return LazyMap([
+            ('name', 'inspector-twin-network'),
+            ('topology', LazyMap([
+                ('nodes', LazyMap(self._containerlab_nodes(ips))),
+                ('links', LazyList(self._containerlab_links())),
+            ])),
+        ])
         
-        compose = {
-            'version': '3.8',
-            'services': {},
-            'networks': {
-                'inspector_network': {
-                    'driver': 'bridge',
-                    'ipam': {
-                        'config': [
-                            {'subnet': self.scan_metadata.get('network_info', {}).get('network_cidr', '192.168.1.0/24')}
-                        ]
-                    }
-                }
+    def generate_containerlab_format(self) -> Dict[str, Any]:
+        """Generate containerlab-compatible topology definition."""
+        return {
+            'name': 'inspector-twin-network',
+            'topology': {
+                'nodes': dict(self._containerlab_nodes(self.discovered_devices)),
+                'links': list(self._containerlab_links()),
             }
         }
         
-        # Map each device to a Docker service
-        for ip, device in self.discovered_devices.items():
-            service_name = f"node_{ip.replace('.', '_')}"
+    def _compose_services(self, ips: Iterable[str]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """(service name, compose service) for each device, in the order of ``ips``."""
+        for ip in ips:
+            device = self.discovered_devices[ip]
+            service_name = self._node_name(ip)
             
-            os_name = device.get('os_detection', {}).get('name', '').lower()
+            os_name = device.os_detection.get('name', '').lower()
             
             # Choose appropriate image
             if 'linux' in os_name:
@@ -615,159 +4226,2041 @@ class NetworkTopologyMapper:
             else:
                 image = 'alpine:latest'
             
-            compose['services'][service_name] = {
+            yield service_name, {
                 'image': image,
                 'container_name': service_name,
-                'hostname': device.get('hostname', service_name),
+                'hostname': service_name if device.hostname is None else device.hostname,
                 'networks': {
                     'inspector_network': {
-                        'ipv4_address': ip
+                        'ipv6_address' if ':' in ip else 'ipv4_address': ip
                     }
                 },
                 'labels': {
-                    'inspector.device_type': device.get('device_type', 'unknown'),
-                    'inspector.mac': device.get('mac', ''),
-                    'inspector.os': device.get('os_detection', {}).get('name', ''),
+                    'inspector.device_type': device.device_type,
+                    'inspector.mac': device.mac or '',
+                    'inspector.os': device.os_detection.get('name', ''),
+                },
+                'ports': [f"{port}:{port}" for port in device.ports[:10]],  # Limit exposed ports
+            }
+        
+    def _compose_networks(self) -> Dict[str, Any]:
+        network_info = self.scan_metadata.get('network_info', {})
+        network = {
+            'driver': 'bridge',
+            'ipam': {
+                'config': [
+                    {'subnet': network_info.get('network_cidr', '192.168.1.0/24')}
+                ]
+            }
+        }
+        if self.ipv6:
+            prefixes = [prefix for prefix in network_info.get('ipv6_prefixes', [])
+                        if not ipaddress.IPv6Network(prefix).is_link_local]
+            if prefixes:
+                network['enable_ipv6'] = True
+                network['ipam']['config'].append({'subnet': prefixes[0]})
+        return {'inspector_network': network}
+    
+    def _compose_document(self, ips: Iterable[str]) -> LazyMap:
+        return LazyMap([
+            ('version', '3.8'),
+            ('services', LazyMap(self._compose_services(ips))),
+            ('networks', self._compose_networks()),
+        ])
+    
+    def generate_docker_compose_format(self) -> Dict[str, Any]:
+        """Generate docker-compose compatible format."""
+        return {
+            'version': '3.8',
+            'services': dict(self._compose_services(self.discovered_devices)),
+            'networks': self._compose_networks(),
+        }
+    
+    # Inspector Twin node types (packages/shared NodeTypeSchema) by nmap device type
+    TWIN_NODE_TYPES = {
+        'router': 'router',
+        'firewall': 'firewall',
+        'switch': 'switch',
+        'broadband router': 'modem',
+        'WAP': 'router',
+        'wireless-access-point': 'router',
+        'phone': 'mobile',
+        'PDA': 'mobile',
+        'printer': 'iot',
+        'media device': 'iot',
+        'webcam': 'iot',
+        'power-device': 'iot',
+        'specialized': 'iot',
+        'storage-misc': 'server',
+    }
+    TWIN_CATEGORY_TYPES = {'routers': 'router', 'switches': 'switch', 'access_points': 'router'}
+    TWIN_ROW_WIDTH = 20
+    
+    def _twin_node_type(self, device: Device, category: str) -> str:
+        node_type = self.TWIN_NODE_TYPES.get(device.device_type) or self.TWIN_CATEGORY_TYPES.get(category)
+        if node_type:
+            return node_type
+        os_name = device.os_detection.get('name', '').lower()
+        if 'linux' in os_name or 'bsd' in os_name:
+            return 'server'
+        return 'workstation'
+    
+    def _twin_layout(self, ips: Iterable[str]) -> List[Tuple[str, str]]:
+        """(ip, category) for every graph node, routers first and endpoints last.
+        
+        Transit hops that were never scanned themselves are placed with the
+        routers, so every link has both ends in the graph.
+        """
+        topology = self.scan_metadata.get('topology', {})
+        categories = {ip: name for name in TopologyGraph.CATEGORIES for ip in topology.get(name, [])}
+        layout = [(ip, categories.get(ip, 'endpoints')) for ip in ips]
+        seen = set(self.discovered_devices)
+        for conn in topology.get('connections', []):
+            for ip in (conn['from'], conn['to']):
+                if ip not in seen:
+                    seen.add(ip)
+                    layout.append((ip, 'routers'))
+        rank = {name: index for index, name in enumerate(TopologyGraph.CATEGORIES)}
+        layout.sort(key=lambda entry: rank[entry[1]])
+        return layout
+    
+    def _twin_nodes(self, layout: List[Tuple[str, str]]) -> Iterator[Dict[str, Any]]:
+        """Inspector Twin graph nodes, laid out in rows by topology category."""
+        gateway = self.scan_metadata.get('topology', {}).get('gateway')
+        row = -1
+        previous = None
+        column = 0
+        for ip, category in layout:
+            if category != previous or column == self.TWIN_ROW_WIDTH:
+                row += 1
+                column = 0
+                previous = category
+            position = {'x': 100 + column * 150, 'y': 50 + row * 120}
+            column += 1
+            
+            node_id = self._node_name(ip)
+            device = self.discovered_devices.get(ip)
+            if device is None:
+                yield {
+                    'id': node_id,
+                    'type': 'router',
+                    'label': ip,
+                    'tags': ['discovered', 'transit'],
+                    'riskCriticality': 'critical' if ip == gateway else 'high',
+                    'interfaces': [{'id': f"{node_id}-eth0", 'name': 'eth0', 'ipAddress': ip, 'enabled': True}],
+                    'position': position,
+                }
+                continue
+            
+            node_type = self._twin_node_type(device, category)
+            interface = {'id': f"{node_id}-eth0", 'name': 'eth0', 'ipAddress': ip, 'enabled': True}
+            if device.mac:
+                interface['macAddress'] = device.mac
+            node = {
+                'id': node_id,
+                'type': node_type,
+                'label': device.hostname or ip,
+                'tags': ['discovered', category],
+                'riskCriticality': 'critical' if ip == gateway else (
+                    'high' if node_type in ('router', 'firewall', 'modem') else 'medium'
+                ),
+                'interfaces': [interface],
+                'properties': {
+                    'ip': ip,
+                    'deviceType': device.device_type,
+                    'openPorts': device.ports,
+                    'discoveredBy': device.discovered_by or '',
                 },
-                'ports': [f"{p['port']}:{p['port']}" for p in device.get('ports', [])[:10]],  # Limit exposed ports
+                'position': position,
+            }
+            if device.device_type != 'unknown':
+                node['role'] = device.device_type
+            if device.os_detection.get('name'):
+                node['os'] = device.os_detection['name']
+            yield node
+    
+    def _twin_links(self) -> Iterator[Dict[str, Any]]:
+        for conn in self.scan_metadata.get('topology', {}).get('connections', []):
+            if conn['from'] == conn['to']:
+                continue
+            source, target = self._node_name(conn['from']), self._node_name(conn['to'])
+            yield {
+                'id': f"link-{source}-{target}",
+                'source': source,
+                'target': target,
+                'type': 'ethernet',
+                'bandwidth': 1000,
+                'latency': 0,
+                'loss': 0,
+                'jitter': 0,
+                'canFail': False,
+                'failed': False,
+            }
+    
+    def _twin_graph(self, ips: Iterable[str]) -> LazyMap:
+        """The scan as an Inspector Twin graph (packages/shared GraphSchema)."""
+        network = self.scan_metadata.get('network_info', {}).get('network_cidr')
+        return LazyMap([
+            ('nodes', LazyList(self._twin_nodes(self._twin_layout(ips)))),
+            ('links', LazyList(self._twin_links())),
+            ('metadata', {
+                'name': SqliteResultSink.TOPOLOGY_NAME,
+                'description': f"Discovered by network-topology-mapper{f' on {network}' if network else ''}",
+                'createdAt': self.scan_metadata.get('scan_time'),
+                'updatedAt': self.scan_metadata.get('scan_time'),
+            }),
+        ])
+    
+    def scan_network(self):
+        """Main scanning orchestration.
+        
+        The phases run as a StageGraph. Network detection, ARP discovery,
+        host scans and topology inference form the critical path on this
+        thread; Bluetooth, passive sources and the scan cache load run
+        alongside, so none of them holds up the port scans. Per-stage
+        timings and failures are kept in scan_metadata['pipeline'].
+        
+        When discovery can be pipelined (see _pipeline_discovery) the ARP
+        sweep runs in the background instead, feeding each host into a
+        HostFeed that the deep scan consumes as replies arrive.
+        """
+        print("\n" + "="*60)
+        print("🔍 NETWORK TOPOLOGY MAPPER")
+        print("="*60)
+        
+        resumed = self._open_journal()
+        
+        if self.result_stream:
+            self.result_stream.open()
+            print(f"📤 Streaming device records to {self.result_stream.path}")
+            for device in self.discovered_devices.values():
+                self.result_stream.write_device(device.to_dict())
+        
+        def network():
+            print("\n📡 Detecting network configuration...")
+            with self.telemetry.span('get_local_network_info') as span:
+                if self._known_segments:
+                    segments = self._known_segments
+                    print("  (segments detected by the previous scan)")
+                else:
+                    segments = self.resolve_segments()
+                if span is not None:
+                    span.set_attribute('segments', len(segments))
+            if not segments and not (self.passive_only and self.pcap_files):
+                raise ScanAborted("Could not determine network CIDR")
+            self._known_segments = segments
+            
+            network_info = segments[0] if segments else {}
+            self.scan_metadata['network_info'] = network_info
+            self.scan_metadata['segments'] = segments
+            
+            print(f"  Local IP: {network_info.get('local_ip', 'unknown')}")
+            print(f"  Gateway: {network_info.get('gateway', 'unknown')}")
+            for segment in segments:
+                print(f"  Network: {segment['network_cidr']} (interface: {segment.get('interface') or 'auto'})")
+            return segments
+            
+        def arp(network):
+            if self.passive_only:
+                print("\n🤫 Passive-only mode: no probes will be sent")
+                return []
+            return self._discover_segments(network)
+        
+        def arp_feed(network):
+            try:
+                arp_devices = self._discover_segments(network, feed.put)
+                # Hosts the sweep did not hand over as it went; fed ones are dropped as duplicates
+                for device in arp_devices:
+                    feed.put(device)
+            finally:
+                feed.close()
+            return discovery(network, arp_devices)
+            
+        def passive():
+            with self.telemetry.span('passive_discovery', pcap_files=len(self.pcap_files)):
+                return self.passive_discovery()
+            
+        def ipv6(network):
+            with self.telemetry.span('ipv6_discovery'):
+                return self.ipv6_discovery(network)
+        
+        def discovery(network, arp, passive=None, ipv6=None):
+            arp_devices = arp
+            if passive is not None:
+                arp_devices = self._merge_passive(arp_devices, passive, network)
+            if ipv6 is not None:
+                arp_devices = self._merge_ipv6(arp_devices, ipv6, network)
+            if self.journal:
+                self.journal.append({
+                    'type': 'discovery',
+                    'network_info': self.scan_metadata['network_info'],
+                    'segments': network,
+                    'arp_devices': arp_devices,
+                })
+            return network, arp_devices
+        
+        def bluetooth():
+            with self.telemetry.span('bluetooth_scan'):
+                bt_devices = self.bluetooth_scan()
+            self.scan_metadata['bluetooth_devices'] = bt_devices
+            if self.journal:
+                self.journal.append({'type': 'bluetooth', 'bluetooth_devices': bt_devices})
+            return bt_devices
+        
+        def hosts(discovery, cache=None):
+            segments, arp_devices = discovery
+            device_map = {
+                device['ip']: device for device in arp_devices
+                if device['ip'] not in self.discovered_devices
+            }
+            if self.passive_only:
+                self._record_passive(device_map)
+                return
+            with self.telemetry.span('scan_hosts', hosts=len(device_map), segments=len(segments)):
+                if len(segments) > 1:
+                    self._scan_segments(segments, device_map)
+                else:
+                    self.scan_hosts(device_map)
+        
+        def fed_hosts(network):
+            with self.telemetry.span('scan_hosts', segments=len(network)) as span:
+                self._pipelined_scan(feed)
+                if span is not None:
+                    span.set_attribute('hosts', feed.fed)
+        
+        def topology(hosts, arp=None):
+            if self.scan_cache:
+                self.scan_cache.save()
+                self.scan_metadata['cache'] = self.scan_cache.summary()
+                cache_stats = self.scan_metadata['cache']
+                print(f"\n🗃️  Scan cache: {cache_stats['hits']} reused, {cache_stats['stale']} changed/expired, "
+                      f"{cache_stats['misses']} new")
+            
+            # Analyze topology
+            with self.telemetry.span('determine_network_topology', devices=len(self.discovered_devices)):
+                self.scan_metadata['topology'] = self.determine_network_topology()
+        
+        graph = StageGraph()
+        feed = None
+        if not resumed and self._pipeline_discovery():
+            # Room for one host group per worker the adaptive controller may run
+            feed = HostFeed(
+                self._max_nmap_workers(self.nmap_parallelism) * self.nmap_host_group_size,
+                skip=self.discovered_devices,
+            )
+            graph.add('network', network, inline=True)
+            graph.add('arp', arp_feed, after=['network'])
+            graph.add('bluetooth', bluetooth, default=[])
+        elif resumed:
+            network_info = resumed['network_info']
+            segments = resumed.get('segments') or [network_info]
+            self.scan_metadata['network_info'] = network_info
+            self.scan_metadata['segments'] = segments
+            graph.add('discovery', lambda: (segments, resumed['arp_devices']), inline=True)
+            if 'bluetooth_devices' in resumed:
+                self.scan_metadata['bluetooth_devices'] = resumed['bluetooth_devices']
+            elif not self.passive_only:
+                graph.add('bluetooth', bluetooth, default=[])
+        else:
+            graph.add('network', network, inline=True)
+            graph.add('arp', arp, after=['network'], inline=True)
+            discovery_inputs = ['network', 'arp']
+            if self.passive or self.pcap_files:
+                graph.add('passive', passive, default=[])
+                discovery_inputs.append('passive')
+            if self.ipv6:
+                graph.add('ipv6', ipv6, after=['network'], default=[])
+                discovery_inputs.append('ipv6')
+            graph.add('discovery', discovery, after=discovery_inputs, inline=True)
+            if not self.passive_only:
+                graph.add('bluetooth', bluetooth, default=[])
+        if feed is not None:
+            graph.add('hosts', fed_hosts, after=['network'], inline=True)
+            graph.add('topology', topology, after=['hosts', 'arp'], inline=True)
+        else:
+            host_inputs = ['discovery']
+            if self.scan_cache:
+                graph.add('cache', self.scan_cache.load)
+                host_inputs.append('cache')
+            graph.add('hosts', hosts, after=host_inputs, inline=True)
+            graph.add('topology', topology, after=['hosts'], inline=True)
+        
+        self.scan_metadata.setdefault('bluetooth_devices', [])
+        try:
+            graph.run()
+        except ScanAborted as e:
+            print(f"❌ {e}")
+            return False
+        finally:
+            self.scan_metadata['pipeline'] = graph.summary()
+        
+        topology = self.scan_metadata['topology']
+        print(f"\n📊 Topology Summary:")
+        print(f"  Gateway: {topology['gateway']}")
+        print(f"  Routers: {len(topology['routers'])}")
+        print(f"  Switches: {len(topology['switches'])}")
+        print(f"  Access Points: {len(topology['access_points'])}")
+        print(f"  Endpoints: {len(topology['endpoints'])}")
+        print(f"  Connections: {len(topology['connections'])}")
+        pipeline = self.scan_metadata['pipeline']
+        print(f"  Stages: {pipeline['stage_sum_s']:.1f}s of work in {pipeline['wall_s']:.1f}s wall time")
+        
+        return True
+    
+    def _pipeline_discovery(self) -> bool:
+        """Whether deep scans can start while the ARP sweep is still running.
+        
+        Only for a plain single-segment, single-pass scan: passive sources
+        and IPv6 hosts are merged with the full sweep, the sweep-first modes need every
+        host's ports before deciding what to deep-scan, and several
+        segments are already swept and scanned by their own workers.
+        """
+        return (
+            self.pipeline_discovery
+            and self.scan_mode == 'single-pass'
+            and not self.scan_cache
+            and not (self.passive or self.pcap_files or self.ipv6)
+            and len(self.interfaces) + len(self.targets) <= 1
+        )
+    
+    def resolve_segments(self) -> List[Dict[str, Any]]:
+        """Work out which network segments to scan.
+        
+        Every --interface contributes its own subnet and every --target adds
+        a CIDR; with neither, the default-route interface is auto-detected.
+        """
+        segments: List[Dict[str, Any]] = []
+        seen = set()
+        
+        def add(segment: Dict[str, Any]):
+            if segment.get('network_cidr') and segment['network_cidr'] not in seen:
+                seen.add(segment['network_cidr'])
+                segments.append(segment)
+        
+        for iface in self.interfaces:
+            info = self.get_local_network_info(iface)
+            if info.get('network_cidr'):
+                add(info)
+            else:
+                print(f"⚠️  Could not determine network for interface {iface}")
+        
+        if self.targets:
+            local_info = self.get_local_network_info() if not segments else segments[0]
+            for target in self.targets:
+                try:
+                    network = ipaddress.ip_network(target, strict=False)
+                except ValueError as e:
+                    print(f"⚠️  Skipping invalid target {target}: {e}")
+                    continue
+                add({
+                    'network_cidr': str(network),
+                    'network_size': network.num_addresses,
+                    'interface': self.interface if len(self.interfaces) == 1 else None,
+                    'local_ip': local_info.get('local_ip'),
+                    'gateway': local_info.get('gateway'),
+                })
+        
+        if not self.interfaces and not self.targets:
+            add(self.get_local_network_info())
+        
+        return segments
+    
+    def _discover_segments(
+        self,
+        segments: List[Dict[str, Any]],
+        on_device: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> List[Dict[str, Any]]:
+        """ARP-sweep every segment, concurrently when there are several.
+        
+        ``on_device`` (single segment only) receives each host as it is found.
+        """
+        if len(segments) == 1:
+            cidr = segments[0]['network_cidr']
+            
+            def found(device: Dict[str, Any]):
+                device['segment'] = cidr
+                on_device(device)
+            
+            with self.telemetry.span('arp_scan', network=cidr):
+                results = [self.arp_scan(cidr, found if on_device else None)]
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+            
+            print(f"\n🧩 Sweeping {len(segments)} segments in parallel...")
+            workers = self._segment_workers(segments)
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [
+                    pool.submit(_segment_worker, self._segment_config(segment, workers), segment, None, None,
+                                self.telemetry.carrier())
+                    for segment in segments
+                ]
+                results = []
+                for segment, future in zip(segments, futures):
+                    try:
+                        results.append(future.result()['arp_devices'])
+                    except Exception as e:
+                        print(f"⚠️  ARP scan failed for {segment['network_cidr']}: {e}")
+                        results.append([])
+        
+        arp_devices = []
+        seen = set()
+        for segment, devices in zip(segments, results):
+            segment['hosts'] = len(devices)
+            for device in devices:
+                if device['ip'] in seen:
+                    continue
+                seen.add(device['ip'])
+                device['segment'] = segment['network_cidr']
+                arp_devices.append(device)
+        return arp_devices
+    
+    def passive_discovery(self) -> List[Dict[str, Any]]:
+        """Collect hosts from the neighbor table and capture files without probing."""
+        discovery = PassiveDiscovery()
+        if self.passive:
+            print("\n👂 Reading kernel neighbor table...")
+            discovery.read_neighbor_table(self.interfaces or None)
+        
+        packets = 0
+        for pcap_file in self.pcap_files:
+            print(f"\n👂 Reading capture {pcap_file}...")
+            started = time.monotonic()
+            try:
+                count = discovery.read_pcap(pcap_file)
+            except Exception as e:
+                print(f"⚠️  Could not read {pcap_file}: {e}")
+                continue
+            elapsed = max(time.monotonic() - started, 1e-6)
+            size_mb = os.path.getsize(pcap_file) / 1e6
+            print(f"  {count} packets, {size_mb:.1f} MB in {elapsed:.1f}s ({size_mb / elapsed:.0f} MB/s)")
+            packets += count
+        
+        hosts = list(discovery.hosts.values())
+        self.scan_metadata['passive'] = {
+            'sources': discovery.stats,
+            'packets': packets,
+            'hosts': len(hosts),
+            'l2_neighbors': list(discovery.l2_neighbors.values()),
+        }
+        print(f"✓ Passive discovery: {len(hosts)} hosts, {len(discovery.l2_neighbors)} L2-only neighbors")
+        return hosts
+    
+    def _merge_passive(
+        self,
+        arp_devices: List[Dict[str, Any]],
+        passive_hosts: List[Dict[str, Any]],
+        segments: List[Dict[str, Any]],
+    ) -> List[Dict[str, Any]]:
+        """Fold passive hosts into the ARP results, keeping every discovered_by source.
+        
+        Passive hosts outside the scanned segments are reported but not
+        added, so a capture from elsewhere never widens the active scan.
+        """
+        by_ip = {device['ip']: device for device in arp_devices}
+        networks = [(ipaddress.ip_network(segment['network_cidr'], strict=False), segment['network_cidr'])
+                    for segment in segments if segment.get('network_cidr')]
+        out_of_scope = []
+        
+        for host in passive_hosts:
+            device = by_ip.get(host['ip'])
+            if device is not None:
+                sources = device.setdefault('discovery_sources', [device.get('discovered_by', '')])
+                sources.extend(source for source in host['discovery_sources'] if source not in sources)
+                if not device.get('mac'):
+                    device['mac'] = host['mac']
+                if host.get('passive'):
+                    device['passive'] = host['passive']
+                continue
+            
+            address = ipaddress.ip_address(host['ip'])
+            segment = next((cidr for network, cidr in networks if address in network), None)
+            if segment is None and not self.passive_only:
+                out_of_scope.append(host['ip'])
+                continue
+            if segment:
+                host['segment'] = segment
+            by_ip[host['ip']] = host
+            arp_devices.append(host)
+        
+        if out_of_scope:
+            self.scan_metadata['passive']['out_of_scope'] = out_of_scope
+            print(f"  ℹ️  {len(out_of_scope)} passive hosts are outside the scanned segments and were not added")
+        return arp_devices
+    
+    def ipv6_discovery(self, segments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Find IPv6 hosts on the scanned links without sweeping their prefixes.
+        
+        Each link is multicast-probed (see Icmpv6Prober) unless running
+        passive-only, then the kernel neighbor cache, which the answers
+        also fill, is read. Returns one {ip, mac, interface, discovered_by}
+        record per address.
+        """
+        print("\n🔭 Discovering IPv6 hosts via multicast and the neighbor cache...")
+        stats: Dict[str, Any] = {'interfaces': [], 'probes_sent': 0, 'probe_replies': 0, 'neighbor_cache': 0}
+        self.scan_metadata['ipv6'] = stats
+        if not sys.platform.startswith('linux'):
+            print("⚠️  IPv6 discovery needs Linux netlink and packet sockets, skipping")
+            return []
+        interfaces = sorted({segment['interface'] for segment in segments if segment.get('interface')})
+        if not interfaces and self.get_local_network_info().get('interface'):
+            interfaces = [self.get_local_network_info()['interface']]
+        stats['interfaces'] = interfaces
+        local = [entry for entry in self._linux_network.addresses() if entry['family'] == 6]
+        hosts: Dict[str, Dict[str, Any]] = {}
+        
+        for interface in [] if self.passive_only else interfaces:
+            sources = [entry['address'] for entry in local if entry['interface'] == interface]
+            if not sources:
+                print(f"  ⚠️  {interface} has no IPv6 address, not probing it")
+                continue
+            try:
+                prober = Icmpv6Prober(interface, sources)
+                for host in prober.probe():
+                    host['interface'] = interface
+                    hosts.setdefault(host['ip'], host)
+            except Exception as e:
+                print(f"⚠️  ICMPv6 multicast probe failed on {interface}: {e}")
+                continue
+            stats['probes_sent'] += prober.packets_sent
+            stats['probe_replies'] += prober.replies
+        
+        try:
+            neighbors = self._linux_network.neighbors(6)
+        except Exception as e:
+            print(f"⚠️  Could not read the IPv6 neighbor cache: {e}")
+            neighbors = []
+        for entry in neighbors:
+            if entry['interface'] not in interfaces or ipaddress.IPv6Address(entry['address']).is_multicast:
+                continue
+            stats['neighbor_cache'] += 1
+            hosts.setdefault(entry['address'], {
+                'ip': entry['address'],
+                'mac': entry['mac'],
+                'interface': entry['interface'],
+                'discovered_by': 'ndp_cache',
+            })
+        return list(hosts.values())
+    
+    def _merge_ipv6(
+        self,
+        arp_devices: List[Dict[str, Any]],
+        ipv6_hosts: List[Dict[str, Any]],
+        segments: List[Dict[str, Any]],
+    ) -> List[Dict[str, Any]]:
+        """Attach IPv6 addresses to known hosts by MAC and add IPv6-only hosts.
+        
+        A dual-stack host stays one device, keyed and deep-scanned by its
+        IPv4 address, listing what it answered from in ipv6_addresses. A
+        host only seen over IPv6 becomes a device keyed by its preferred
+        address (see _ipv6_preference) and is deep-scanned with nmap -6.
+        """
+        by_mac: Dict[str, Dict[str, Any]] = {}
+        for device in arp_devices:
+            if device.get('mac') and ':' not in device['ip']:
+                by_mac.setdefault(device['mac'].lower(), device)
+        segment_by_interface: Dict[str, str] = {}
+        for segment in segments:
+            if segment.get('interface'):
+                segment_by_interface.setdefault(segment['interface'], segment['network_cidr'])
+        default_segment = segments[0].get('network_cidr') if segments else None
+        known = {device['ip'] for device in arp_devices}
+        ipv6_only: Dict[str, List[Dict[str, Any]]] = {}
+        merged = set()
+        
+        for host in ipv6_hosts:
+            if host['ip'] in known:
+                continue
+            device = by_mac.get(host['mac'].lower())
+            if device is None:
+                ipv6_only.setdefault(host['mac'].lower(), []).append(host)
+                continue
+            merged.add(device['ip'])
+            addresses = device.setdefault('ipv6_addresses', [])
+            if host['ip'] not in addresses:
+                addresses.append(host['ip'])
+                addresses.sort(key=ipaddress.IPv6Address)
+            sources = device.setdefault('discovery_sources', [device.get('discovered_by', '')])
+            if host['discovered_by'] not in sources:
+                sources.append(host['discovered_by'])
+        
+        for mac, hosts in ipv6_only.items():
+            hosts.sort(key=lambda host: self._ipv6_preference(host['ip'], mac))
+            primary = hosts[0]
+            device = {
+                'ip': primary['ip'],
+                'mac': mac,
+                'discovered_by': primary['discovered_by'],
+                'ipv6_addresses': sorted((host['ip'] for host in hosts), key=ipaddress.IPv6Address),
             }
+            sources = list(dict.fromkeys(host['discovered_by'] for host in hosts))
+            if len(sources) > 1:
+                device['discovery_sources'] = sources
+            segment = segment_by_interface.get(primary['interface'], default_segment)
+            if segment:
+                device['segment'] = segment
+            if ipaddress.IPv6Address(primary['ip']).is_link_local:
+                # Link-local targets only mean something with their interface
+                device['scope_id'] = primary['interface']
+            arp_devices.append(device)
+        
+        self.scan_metadata.setdefault('ipv6', {}).update({
+            'addresses': len(ipv6_hosts),
+            'merged_by_mac': len(merged),
+            'ipv6_only_hosts': len(ipv6_only),
+        })
+        print(f"✓ IPv6 discovery: {len(ipv6_hosts)} addresses, {len(merged)} matched to IPv4 hosts by MAC, "
+              f"{len(ipv6_only)} IPv6-only hosts")
+        return arp_devices
+    
+    @staticmethod
+    def _ipv6_preference(ip: str, mac: str) -> Tuple[bool, bool, ipaddress.IPv6Address]:
+        """Sort key for a host's addresses: routable before link-local, MAC-derived (EUI-64) before temporary."""
+        address = ipaddress.IPv6Address(ip)
+        octets = bytes.fromhex(mac.replace(':', ''))
+        eui64 = bytes((octets[0] ^ 0x02,)) + octets[1:3] + b'\xff\xfe' + octets[3:6]
+        return address.is_link_local, address.packed[8:] != eui64, address
+    
+    def _record_passive(self, device_map: Dict[str, Dict[str, Any]]):
+        """Record passively discovered hosts as devices without scanning them."""
+        for ip, device in device_map.items():
+            device_info = self._empty_device_info(ip)
+            passive = device.get('passive', {})
+            if passive.get('hostname'):
+                device_info['hostname'] = passive['hostname']
+            device_info['device_type'] = PassiveDiscovery.device_type_hint(passive) or 'unknown'
+            self._record_device(device_info, device)
+    
+    def _segment_workers(self, segments: List[Dict[str, Any]]) -> int:
+        """One worker process per segment.
+        
+        Segments are mostly waiting on nmap, so they are not capped at the
+        CPU count; the OS spreads their XML parsing over every core.
+        """
+        return max(1, len(segments))
+    
+    def _segment_config(self, segment: Dict[str, Any], workers: int) -> Dict[str, Any]:
+        """Constructor arguments for a segment worker's own mapper.
+        
+        The --rate-budget is split evenly between the ``workers`` segment
+        processes running at once, so together they stay within it.
+        """
+        config = dict(self._config)
+        config.update(
+            rate_budget=self.rate_budget / workers if self.rate_budget is not None else None,
+            pipeline_discovery=False,
+            interface=segment.get('interface'),
+            interfaces=None,
+            targets=None,
+            journal=False,
+            resume=False,
+            output_format='json',
+            sqlite_path=None,
+            archive_path=None,
+        )
+        return config
+    
+    def _scan_segments(self, segments: List[Dict[str, Any]], device_map: Dict[str, Dict[str, Any]]):
+        """Scan each segment's hosts in its own worker process.
+        
+        Devices stream back over a queue and are recorded (journal, NDJSON)
+        in this process as they complete; cache updates and per-segment
+        timings are merged once each segment finishes. If a worker fails,
+        its hosts that never came back are recorded with the error.
+        """
+        by_segment: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for ip, device in device_map.items():
+            by_segment.setdefault(device.get('segment') or segments[0]['network_cidr'], {})[ip] = device
+        active = [segment for segment in segments if by_segment.get(segment['network_cidr'])]
+        if not active:
+            return
+        
+        print(f"\n🧩 Scanning {len(active)} segments in parallel "
+              f"({self._segment_workers(active)} worker processes)...")
+        
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        
+        manager = multiprocessing.Manager()
+        events = manager.Queue()
+        
+        def consume():
+            while True:
+                item = events.get()
+                if item is None:
+                    break
+                device_info, source = item
+                with self._record_lock:
+                    self._record_device(device_info, source)
+        
+        consumer = threading.Thread(target=consume, daemon=True)
+        consumer.start()
+        failed: Dict[str, str] = {}
+        try:
+            with ProcessPoolExecutor(max_workers=self._segment_workers(active)) as pool:
+                futures = {
+                    pool.submit(
+                        _segment_worker,
+                        self._segment_config(segment, self._segment_workers(active)),
+                        segment,
+                        by_segment[segment['network_cidr']],
+                        events,
+                        self.telemetry.carrier(),
+                    ): segment
+                    for segment in active
+                }
+                for future, segment in futures.items():
+                    try:
+                        outcome = future.result()
+                    except Exception as e:
+                        print(f"⚠️  Scan failed for segment {segment['network_cidr']}: {e}")
+                        failed[segment['network_cidr']] = str(e) or type(e).__name__
+                        continue
+                    segment['stage_timings'] = outcome['stage_timings']
+                    segment['concurrency'] = outcome['concurrency']
+                    if outcome.get('rate_budget'):
+                        segment['rate_budget'] = outcome['rate_budget']
+                    if self.scan_cache and outcome['cache']:
+                        self.scan_cache.merge(outcome['cache'])
+        finally:
+            events.put(None)
+            consumer.join()
+            manager.shutdown()
+        
+        # Only after the queue is drained: devices the worker sent before failing still count
+        for cidr, error in failed.items():
+            for ip, device in by_segment[cidr].items():
+                if ip not in self.discovered_devices:
+                    device_info = self._empty_device_info(ip)
+                    device_info['scan_error'] = error
+                    self._record_device(device_info, device)
+    
+    def ingest_nmap_xml(self, sources: List[str]) -> bool:
+        """Build the inventory from saved nmap XML files instead of scanning.
+        
+        ``sources`` are files, directories (searched recursively for *.xml)
+        or glob patterns. Files are parsed on a process pool; records for
+        the same IP are merged field by field with the newest scan winning.
+        Needs neither root nor network access.
+        """
+        print("\n" + "="*60)
+        print("📂 NMAP XML INGEST")
+        print("="*60)
+        
+        files = self._resolve_xml_sources(sources)
+        if not files:
+            print("❌ No nmap XML files found")
+            return False
+        
+        self.journal = None  # nothing to resume: ingest is repeatable
+        self.scan_metadata['scan_type'] = 'offline_ingest'
+        if self.result_stream:
+            self.result_stream.open()
+            print(f"📤 Streaming device records to {self.result_stream.path}")
+        
+        print(f"\n🔬 Parsing {len(files)} nmap XML files...")
+        started = time.monotonic()
+        records: Dict[str, List[Tuple[float, Dict[str, Any]]]] = {}
+        errors = []
+        with self.telemetry.span('parse_nmap_xml', files=len(files)) as span:
+            for path, hosts, error in self._parse_xml_files(files):
+                if error:
+                    print(f"  ⚠️  {path}: {error}")
+                    errors.append({'file': path, 'error': error})
+                    continue
+                for ip, record in hosts.items():
+                    records.setdefault(ip, []).append(record)
+            if span is not None:
+                span.set_attribute('hosts', len(records))
+                span.set_attribute('errors', len(errors))
+        
+        for ip in sorted(records, key=_ip_sort_key):
+            device_info = self._empty_device_info(ip)
+            scan_time = 0.0
+            for scan_time, info in sorted(records[ip], key=lambda record: record[0]):
+                if 'scan_error' not in info:
+                    device_info.pop('scan_error', None)
+                device_info.update(info)
+            device_info['scan_time'] = datetime.fromtimestamp(scan_time).isoformat()
+            device_info['source_scans'] = len(records[ip])
+            self._record_device(device_info, {'mac': device_info.get('mac', ''), 'discovered_by': 'nmap_xml'})
+        
+        elapsed = time.monotonic() - started
+        self.scan_metadata['network_info'] = {'gateway': self._infer_gateway()}
+        self.scan_metadata['xml_ingest'] = {
+            'files': len(files),
+            'hosts': len(self.discovered_devices),
+            'errors': errors,
+            'seconds': round(elapsed, 3),
+        }
+        print(f"✓ Ingested {len(self.discovered_devices)} hosts from {len(files) - len(errors)} files "
+              f"in {elapsed:.1f}s ({len(errors)} unreadable)")
+        
+        with self.telemetry.span('determine_network_topology', devices=len(self.discovered_devices)):
+            topology = self.determine_network_topology()
+        self.scan_metadata['topology'] = topology
+        print(f"\n📊 Topology Summary:")
+        print(f"  Gateway: {topology['gateway']}")
+        print(f"  Routers: {len(topology['routers'])}")
+        print(f"  Switches: {len(topology['switches'])}")
+        print(f"  Endpoints: {len(topology['endpoints'])}")
+        return True
+    
+    def _resolve_xml_sources(self, sources: List[str]) -> List[str]:
+        """Expand files, directories and glob patterns into XML file paths."""
+        import glob
+        
+        files = []
+        for source in sources:
+            path = Path(source)
+            if path.is_dir():
+                files.extend(str(p) for p in sorted(path.rglob('*.xml')))
+            elif path.is_file():
+                files.append(str(path))
+            else:
+                files.extend(sorted(glob.glob(source, recursive=True)))
+        return list(dict.fromkeys(files))
+    
+    def _parse_xml_files(self, files: List[str]):
+        """Yield (path, hosts, error) per file, in parallel when there are several."""
+        workers = min(len(files), os.cpu_count() or 1)
+        if workers <= 1:
+            for path in files:
+                yield _ingest_xml_file(path)
+            return
+        
+        from concurrent.futures import ProcessPoolExecutor
+        
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            yield from pool.map(_ingest_xml_file, files, chunksize=max(1, len(files) // (workers * 8)))
+    
+    def _infer_gateway(self) -> Optional[str]:
+        """Most common first traceroute hop across the ingested hosts."""
+        first_hops: Dict[str, int] = {}
+        for device in self.discovered_devices.values():
+            hops = device.traceroute or ()
+            if len(hops) > 1 and hops[0].ip:
+                first_hops[hops[0].ip] = first_hops.get(hops[0].ip, 0) + 1
+        return max(first_hops, key=first_hops.get) if first_hops else None
+    
+    def _open_journal(self) -> Optional[Dict[str, Any]]:
+        """Start the checkpoint journal, reloading finished hosts on --resume.
+        
+        Returns the journaled discovery record when resuming, else None.
+        """
+        if not self.journal:
+            return None
+        
+        discovery = None
+        append = False
+        if self.resume:
+            state = self.journal.load()
+            discovery = state['discovery']
+            if discovery is None and state['devices'] and self._pipeline_discovery():
+                # A pipelined scan journals discovery only once the sweep ends; keep the
+                # hosts finished before the interruption and sweep again for the rest
+                print(f"\n♻️  Resuming scan from {self.journal.path}: "
+                      f"{len(state['devices'])} hosts already complete, rediscovering the rest")
+            elif discovery is None:
+                print(f"⚠️  No resumable scan in {self.journal.path}, starting a fresh scan")
+                state['devices'] = {}
+            else:
+                total = len(discovery['arp_devices'])
+                print(f"\n♻️  Resuming scan from {self.journal.path}: "
+                      f"{len(state['devices'])}/{total} hosts already complete")
+            if state['failed'] and (discovery is not None or state['devices']):
+                print(f"  🔁 Retrying {len(state['failed'])} hosts whose scan failed")
+            self.discovered_devices.update(
+                (ip, Device.from_dict(device_info)) for ip, device_info in state['devices'].items()
+            )
+            append = bool(state['devices']) or discovery is not None
+        
+        self.journal.open(append=append)
+        print(f"📝 Checkpoint journal: {self.journal.path}")
+        return discovery
+    
+    def scan_hosts(self, device_map: Dict[str, Dict[str, Any]]):
+        """Deep-scan the given hosts according to the scan mode and cache."""
+        self._ipv6_scopes.update(
+            (ip, device['scope_id']) for ip, device in device_map.items() if device.get('scope_id')
+        )
+        if self.scan_mode == 'two-phase' or self.scan_cache:
+            self._swept_scan(device_map)
+        else:
+            self._single_pass_scan(device_map)
+    
+    def _single_pass_scan(self, device_map: Dict[str, Dict[str, Any]]):
+        """Intensive all-port scan of every host in ``device_map``."""
+        print(f"\n🔬 Performing intensive nmap scans on {len(device_map)} devices...")
+        print(f"⏱️  This may take a while (timeout per host: {self.nmap_timeout}s)...\n")
+        
+        groups = self._host_groups(list(device_map.keys()))
+        on_result = self._progress_recorder(device_map, "Completed")
+        
+        started = time.monotonic()
+        self._run_nmap_jobs(
+            [self._deep_scan_job(group) for group in groups],
+            self.nmap_parallelism,
+            on_result,
+            'deep_scan',
+        )
+        self.scan_metadata['stage_timings'] = {
+            'deep_scan': self._stage_timing(started, len(device_map)),
+        }
+    
+    def _swept_scan(self, device_map: Dict[str, Dict[str, Any]]):
+        """Fast SYN port sweep, then deep scans only where they are needed.
+        
+        The deep scan covers just each host's open ports, and hosts without
+        any only get a name and traceroute lookup. With a scan cache (which
+        takes this path in single-pass mode too, since the sweep provides
+        its signatures), hosts whose (MAC, IP) and open-port signature
+        match a fresh cache entry reuse the cached result and are not deep
+        scanned at all.
+        """
+        print(f"\n⚡ Stage 1: SYN port sweep of {len(device_map)} devices "
+              f"(timeout per host: {self.sweep_timeout}s)...\n")
+        
+        sweep_results: Dict[str, Dict[str, Any]] = {}
+        sweep_progress = self._progress_recorder(device_map, "Swept", record=False)
+        
+        def on_sweep(ip: str, device_info: Dict[str, Any]):
+            sweep_progress(ip, device_info)
+            with self._record_lock:
+                sweep_results[ip] = device_info
+        
+        started = time.monotonic()
+        self._run_nmap_jobs(
+            [self._sweep_job(group) for group in self._host_groups(list(device_map.keys()))],
+            self.sweep_parallelism,
+            on_sweep,
+            'port_sweep',
+        )
+        stage_timings = {'port_sweep': self._stage_timing(started, len(device_map))}
+        
+        signatures = {}
+        if self.scan_cache:
+            for ip, sweep_info in sweep_results.items():
+                if 'scan_error' in sweep_info:
+                    continue
+                mac = device_map[ip].get('mac', '')
+                signatures[ip] = ScanCache.signature(sweep_info.get('ports', []))
+                cached = self.scan_cache.lookup(mac, ip, signatures[ip])
+                if cached is not None:
+                    cached['cache_hit'] = True
+                    self._record_device(cached, device_map[ip])
+        
+        def on_deep_result(ip: str, device_info: Dict[str, Any]):
+            if self.scan_cache and ip in signatures and 'scan_error' not in device_info:
+                self.scan_cache.store(device_map[ip].get('mac', ''), ip, signatures[ip], dict(device_info))
+        
+        pending = {ip: device_map[ip] for ip in sweep_results if ip not in self.discovered_devices}
+        
+        # Hosts sharing the exact same open-port list can still share an
+        # nmap run; hosts without open ports get the lightweight probe, and
+        # failed sweeps are recorded as they are
+        by_ports: Dict[Tuple[int, ...], List[str]] = {}
+        portless: List[str] = []
+        for ip in pending:
+            sweep_info = sweep_results[ip]
+            open_ports = tuple(sorted({p['port'] for p in sweep_info.get('ports', [])}))
+            if open_ports:
+                by_ports.setdefault(open_ports, []).append(ip)
+            elif 'scan_error' not in sweep_info:
+                portless.append(ip)
+            else:
+                device_info = self._empty_device_info(ip)
+                device_info['scan_error'] = sweep_info['scan_error']
+                self._record_device(device_info, device_map[ip])
+                on_deep_result(ip, device_info)
+        
+        if portless:
+            print(f"\n🔎 Stage 1b: name and traceroute lookup of {len(portless)} devices without open ports...\n")
+            probe_map = {ip: device_map[ip] for ip in portless}
+            record_probe = self._progress_recorder(probe_map, "Traced")
+            
+            def on_probe(ip: str, device_info: Dict[str, Any]):
+                record_probe(ip, device_info)
+                on_deep_result(ip, device_info)
+            
+            started = time.monotonic()
+            self._run_nmap_jobs(
+                [self._host_probe_job(group) for group in self._host_groups(portless)],
+                self.sweep_parallelism,
+                on_probe,
+                'host_probe',
+            )
+            stage_timings['host_probe'] = self._stage_timing(started, len(portless))
+        
+        jobs = []
+        for open_ports, ips in by_ports.items():
+            for group in self._host_groups(ips):
+                jobs.append(self._deep_scan_job(group, list(open_ports)))
+        
+        deep_map = {ip: device_map[ip] for ips in by_ports.values() for ip in ips}
+        print(f"\n🔬 Stage 2: deep scan of {len(deep_map)} devices with open ports "
+              f"(timeout per host: {self.nmap_timeout}s)...\n")
+        
+        record = self._progress_recorder(deep_map, "Completed")
+        
+        def on_result(ip: str, device_info: Dict[str, Any]):
+            record(ip, device_info)
+            on_deep_result(ip, device_info)
+        
+        started = time.monotonic()
+        self._run_nmap_jobs(jobs, self.nmap_parallelism, on_result, 'deep_scan')
+        stage_timings['deep_scan'] = self._stage_timing(started, len(deep_map))
+        self.scan_metadata['stage_timings'] = stage_timings
+    
+    def _pipelined_scan(self, feed: HostFeed):
+        """Deep-scan hosts from ``feed`` while discovery is still finding them.
+        
+        Host groups are cut from whatever has arrived (waiting briefly to
+        fill one), so the first nmap runs start with the first ARP replies
+        rather than after the whole sweep and its retries.
+        """
+        print(f"\n🔬 Performing intensive nmap scans as devices are discovered "
+              f"(timeout per host: {self.nmap_timeout}s)...\n")
+        
+        device_map: Dict[str, Dict[str, Any]] = {}
+        progress: Dict[str, Any] = {'completed': 0, 'first_result_s': None}
+        started = time.monotonic()
+        
+        async def jobs():
+            while True:
+                group = await feed.next_group(self.nmap_host_group_size)
+                if not group:
+                    return
+                for device in group:
+                    device_map[device['ip']] = device
+                yield self._deep_scan_job([device['ip'] for device in group])
+        
+        def on_result(ip: str, device_info: Dict[str, Any]):
+            with self._record_lock:
+                progress['completed'] += 1
+                if progress['first_result_s'] is None:
+                    progress['first_result_s'] = round(time.monotonic() - started, 3)
+                print(f"[{progress['completed']}/{feed.fed}] Completed {ip}")
+                self._record_device(device_info, device_map[ip])
+        
+        try:
+            self._run_nmap_jobs(jobs(), self.nmap_parallelism, on_result, 'deep_scan')
+        finally:
+            feed.cancel()
+        timing = self._stage_timing(started, len(device_map))
+        timing['first_result_s'] = progress['first_result_s']
+        self.scan_metadata['stage_timings'] = {'deep_scan': timing}
+        self.scan_metadata['host_feed'] = feed.summary()
+    
+    def _host_groups(self, ips: List[str]) -> List[List[str]]:
+        """Split targets into nmap host groups of the configured size.
+        
+        One nmap run scans a single address family, so IPv4 and IPv6
+        targets never share a group.
+        """
+        group_size = self.nmap_host_group_size
+        groups = []
+        for family in ([ip for ip in ips if ':' not in ip], [ip for ip in ips if ':' in ip]):
+            groups.extend(family[i:i + group_size] for i in range(0, len(family), group_size))
+        return groups
+    
+    def _stage_timing(self, started: float, hosts: int) -> Dict[str, Any]:
+        """Wall-clock summary of a scan stage for scan_metadata."""
+        return {'seconds': round(time.monotonic() - started, 3), 'hosts': hosts}
+    
+    def _progress_recorder(
+        self,
+        device_map: Dict[str, Dict[str, Any]],
+        verb: str,
+        record: bool = True,
+    ) -> Callable[[str, Dict[str, Any]], None]:
+        """Build an on_result callback that reports progress and records hosts."""
+        progress = {'completed': 0}
+        total = len(device_map)
         
-        return compose
+        def on_result(ip: str, device_info: Dict[str, Any]):
+            with self._record_lock:
+                progress['completed'] += 1
+                print(f"[{progress['completed']}/{total}] {verb} {ip}")
+                if record:
+                    self._record_device(device_info, device_map[ip])
+        
+        return on_result
     
-    def scan_network(self):
-        """Main scanning orchestration."""
-        print("\n" + "="*60)
-        print("🔍 NETWORK TOPOLOGY MAPPER")
-        print("="*60)
+    def _run_nmap_jobs(
+        self,
+        jobs: Union[List[NmapJob], AsyncIterator[NmapJob]],
+        parallelism: int,
+        on_result: Callable[[str, Dict[str, Any]], None],
+        stage: str,
+    ):
+        """Run nmap jobs under the adaptive concurrency controller.
         
-        # Get network info
-        print("\n📡 Detecting network configuration...")
-        network_info = self.get_local_network_info()
-        self.scan_metadata['network_info'] = network_info
+        ``jobs`` is a list, or an async iterator that produces them while
+        the scan runs (see _pipelined_scan).
+        """
+        import asyncio
         
-        print(f"  Local IP: {network_info.get('local_ip', 'unknown')}")
-        print(f"  Gateway: {network_info.get('gateway', 'unknown')}")
-        print(f"  Network: {network_info.get('network_cidr', 'unknown')}")
+        streaming = not isinstance(jobs, list)
+        if not jobs:
+            return
+        if self.nmap_host_group_size > 1 and (streaming or len(jobs) > 1):
+            runs = 'streamed' if streaming else str(len(jobs))
+            print(f"📦 Host groups enabled: {runs} nmap runs of up to {self.nmap_host_group_size} hosts")
         
-        network_cidr = network_info.get('network_cidr')
-        if not network_cidr:
-            print("❌ Could not determine network CIDR")
-            return False
+        controller = AdaptiveConcurrency(
+            initial=parallelism,
+            maximum=self._max_nmap_workers(parallelism),
+            adaptive=self.adaptive_concurrency,
+        )
+        if streaming or len(jobs) > 1:
+            if controller.adaptive and controller.maximum > controller.minimum:
+                print(f"⚡ Adaptive scan concurrency: starting at {int(controller.limit)} workers "
+                      f"(range {controller.minimum}-{controller.maximum})")
+            else:
+                print(f"⚡ Parallel scan enabled: {int(controller.limit)} workers")
+        if self.rate_governor is not None:
+            share = self.rate_governor.share(int(controller.limit))
+            print(f"🚦 Packet budget: {self.rate_governor.budget:g} pps shared by all nmap workers "
+                  f"({share:.2f} pps each at {int(controller.limit)} workers)")
+            if self.nmap_min_rate and self.nmap_min_rate > share:
+                print(f"⚠️  --nmap-min-rate {self.nmap_min_rate} is above a worker's share; "
+                      f"each worker's floor is lowered to its share")
         
-        # ARP scan
-        arp_devices = self.arp_scan(network_cidr)
+        started = time.monotonic()
+        asyncio.run(self._orchestrate_jobs(jobs, controller, on_result))
+        if self.rate_governor is not None:
+            self.scan_metadata['rate_budget'] = self.rate_governor.summary()
+        summary = controller.summary()
+        # Share of the worker slots (at the peak limit) that were running nmap
+        capacity = (time.monotonic() - started) * controller.peak
+        summary['utilisation'] = round(controller.busy_seconds / capacity, 3) if capacity else 0.0
+        self.telemetry.gauge('nmap.workers.utilisation', summary['utilisation'], stage=stage)
+        self.scan_metadata.setdefault('concurrency', {})[stage] = summary
+    
+    def _max_nmap_workers(self, parallelism: int) -> int:
+        """Ceiling the adaptive controller may raise the worker count to."""
+        return self.max_workers or parallelism * 4
+    
+    @staticmethod
+    def _rate_arg(rate: float) -> str:
+        """A packets/s value as nmap accepts it (plain decimal, no exponent)."""
+        return f"{rate:.2f}".rstrip('0').rstrip('.')
+    
+    def _rate_limited_command(self, cmd: List[str], rate: float) -> List[str]:
+        """``cmd`` with its packet rate capped at a --rate-budget grant."""
+        limited = [cmd[0], "--max-rate", self._rate_arg(rate)]
+        if self.nmap_min_rate is not None:
+            limited.extend(["--min-rate", self._rate_arg(min(self.nmap_min_rate, rate))])
+        args = iter(cmd[1:])
+        for arg in args:
+            if arg in ("--min-rate", "--max-rate"):
+                next(args, None)
+            else:
+                limited.append(arg)
+        return limited
+    
+    async def _orchestrate_jobs(
+        self,
+        jobs: Union[List[NmapJob], AsyncIterator[NmapJob]],
+        controller: AdaptiveConcurrency,
+        on_result: Callable[[str, Dict[str, Any]], None],
+    ):
+        """Dispatch jobs as controller slots (and --rate-budget shares) free up; cancel all on interrupt."""
+        import asyncio
         
-        # Bluetooth scan
-        bt_devices = self.bluetooth_scan()
-        self.scan_metadata['bluetooth_devices'] = bt_devices
+        reported = set()
         
-        # Intensive nmap scan on each discovered device
-        print(f"\n🔬 Performing intensive nmap scans on {len(arp_devices)} devices...")
-        print(f"⏱️  This may take a while (timeout per host: {self.nmap_timeout}s)...\n")
-
-        if self.nmap_parallelism <= 1 or len(arp_devices) <= 1:
-            for idx, device in enumerate(arp_devices, 1):
-                ip = device['ip']
-                print(f"[{idx}/{len(arp_devices)}] Scanning {ip}")
-                device_info = self.intensive_nmap_scan(ip)
-                device_info['mac'] = device.get('mac', '')
-                device_info['discovered_by'] = device.get('discovered_by', '')
-                self.discovered_devices[ip] = device_info
-        else:
-            print(f"⚡ Parallel scan enabled: {self.nmap_parallelism} workers")
-            device_map = {device['ip']: device for device in arp_devices}
-            with ThreadPoolExecutor(max_workers=self.nmap_parallelism) as executor:
-                futures = {
-                    executor.submit(self.intensive_nmap_scan, ip): ip
-                    for ip in device_map.keys()
-                }
-                completed = 0
-                total = len(futures)
-                for future in as_completed(futures):
-                    ip = futures[future]
-                    completed += 1
-                    print(f"[{completed}/{total}] Completed {ip}")
-                    try:
-                        device_info = future.result()
-                    except Exception as e:
-                        print(f"    ⚠️  Scan failed for {ip}: {e}")
-                        device_info = {
-                            'ip': ip,
-                            'scan_time': datetime.now().isoformat(),
-                            'ports': [],
-                            'services': [],
-                            'os_detection': {},
-                            'device_type': 'unknown',
-                            'distance_hops': None,
-                            'scan_error': str(e),
-                        }
-                    device = device_map[ip]
-                    device_info['mac'] = device.get('mac', '')
-                    device_info['discovered_by'] = device.get('discovered_by', '')
-                    self.discovered_devices[ip] = device_info
+        def report(ip: str, device_info: Dict[str, Any]):
+            reported.add(ip)
+            on_result(ip, device_info)
         
-        # Analyze topology
-        topology = self.determine_network_topology()
-        self.scan_metadata['topology'] = topology
+        async def run(job: NmapJob, started: float, rate: Optional[float]):
+            ok = False
+            self.telemetry.adjust('nmap.workers.active', 1, stage=job.kind)
+            try:
+                _results, ok = await self._nmap_group_async(job, report)
+            except Exception as e:
+                print(f"    ⚠️  Scan failed for {', '.join(job.targets)}: {e}")
+                for ip in job.targets:
+                    if ip not in reported:
+                        device_info = self._empty_device_info(ip)
+                        device_info['scan_error'] = str(e)
+                        report(ip, device_info)
+            finally:
+                self.telemetry.adjust('nmap.workers.active', -1, stage=job.kind)
+                if rate is not None:
+                    governor.release(rate)
+                await controller.release(started, ok, job.timeout)
         
-        print(f"\n📊 Topology Summary:")
-        print(f"  Gateway: {topology['gateway']}")
-        print(f"  Routers: {len(topology['routers'])}")
-        print(f"  Switches: {len(topology['switches'])}")
-        print(f"  Access Points: {len(topology['access_points'])}")
-        print(f"  Endpoints: {len(topology['endpoints'])}")
-        print(f"  Connections: {len(topology['connections'])}")
+        async def listed():
+            for job in jobs:
+                yield job
         
-        return True
+        governor = self.rate_governor
+        tasks = []
+        try:
+            async for job in (listed() if isinstance(jobs, list) else jobs):
+                started = await controller.acquire()
+                rate = None
+                if governor is not None:
+                    # Shares follow the worker limit, so they are re-divided as it adapts
+                    rate = await governor.reserve_async(float('inf'), int(controller.limit))
+                    job = job._replace(cmd=self._rate_limited_command(job.cmd, rate))
+                    started = time.monotonic()
+                tasks.append(asyncio.ensure_future(run(job, started, rate)))
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    
+    def _record_device(self, device_info: Dict[str, Any], source_device: Dict[str, Any]):
+        """Store a scanned device, carrying over its discovery details."""
+        device_info['mac'] = source_device.get('mac', '')
+        device_info['discovered_by'] = source_device.get('discovered_by', '')
+        if source_device.get('segment'):
+            device_info['segment'] = source_device['segment']
+        if source_device.get('discovery_sources'):
+            device_info['discovery_sources'] = source_device['discovery_sources']
+        if source_device.get('ipv6_addresses'):
+            device_info['ipv6_addresses'] = source_device['ipv6_addresses']
+        if source_device.get('passive'):
+            device_info['passive'] = source_device['passive']
+            if not device_info.get('hostname') and source_device['passive'].get('hostname'):
+                device_info['hostname'] = source_device['passive']['hostname']
+        self.discovered_devices[device_info['ip']] = Device.from_dict(device_info)
+        if self._device_sink:
+            self._device_sink(device_info, source_device)
+        if self.journal:
+            self.journal.append({'type': 'device', 'device': device_info})
+        if self.result_stream:
+            self.result_stream.write_device(device_info)
+    
+    def _results_document(self, ips: List[str]) -> LazyMap:
+        """The JSON output, with devices and generated formats streamed."""
+        return LazyMap([
+            ('metadata', self.scan_metadata),
+            ('devices', LazyMap((ip, self.discovered_devices[ip].to_dict()) for ip in ips)),
+            ('topology', self.scan_metadata.get('topology', {})),
+            ('bluetooth_devices', self.scan_metadata.get('bluetooth_devices', [])),
+            ('containerlab_format', self._containerlab_document(ips)),
+            ('docker_compose_format', self._compose_document(ips)),
+        ])
+    
+    def _write_artifact(self, path: Path, write: Callable[[Any], None]):
+        """Stream one output file into a temp file and rename it into place."""
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with self.telemetry.span('export.write', file=path.name):
+            try:
+                with open(tmp_path, 'w', buffering=1 << 20) as f:
+                    write(f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, path)
+            except BaseException:
+                tmp_path.unlink(missing_ok=True)
+                raise
+    
+    def _save_to_store(self, ips: List[str]) -> Dict[str, Any]:
+        """Load devices, the twin graph and the generated formats into the project store."""
+        with self.telemetry.span('export.sqlite', devices=len(ips)):
+            return self.store_sink.write(
+                (self.discovered_devices[ip] for ip in ips),
+                self._twin_graph(ips),
+                self.scan_metadata,
+                {'containerlab': self._containerlab_document(ips), 'docker_compose': self._compose_document(ips)},
+            )
+    
+    def _save_to_archive(self, ips: List[str]) -> Optional[int]:
+        """Add this scan to the compressed scan archive."""
+        with self.telemetry.span('export.archive', devices=len(ips)):
+            with ScanArchive(self.archive_path) as archive:
+                return archive.add_scan(
+                    self.scan_metadata,
+                    (self.discovered_devices[ip].to_dict() for ip in ips),
+                    source=str(Path(self.output_file).absolute()),
+                )
     
     def save_results(self):
-        """Save all results to JSON file."""
-        print(f"\n💾 Saving results to {self.output_file}...")
+        """Save the JSON results and the containerlab / docker-compose YAML.
         
-        output = {
-            'metadata': self.scan_metadata,
-            'devices': self.discovered_devices,
-            'topology': self.scan_metadata.get('topology', {}),
-            'bluetooth_devices': self.scan_metadata.get('bluetooth_devices', []),
-            'containerlab_format': self.generate_containerlab_format(),
-            'docker_compose_format': self.generate_docker_compose_format()
-        }
+        The three files are written concurrently, each streamed device by
+        device into a temporary file that is renamed over the target once
+        complete, so readers never see a partial file. With a project store
+        or scan archive configured the results are also added to them
+        alongside.
+        """
+        import contextvars
+        from concurrent.futures import ThreadPoolExecutor
+        
+        print(f"\n💾 Saving results to {self.output_file}...")
         
         output_path = Path(self.output_file)
         output_path.parent.mkdir(parents=True, exist_ok=True)
+        clab_file = output_path.parent / f"{output_path.stem}-containerlab.yml"
+        compose_file = output_path.parent / f"{output_path.stem}-docker-compose.yml"
+        
+        ips = list(self.discovered_devices)
+        yaml_ips = sorted(ips, key=self._node_name)  # YAML keys are emitted sorted
+        yaml = _load_yaml()
         
-        with open(output_path, 'w') as f:
-            json.dump(output, f, indent=2)
+        writers: Dict[Path, Callable[[Any], None]] = {}
+        if not self.result_stream:
+            writers[output_path] = lambda f: JsonStream(f).write(self._results_document(ips))
+        if yaml is not None:
+            writers[clab_file] = lambda f: YamlStream(f, yaml).write(self._containerlab_document(yaml_ips))
+            writers[compose_file] = lambda f: YamlStream(f, yaml).write(self._compose_document(yaml_ips))
+        else:
+            print("⚠️  PyYAML not installed - skipping containerlab/compose YAML (pip3 install pyyaml)")
+        
+        with ThreadPoolExecutor(max_workers=max(1, len(writers) + bool(self.store_sink) + bool(self.archive_path))) as pool:
+            futures = {
+                path: pool.submit(contextvars.copy_context().run, self._write_artifact, path, write)
+                for path, write in writers.items()
+            }
+            if self.store_sink:
+                futures[self.store_sink.path] = pool.submit(contextvars.copy_context().run, self._save_to_store, ips)
+            if self.archive_path:
+                futures[self.archive_path] = pool.submit(contextvars.copy_context().run, self._save_to_archive, ips)
+            if self.result_stream:
+                # Devices were streamed as they completed; append the summaries
+                self.result_stream.write('metadata', {'metadata': self.scan_metadata})
+                self.result_stream.write('topology', {'topology': self.scan_metadata.get('topology', {})})
+                self.result_stream.write('bluetooth_devices', {
+                    'bluetooth_devices': self.scan_metadata.get('bluetooth_devices', [])
+                })
+                self.result_stream.write_lazy('containerlab_format', self._containerlab_document(ips))
+                self.result_stream.write_lazy('docker_compose_format', self._compose_document(ips))
+                self.result_stream.close()
+            
+        results_error = None
+        for path, future in futures.items():
+            error = future.exception()
+            if error is None:
+                continue
+            if path == output_path or (self.store_sink and path == self.store_sink.path):
+                results_error = error
+            elif path == self.archive_path:
+                print(f"⚠️  Could not archive the scan to {path}: {error}")
+            else:
+                print(f"⚠️  Could not save {path}: {error}")
+        if results_error is not None:
+            raise results_error
         
         print(f"✅ Results saved to {output_path.absolute()}")
         print(f"📦 Total devices discovered: {len(self.discovered_devices)}")
         print(f"📦 Bluetooth devices: {len(self.scan_metadata.get('bluetooth_devices', []))}")
+        if clab_file in futures and futures[clab_file].exception() is None:
+            print(f"📦 Containerlab config: {clab_file}")
+        if compose_file in futures and futures[compose_file].exception() is None:
+            print(f"📦 Docker Compose config: {compose_file}")
+        if self.archive_path and futures[self.archive_path].exception() is None:
+            scan_id = futures[self.archive_path].result()
+            if scan_id is None:
+                print(f"📦 Scan archive: {self.archive_path} (scan already archived)")
+            else:
+                print(f"📦 Scan archive: {self.archive_path} (scan #{scan_id})")
+        if self.store_sink:
+            stored = futures[self.store_sink.path].result()
+            print(f"📦 Project store: {self.store_sink.path} (project {self.store_sink.project_id}, "
+                  f"{stored['devices']} devices, topology {stored['topology_id']})")
         
-        # Also save containerlab and docker-compose files separately
-        clab_file = output_path.parent / f"{output_path.stem}-containerlab.yml"
-        compose_file = output_path.parent / f"{output_path.stem}-docker-compose.yml"
+        if self.journal:
+            self.journal.discard()
+
+
+def _segment_worker(
+    config: Dict[str, Any],
+    segment: Dict[str, Any],
+    device_map: Optional[Dict[str, Dict[str, Any]]],
+    events: Any,
+    trace_parent: Optional[Dict[str, str]] = None,
+) -> Dict[str, Any]:
+    """Process-pool entry point for one network segment.
+    
+    With ``device_map`` of None the segment is ARP-swept and its hosts are
+    returned; otherwise the given hosts are scanned and every recorded
+    device is sent back through the ``events`` queue as it completes.
+    Telemetry spans continue the parent's trace from ``trace_parent``.
+    """
+    mapper = NetworkTopologyMapper(**config)
+    mapper.telemetry.set_parent(trace_parent)
+    try:
+        if device_map is None:
+            with mapper.telemetry.span('arp_scan', network=segment['network_cidr']):
+                return {'arp_devices': mapper.arp_scan(segment['network_cidr'])}
+    
+        mapper._device_sink = lambda device_info, source: events.put((device_info, source))
+        if mapper.scan_cache:
+            mapper.scan_cache.load()
+        with mapper.telemetry.span('scan_segment', network=segment['network_cidr'], hosts=len(device_map)):
+            mapper.scan_hosts(device_map)
+        return {
+            'stage_timings': mapper.scan_metadata.get('stage_timings', {}),
+            'concurrency': mapper.scan_metadata.get('concurrency', {}),
+            'rate_budget': mapper.scan_metadata.get('rate_budget'),
+            'cache': mapper.scan_cache.export_updates() if mapper.scan_cache else None,
+        }
+    finally:
+        mapper.telemetry.shutdown()
+
+
+_ingest_mapper: Optional[NetworkTopologyMapper] = None
+
+
+def _ingest_xml_file(path: str) -> Tuple[str, Dict[str, Tuple[float, Dict[str, Any]]], Optional[str]]:
+    """Process-pool entry point for parsing one saved nmap XML file."""
+    global _ingest_mapper
+    if _ingest_mapper is None:
+        _ingest_mapper = NetworkTopologyMapper(journal=False)
+    try:
+        return path, _ingest_mapper._parse_nmap_xml_archive(path), None
+    except Exception as e:
+        return path, {}, str(e)
+
+
+class MonitorSnapshot(NamedTuple):
+    """One completed scan as served by the monitoring daemon."""
+    cycle: int
+    scan_time: str
+    metadata: Dict[str, Any]
+    devices: Dict[str, Dict[str, Any]]
+    state: bytes  # pre-rendered GET /state body
+
+
+class MonitorDaemon:
+    """Rescans on a schedule and serves the latest results over a local HTTP API.
+    
+    One mapper stays warm across cycles: each cycle is a scan_network() on
+    it that reuses the segments it detected, its tool lookups and its scan
+    cache, so hosts whose open ports are unchanged are port-swept and
+    reuse their cached deep-scan result, and its topology graph is only
+    updated for the hosts that changed. The segments are detected again
+    after a failed cycle. A completed cycle is swapped in as an immutable snapshot with its
+    /state body already rendered, and the changes since the previous
+    snapshot are appended to a bounded history, so API reads never wait
+    on a scan. The API listens on a Unix socket and optionally on a
+    localhost TCP port.
+    """
+    
+    DIFF_HISTORY = 100
+    
+    def __init__(self, config: Dict[str, Any], interval: float = 3600, socket_path: Optional[str] = None,
+                 port: Optional[int] = None):
+        output_path = Path(config.get('output_file') or 'network-topology.json')
+        self.config = {**config, 'journal': False, 'resume': False}
+        self.config['cache_file'] = config.get('cache_file') or str(output_path.with_name(f"{output_path.stem}-cache.json"))
+        self.output_path = output_path
+        self.interval = max(1.0, float(interval))
+        self.socket_path = Path(socket_path) if socket_path else output_path.with_suffix('.sock')
+        self.port = port
+        self.cache = ScanCache(
+            self.config['cache_file'], self.config.get('cache_ttl', 86400), self.config.get('cache_max_entries', 10000)
+        )
+        self.mapper: Optional[NetworkTopologyMapper] = None
+        self.snapshot: Optional[MonitorSnapshot] = None
+        self.diffs: deque = deque(maxlen=self.DIFF_HISTORY)
+        self.cycle = 0
+        self.status: Dict[str, Any] = {
+            'state': 'starting',
+            'last_scan': None,
+            'last_duration_s': None,
+            'last_error': None,
+            'next_scan': None,
+        }
+        self.started = time.time()
+        self._trigger = threading.Event()
+        self._lock = threading.Lock()
+        self._servers: List[Any] = []
+    
+    def _cycle_mapper(self) -> NetworkTopologyMapper:
+        """The warm mapper, ready for another cycle (created by the first one)."""
+        if self.mapper is None:
+            self.mapper = NetworkTopologyMapper(**self.config)
+            self.mapper.scan_cache = self.cache
+        else:
+            self.mapper.prepare_rescan(redetect=self.status['last_error'] is not None)
+        return self.mapper
+    
+    def warm_start(self):
+        """Serve the previously saved results until the first cycle completes."""
+        if not self.output_path.exists():
+            return
+        try:
+            metadata, devices = ScanArchive.read_results(self.output_path)
+        except Exception as e:
+            print(f"⚠️  Ignoring unreadable previous results {self.output_path}: {e}")
+            return
+        self.snapshot = self._snapshot(0, metadata, {device['ip']: device for device in devices})
+        print(f"♻️  Serving {len(devices)} devices from {self.output_path} until the first scan completes")
+    
+    @staticmethod
+    def _snapshot(cycle: int, metadata: Dict[str, Any], devices: Dict[str, Dict[str, Any]]) -> MonitorSnapshot:
+        state = json.dumps({'cycle': cycle, 'metadata': metadata, 'devices': devices}, default=str).encode()
+        return MonitorSnapshot(cycle, metadata.get('scan_time', ''), metadata, devices, state)
+    
+    @staticmethod
+    def diff(old: Dict[str, Dict[str, Any]], new: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """Devices added, removed and changed between two snapshots, as ScanArchive.diff reports them."""
+        def stable(device: Dict[str, Any]) -> Dict[str, Any]:
+            state, _volatile = ScanArchive.split_device(device)
+            state.pop('cache_hit', None)
+            return state
+        
+        added = []
+        changed = []
+        for ip, device in new.items():
+            if ip not in old:
+                added.append({'ip': ip, 'mac': device.get('mac', ''), 'ports': ScanArchive.open_ports(device)})
+                continue
+            changes = ScanArchive.device_changes(stable(old[ip]), stable(device))
+            if changes:
+                changed.append({'ip': ip, 'mac': device.get('mac', ''), 'changes': changes})
+        removed = [{'ip': ip, 'mac': device.get('mac', '')} for ip, device in old.items() if ip not in new]
+        key = lambda entry: _ip_sort_key(entry['ip'])  # noqa: E731
+        return {
+            'added': sorted(added, key=key),
+            'removed': sorted(removed, key=key),
+            'changed': sorted(changed, key=key),
+            'unchanged': len(new) - len(added) - len(changed),
+        }
+    
+    def _publish(self, cycle: int, mapper: NetworkTopologyMapper) -> Dict[str, Any]:
+        """Swap in a completed cycle's results and record what changed."""
+        devices = {ip: device.to_dict() for ip, device in mapper.discovered_devices.items()}
+        previous = self.snapshot
+        diff = self.diff(previous.devices if previous else {}, devices)
+        mapper.scan_metadata['monitor'] = {
+            'cycle': cycle,
+            'previous_cycle': previous.cycle if previous else None,
+            **{kind: len(diff[kind]) for kind in ('added', 'removed', 'changed')},
+        }
+        snapshot = self._snapshot(cycle, mapper.scan_metadata, devices)
+        with self._lock:
+            self.snapshot = snapshot
+            self.diffs.append({
+                'cycle': cycle,
+                'scan_time': snapshot.scan_time,
+                'previous_cycle': previous.cycle if previous else None,
+                **diff,
+            })
+        return diff
+    
+    def run_cycle(self) -> bool:
+        """One scheduled or triggered rescan; the previous snapshot stays up if it fails."""
+        self.cycle += 1
+        cycle = self.cycle
+        self.status['state'] = 'scanning'
+        started = time.monotonic()
+        self.cache.stats = dict.fromkeys(self.cache.stats, 0)
+        mapper = self._cycle_mapper()
+        print(f"\n🔁 Monitor cycle {cycle}")
+        error = None
+        try:
+            with mapper.telemetry.span('monitor_cycle', cycle=cycle):
+                if mapper.scan_network():
+                    diff = self._publish(cycle, mapper)
+                    print(f"\n🔀 Cycle {cycle}: {len(diff['added'])} added, {len(diff['removed'])} removed, "
+                          f"{len(diff['changed'])} changed, {diff['unchanged']} unchanged")
+                    try:
+                        mapper.save_results()
+                    except Exception as e:
+                        print(f"⚠️  Could not save cycle {cycle} results: {e}")
+                else:
+                    error = 'scan failed'
+        except Exception as e:
+            print(f"⚠️  Monitor cycle {cycle} failed: {e}")
+            error = str(e)
+        mapper.telemetry.write_metrics()
+        self.status.update(
+            last_scan=datetime.now().isoformat(),
+            last_duration_s=round(time.monotonic() - started, 3),
+            last_error=error,
+        )
+        return error is None
+    
+    def run(self) -> int:
+        """Scan every ``interval`` seconds, or sooner when POST /scan asks, until interrupted."""
+        import signal
+        
+        def terminate(signum, frame):
+            # Stop as on Ctrl-C; a repeated SIGTERM must not break the shutdown
+            signal.signal(signal.SIGTERM, signal.SIG_IGN)
+            raise KeyboardInterrupt
         
-        # Save as YAML (using json for simplicity, could use PyYAML)
-        import yaml
+        self.warm_start()
         try:
-            with open(clab_file, 'w') as f:
-                yaml.dump(output['containerlab_format'], f, default_flow_style=False)
-            print(f"📦 Containerlab config: {clab_file}")
-        except:
-            print(f"⚠️  Could not save YAML (install PyYAML): {clab_file}")
+            self.start_api()
+        except OSError as e:
+            print(f"❌ Could not start the monitoring API: {e}")
+            return 1
+        signal.signal(signal.SIGTERM, terminate)
+        try:
+            while True:
+                started = time.time()
+                self._trigger.clear()
+                self.run_cycle()
+                next_scan = started + self.interval
+                self.status.update(state='idle', next_scan=datetime.fromtimestamp(next_scan).isoformat())
+                print(f"\n💤 Next scan at {datetime.fromtimestamp(next_scan):%H:%M:%S} (POST /scan to start one now)")
+                self._trigger.wait(max(0.0, next_scan - time.time()))
+        except KeyboardInterrupt:
+            print("\n\n⚠️  Monitoring stopped")
+            return 0
+        finally:
+            self.stop_api()
+            if self.mapper is not None:
+                self.mapper.telemetry.shutdown()
+    
+    # API
+    
+    def start_api(self):
+        """Serve handle() on the Unix socket and the optional localhost port, each on its own thread.
+        
+        The socket is created mode 0660. The TCP port is open to every local
+        user, so it serves reads only and answers POST with 403.
+        """
+        import http.server
+        import socketserver
+        
+        daemon = self
         
+        class Handler(http.server.BaseHTTPRequestHandler):
+            server_version = 'network-topology-mapper/1.0'
+            
+            def do_GET(self):
+                self._reply(*daemon.handle('GET', self.path, self.headers.get('If-None-Match')))
+            
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                if not isinstance(self.server, UnixHTTPServer):
+                    # Any local user can reach the TCP port; only the socket's group may trigger scans
+                    self._reply(*daemon._json(403, {'error': 'POST is only served on the Unix socket'}))
+                    return
+                self._reply(*daemon.handle('POST', self.path))
+            
+            def _reply(self, status: int, body: bytes, etag: Optional[str]):
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                if etag:
+                    self.send_header('ETag', etag)
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # The client stopped reading
+            
+            def log_message(self, format, *args):
+                pass  # Polling clients would drown out the scan log
+        
+        class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+            daemon_threads = True
+        
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
         try:
-            with open(compose_file, 'w') as f:
-                yaml.dump(output['docker_compose_format'], f, default_flow_style=False)
-            print(f"📦 Docker Compose config: {compose_file}")
-        except:
-            print(f"⚠️  Could not save YAML (install PyYAML): {compose_file}")
+            probe.connect(str(self.socket_path))
+            raise OSError(f"{self.socket_path} is in use by another daemon")
+        except (FileNotFoundError, ConnectionRefusedError):
+            self.socket_path.unlink(missing_ok=True)
+        finally:
+            probe.close()
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+        # Bind under a umask, so the socket is never reachable by others before a chmod
+        umask = os.umask(0o117)
+        try:
+            self._servers.append(UnixHTTPServer(str(self.socket_path), Handler))
+        finally:
+            os.umask(umask)
+        print(f"🛰️  Monitoring API on unix:{self.socket_path}")
+        if self.port is not None:
+            self._servers.append(http.server.ThreadingHTTPServer(('127.0.0.1', self.port), Handler))
+            print(f"🛰️  Monitoring API on http://127.0.0.1:{self.port}")
+        for server in self._servers:
+            threading.Thread(target=server.serve_forever, name='monitor-api', daemon=True).start()
+    
+    def stop_api(self):
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+        if self._servers:
+            self.socket_path.unlink(missing_ok=True)
+        self._servers = []
+    
+    @staticmethod
+    def _json(status: int, value: Any, etag: Optional[str] = None) -> Tuple[int, bytes, Optional[str]]:
+        return status, json.dumps(value, default=str).encode(), etag
+    
+    def handle(self, method: str, target: str, if_none_match: Optional[str] = None) -> Tuple[int, bytes, Optional[str]]:
+        """(HTTP status, JSON body, ETag) for one API request.
+        
+        GET /status, /state, /devices, /devices/<ip>, /topology and
+        /diff?since=<cycle> read the current snapshot; POST /scan starts a
+        rescan as soon as the running one, if any, completes. Snapshot
+        reads carry an ETag, so pollers get an empty 304 until the next
+        cycle lands.
+        """
+        from urllib.parse import parse_qs, urlsplit
+        
+        url = urlsplit(target)
+        path = url.path.rstrip('/') or '/'
+        if method == 'POST':
+            if path != '/scan':
+                return self._json(404, {'error': f"unknown endpoint POST {path}"})
+            self._trigger.set()
+            return self._json(202, {'queued': True, 'state': self.status['state'], 'cycle': self.cycle})
+        
+        with self._lock:
+            snapshot = self.snapshot
+            diffs = list(self.diffs)
+        if path == '/status':
+            return self._json(200, {
+                **self.status,
+                'cycle': self.cycle,
+                'snapshot_cycle': snapshot.cycle if snapshot else None,
+                'devices': len(snapshot.devices) if snapshot else 0,
+                'interval_s': self.interval,
+                'uptime_s': round(time.time() - self.started, 1),
+                'cache': self.cache.summary(),
+            })
+        if path == '/diff':
+            # The cycle a client passes back as ?since=; never one still scanning
+            published = diffs[-1]['cycle'] if diffs else 0
+            since = parse_qs(url.query).get('since', [None])[0]
+            if since is None:
+                return self._json(200, {'cycle': published, 'complete': True, 'diffs': diffs[-1:]})
+            try:
+                since_cycle = int(since)
+            except ValueError:
+                return self._json(400, {'error': f"since must be a cycle number, not {since!r}"})
+            # Incomplete when the client missed diffs that were dropped or predate a restart
+            complete = since_cycle <= self.cycle and not (
+                diffs and diffs[0]['previous_cycle'] is not None and since_cycle < diffs[0]['previous_cycle']
+            )
+            return self._json(200, {
+                'cycle': published,
+                'complete': complete,
+                'diffs': [entry for entry in diffs if entry['cycle'] > since_cycle],
+            })
+        if path not in ('/state', '/devices', '/topology') and not path.startswith('/devices/'):
+            return self._json(404, {'error': f"unknown endpoint GET {path}"})
+        if snapshot is None:
+            return self._json(503, {'error': 'no scan has completed yet', 'state': self.status['state']})
+        
+        etag = f'"{snapshot.cycle}:{snapshot.scan_time}"'
+        if if_none_match == etag:
+            return 304, b'', etag
+        if path == '/state':
+            return 200, snapshot.state, etag
+        if path == '/devices':
+            return self._json(200, snapshot.devices, etag)
+        if path == '/topology':
+            return self._json(200, snapshot.metadata.get('topology') or {}, etag)
+        ip = path[len('/devices/'):]
+        if ip not in snapshot.devices:
+            return self._json(404, {'error': f"{ip} is not in the current snapshot"})
+        return self._json(200, snapshot.devices[ip], etag)
+
+
+DEFAULT_ARCHIVE = 'network-scans/scan-archive.db'
+ARCHIVE_COMMANDS = ('archive', 'history', 'diff', 'restore')
+
+
+def _archive_inputs(paths: List[str]) -> List[Path]:
+    """Results files named on the command line; directories contribute their *.json / *.ndjson."""
+    files = []
+    for name in paths:
+        path = Path(name)
+        if path.is_dir():
+            files.extend(sorted(
+                child for child in path.iterdir()
+                if child.suffix in ('.json', '.ndjson') and not child.name.startswith('.')
+            ))
+        else:
+            files.append(path)
+    return files
+
+
+def archive_main(argv: List[str]) -> int:
+    """The archive, history, diff and restore subcommands."""
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument(
+        '--archive',
+        default=DEFAULT_ARCHIVE,
+        metavar='PATH',
+        help=f'Scan archive file (default: {DEFAULT_ARCHIVE})'
+    )
+    common.add_argument(
+        '--json',
+        action='store_true',
+        help='Print machine-readable JSON instead of text'
+    )
+    parser = argparse.ArgumentParser(
+        prog='network-topology-mapper.py',
+        description='Compressed scan archive: add saved results, query device history, diff scans'
+    )
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    archive_parser = commands.add_parser('archive', parents=[common], help='Add saved JSON/NDJSON results to the archive')
+    archive_parser.add_argument('files', nargs='+', metavar='FILE|DIR', help='Results files, or directories of them')
+    archive_parser.add_argument(
+        '--delete',
+        action='store_true',
+        help='Delete each file (and its containerlab/compose YAML) once it is archived and verified'
+    )
+    
+    history_parser = commands.add_parser('history', parents=[common], help='Show how a device changed across scans')
+    history_parser.add_argument('host', nargs='?', help='Device IP or MAC (default: list archived scans)')
+    history_parser.add_argument('--port', type=int, help='Only report when this port was open (first/last seen)')
+    
+    diff_parser = commands.add_parser('diff', parents=[common], help='Compare two archived scans')
+    diff_parser.add_argument('old', nargs='?', help='Scan id (#12), time prefix (e.g. 2026-03-04) or latest (default: previous scan)')
+    diff_parser.add_argument('new', nargs='?', default='latest', help='Scan id (#12), time prefix or latest (default: latest)')
+    
+    restore_parser = commands.add_parser('restore', parents=[common], help='Write an archived scan back out as results files')
+    restore_parser.add_argument('scan', help='Scan id (#12), time prefix or latest')
+    restore_parser.add_argument('-o', '--output', required=True, help='Output JSON file (YAML files are written next to it)')
+    
+    args = parser.parse_args(argv)
+    archive_path = Path(args.archive)
+    if args.command != 'archive' and not archive_path.exists():
+        print(f"❌ No scan archive at {archive_path}")
+        return 1
+    
+    with ScanArchive(archive_path) as archive:
+        try:
+            if args.command == 'archive':
+                return _archive_files(archive, _archive_inputs(args.files), args.delete)
+            if args.command == 'history':
+                return _show_history(archive, args)
+            if args.command == 'diff':
+                return _show_diff(archive, args)
+            return _restore_scan(archive, args.scan, args.output)
+        except KeyError as e:
+            print(f"❌ {e.args[0]}")
+            return 1
+
+
+def _archive_files(archive: ScanArchive, files: List[Path], delete: bool) -> int:
+    before = archive.path.stat().st_size
+    input_bytes = 0
+    failed = 0
+    for path in files:
+        try:
+            metadata, devices = ScanArchive.read_results(path)
+            scan_id = archive.add_scan(metadata, devices, source=str(path.absolute()))
+        except Exception as e:
+            print(f"⚠️  Could not archive {path}: {e}")
+            failed += 1
+            continue
+        input_bytes += path.stat().st_size
+        if scan_id is None:
+            print(f"  = {path.name}: already archived")
+        else:
+            print(f"  + {path.name}: scan #{scan_id}, {len(devices)} devices")
+        if delete:
+            _archived, restored = archive.scan_results(f'#{scan_id}' if scan_id else metadata['scan_time'])
+            if restored != {device['ip']: device for device in devices}:
+                print(f"⚠️  {path.name} did not round-trip through the archive - kept")
+                failed += 1
+                continue
+            for victim in (path, path.with_name(f"{path.stem}-containerlab.yml"),
+                           path.with_name(f"{path.stem}-docker-compose.yml")):
+                victim.unlink(missing_ok=True)
+    archive.conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    grown = archive.path.stat().st_size - before
+    print(f"✅ Archived {len(files) - failed}/{len(files)} files "
+          f"({input_bytes / 1e6:.1f} MB of results, archive grew {grown / 1e6:.2f} MB)")
+    return 1 if failed else 0
+
+
+def _short_time(scan_time: str) -> str:
+    return scan_time[:19]
+
+
+def _show_history(archive: ScanArchive, args: Any) -> int:
+    if args.port is not None:
+        rows = archive.port_history(args.port, args.host)
+        if args.json:
+            print(json.dumps(rows, indent=2))
+            return 0
+        print(f"🔎 Port {args.port}{f' on {args.host}' if args.host else ''}: {len(rows)} devices")
+        for row in rows:
+            print(f"  {row['ip']:<16} first {_short_time(row['first_seen'])}  "
+                  f"last {_short_time(row['last_seen'])}  ({row['scans']} scans)")
+        return 0
+    
+    if not args.host:
+        scans = archive.scans()
+        if args.json:
+            print(json.dumps([dict(zip(('id', 'scan_time', 'devices', 'source'), scan)) for scan in scans], indent=2))
+            return 0
+        states = archive.conn.execute('SELECT COUNT(*) FROM objects').fetchone()[0]
+        print(f"🗄️  {archive.path}: {len(scans)} scans, {states} stored states, "
+              f"{archive.path.stat().st_size / 1e6:.1f} MB")
+        for scan_id, scan_time, devices, source in scans:
+            print(f"  #{scan_id:<5} {_short_time(scan_time)}  {devices:>6} devices  {source or ''}")
+        return 0
+    
+    history = archive.host_history(args.host)
+    if args.json:
+        print(json.dumps(history, indent=2))
+        return 0
+    if not history:
+        print(f"❌ {args.host} is not in any archived scan")
+        return 1
+    print(f"📜 {args.host}: {len(history)} states over {sum(entry['scans'] for entry in history)} scans")
+    for entry in history:
+        span = _short_time(entry['scan_time'])
+        if entry['last_scan_time'] != entry['scan_time']:
+            span += f" → {_short_time(entry['last_scan_time'])}"
+        ip = f"{entry['ip']}  " if entry['ip'] and entry['ip'] != args.host else ''
+        print(f"  {span:<41} ({entry['scans']} scans)  {ip}{'; '.join(entry['changes']) or 'rescanned'}")
+    return 0
+
+
+def _show_diff(archive: ScanArchive, args: Any) -> int:
+    old = args.old
+    if old is None:
+        scans = archive.scans()
+        if len(scans) < 2:
+            print("❌ The archive needs at least two scans to diff")
+            return 1
+        old = str(scans[-2][0])
+    result = archive.diff(old, args.new)
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return 0
+    print(f"🔀 Scan #{result['old']['id']} ({_short_time(result['old']['scan_time'])}, {result['old']['devices']} devices)"
+          f" → #{result['new']['id']} ({_short_time(result['new']['scan_time'])}, {result['new']['devices']} devices)")
+    for entry in result['added']:
+        print(f"  + {entry['ip']:<16} {entry['mac']:<18} ports {', '.join(map(str, entry['ports'])) or 'none'}")
+    for entry in result['removed']:
+        print(f"  - {entry['ip']:<16} {entry['mac']}")
+    for entry in result['changed']:
+        print(f"  ~ {entry['ip']:<16} {'; '.join(entry['changes'])}")
+    print(f"  = {result['unchanged']} unchanged")
+    return 0
+
+
+def _restore_scan(archive: ScanArchive, ref: str, output: str) -> int:
+    metadata, devices = archive.scan_results(ref)
+    mapper = NetworkTopologyMapper(output_file=output, journal=False)
+    mapper.scan_metadata = metadata
+    mapper.discovered_devices = {ip: Device.from_dict(device) for ip, device in devices.items()}
+    mapper.save_results()
+    return 0
 
 
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] in ARCHIVE_COMMANDS:
+        return archive_main(sys.argv[1:])
+    
     parser = argparse.ArgumentParser(
         description='Network Topology Mapper - Comprehensive network reconnaissance and topology mapping',
-        epilog='Requires root/sudo privileges for raw socket operations. For authorized local testing only.'
+        epilog='Requires root/sudo privileges for raw socket operations. For authorized local testing only. '
+               'Archived scans are queried with the subcommands: archive, history, diff, restore '
+               '(see "network-topology-mapper.py history --help").'
     )
     parser.add_argument(
         '-o', '--output',
@@ -776,7 +6269,25 @@ def main():
     )
     parser.add_argument(
         '-i', '--interface',
-        help='Network interface to scan (default: auto-detect)'
+        action='append',
+        dest='interfaces',
+        metavar='IFACE',
+        help='Network interface to scan; repeat to scan several (default: auto-detect)'
+    )
+    parser.add_argument(
+        '-t', '--target',
+        action='append',
+        dest='targets',
+        metavar='CIDR',
+        help='Network CIDR to scan; repeat to scan several segments in parallel'
+    )
+    parser.add_argument(
+        '--format',
+        dest='output_format',
+        choices=['json', 'ndjson'],
+        default='json',
+        help='json: one document written at the end; ndjson: one record per device streamed '
+             'as it completes, followed by summary records (default: json)'
     )
     parser.add_argument(
         '--skip-prereq-check',
@@ -793,7 +6304,23 @@ def main():
         '--nmap-parallel',
         type=int,
         default=6,
-        help='Parallel nmap workers for host scans (default: 6)'
+        help='Initial parallel nmap workers for host scans; adjusted at runtime unless --no-adaptive (default: 6)'
+    )
+    parser.add_argument(
+        '--max-workers',
+        type=int,
+        default=None,
+        help='Upper bound for adaptive nmap worker count (default: 4x the initial worker count)'
+    )
+    parser.add_argument(
+        '--no-adaptive',
+        action='store_true',
+        help='Keep the nmap worker count fixed instead of adapting to timeouts and failures'
+    )
+    parser.add_argument(
+        '--no-pipeline',
+        action='store_true',
+        help='Wait for the whole ARP sweep before starting deep scans instead of scanning hosts as they answer'
     )
     parser.add_argument(
         '--nmap-min-rate',
@@ -831,6 +6358,158 @@ def main():
         default='1000ms',
         help='Max RTT timeout (default: 1000ms)'
     )
+    parser.add_argument(
+        '--arp-rate',
+        type=int,
+        default=5000,
+        help='Packets per second for the raw ARP sweep engine (Linux, root) (default: 5000)'
+    )
+    parser.add_argument(
+        '--rate-budget',
+        type=float,
+        default=None,
+        metavar='PPS',
+        help='Site-wide packets/s ceiling shared by the ARP sweep and all concurrent nmap workers; '
+             'each gets a share through --max-rate or in-process pacing (default: no ceiling)'
+    )
+    parser.add_argument(
+        '--nmap-host-group',
+        type=int,
+        default=1,
+        help='Hosts passed to each nmap run; >1 shares one nmap process per group (default: 1)'
+    )
+    parser.add_argument(
+        '--scan-mode',
+        choices=['single-pass', 'two-phase'],
+        default='single-pass',
+        help='single-pass: intensive all-port scan per host; two-phase: SYN port sweep first, '
+             'then version/OS/script scans on open ports only (default: single-pass)'
+    )
+    parser.add_argument(
+        '--sweep-timeout',
+        type=int,
+        default=300,
+        help='Max per-host time for the two-phase port sweep in seconds (default: 300)'
+    )
+    parser.add_argument(
+        '--sweep-parallel',
+        type=int,
+        default=None,
+        help='Parallel nmap workers for the two-phase port sweep (default: same as --nmap-parallel)'
+    )
+    parser.add_argument(
+        '--cache',
+        dest='cache_file',
+        default=None,
+        help='Scan cache file; unchanged hosts reuse cached results instead of a deep rescan, '
+             'and the rest are deep-scanned on the open ports the sweep found, as in two-phase mode'
+    )
+    parser.add_argument(
+        '--cache-ttl',
+        type=int,
+        default=86400,
+        help='Seconds a cached device result stays valid (default: 86400)'
+    )
+    parser.add_argument(
+        '--cache-max-entries',
+        type=int,
+        default=10000,
+        help='Max cached devices; least recently used are evicted (default: 10000)'
+    )
+    parser.add_argument(
+        '--passive',
+        action='store_true',
+        help='Also seed hosts from the kernel neighbor table (/proc/net/arp)'
+    )
+    parser.add_argument(
+        '--pcap',
+        action='append',
+        dest='pcap_files',
+        metavar='FILE',
+        help='Seed hosts from a pcap/pcapng capture (ARP, DHCP, mDNS, LLDP, CDP); repeatable'
+    )
+    parser.add_argument(
+        '--passive-only',
+        action='store_true',
+        help='Record passively discovered hosts without ARP probes, nmap or Bluetooth scans'
+    )
+    parser.add_argument(
+        '--ipv6',
+        action='store_true',
+        help='Also find IPv6 hosts via ICMPv6 multicast and the neighbor cache; '
+             'IPv6-only hosts are deep-scanned with nmap -6 (default: off)'
+    )
+    parser.add_argument(
+        '--from-xml',
+        action='append',
+        metavar='DIR|GLOB',
+        help='Build results from saved nmap XML files (directory, file or glob; repeatable) instead of scanning'
+    )
+    parser.add_argument(
+        '--otlp-endpoint',
+        metavar='URL',
+        help='Export traces and metrics over OTLP/HTTP to this collector, e.g. http://localhost:4318 '
+             '(requires opentelemetry-sdk; default: disabled)'
+    )
+    parser.add_argument(
+        '--telemetry-file',
+        metavar='PATH',
+        help='Append spans and a metrics summary to this NDJSON file for offline runs (default: disabled)'
+    )
+    parser.add_argument(
+        '--sqlite',
+        dest='sqlite_path',
+        metavar='PATH',
+        help='Also load devices, topology and generated formats into this Inspector Twin project store '
+             '(e.g. seed/inspectortwin.db; requires --project; default: disabled)'
+    )
+    parser.add_argument(
+        '--project',
+        dest='project_id',
+        metavar='ID',
+        help='Project id for --sqlite; created if it does not exist (default: none)'
+    )
+    parser.add_argument(
+        '--archive',
+        dest='archive_path',
+        metavar='PATH',
+        help='Also add the results to this compressed scan archive, queried with the history and diff '
+             f'subcommands (e.g. {DEFAULT_ARCHIVE}; default: disabled)'
+    )
+    parser.add_argument(
+        '--daemon',
+        action='store_true',
+        help='Keep running as a monitoring daemon: rescan every --interval seconds with a scan cache kept warm '
+             'in memory, and serve the latest results, diffs and scan triggers over a local HTTP API'
+    )
+    parser.add_argument(
+        '--interval',
+        type=float,
+        default=3600,
+        metavar='SECONDS',
+        help='Seconds between the starts of daemon rescans (default: 3600)'
+    )
+    parser.add_argument(
+        '--api-socket',
+        metavar='PATH',
+        help='Unix socket for the daemon API (default: the --output path with a .sock suffix)'
+    )
+    parser.add_argument(
+        '--api-port',
+        type=int,
+        metavar='PORT',
+        help='Also serve the daemon API read-only over HTTP on 127.0.0.1:PORT; POST /scan stays on the Unix socket (default: disabled)'
+    )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Resume an interrupted scan from the checkpoint journal next to --output'
+    )
+    parser.add_argument(
+        '--no-journal',
+        action='store_true',
+        help='Do not write the checkpoint journal (interrupted scans cannot be resumed)'
+    )
     parser.add_argument(
         '--assume-yes',
         action='store_true',
@@ -838,6 +6517,12 @@ def main():
     )
     
     args = parser.parse_args()
+    if args.sqlite_path and not args.project_id:
+        parser.error('--sqlite requires --project')
+    if args.daemon and (args.from_xml or args.resume):
+        parser.error('--daemon cannot be combined with --from-xml or --resume')
+    if args.rate_budget is not None and not 0 < args.rate_budget < float('inf'):
+        parser.error('--rate-budget must be a positive number of packets/s')
     
     def confirm_or_exit(prompt, expected, assume_yes=False):
         if assume_yes:
@@ -851,8 +6536,7 @@ def main():
             sys.exit(0)
 
     # Check if running as root
-    import os
-    if os.geteuid() != 0:
+    if os.geteuid() != 0 and not (args.passive_only or args.from_xml):
         print("⚠️  WARNING: Not running as root. Some scans may fail.")
         print("    Run with: sudo python3 network-topology-mapper.py")
         if args.assume_yes:
@@ -867,7 +6551,8 @@ def main():
     
     mapper = NetworkTopologyMapper(
         output_file=args.output,
-        interface=args.interface,
+        interfaces=args.interfaces,
+        targets=args.targets,
         nmap_timeout=args.nmap_timeout,
         nmap_parallelism=args.nmap_parallel,
         nmap_min_rate=args.nmap_min_rate,
@@ -875,25 +6560,58 @@ def main():
         nmap_min_parallelism=args.nmap_min_parallelism,
         nmap_max_parallelism=args.nmap_max_parallelism,
         nmap_initial_rtt=args.nmap_initial_rtt,
-        nmap_max_rtt=args.nmap_max_rtt
+        nmap_max_rtt=args.nmap_max_rtt,
+        nmap_host_group_size=args.nmap_host_group,
+        scan_mode=args.scan_mode,
+        sweep_timeout=args.sweep_timeout,
+        sweep_parallelism=args.sweep_parallel,
+        cache_file=args.cache_file,
+        cache_ttl=args.cache_ttl,
+        cache_max_entries=args.cache_max_entries,
+        journal=not args.no_journal,
+        resume=args.resume,
+        output_format=args.output_format,
+        max_workers=args.max_workers,
+        adaptive_concurrency=not args.no_adaptive,
+        pipeline_discovery=not args.no_pipeline,
+        arp_rate=args.arp_rate,
+        rate_budget=args.rate_budget,
+        passive=args.passive,
+        pcap_files=args.pcap_files,
+        passive_only=args.passive_only,
+        ipv6=args.ipv6,
+        otlp_endpoint=args.otlp_endpoint,
+        telemetry_file=args.telemetry_file,
+        sqlite_path=args.sqlite_path,
+        project_id=args.project_id,
+        archive_path=args.archive_path
     )
     
     # Check prerequisites
-    if not args.skip_prereq_check:
+    if not args.skip_prereq_check and not (args.passive_only or args.from_xml):
         if not mapper.check_prerequisites():
             print("\n❌ Prerequisites check failed. Install missing tools or use --skip-prereq-check")
             sys.exit(1)
     
-    print("\n⚠️  AUTHORIZATION NOTICE")
-    print("This tool performs intensive network reconnaissance.")
-    print("Only use on networks you own or have explicit written permission to test.")
-    confirm_or_exit("\nI confirm I am authorized to scan this network (yes/no): ", "yes", args.assume_yes)
+    if not args.from_xml:
+        print("\n⚠️  AUTHORIZATION NOTICE")
+        print("This tool performs intensive network reconnaissance.")
+        print("Only use on networks you own or have explicit written permission to test.")
+        confirm_or_exit("\nI confirm I am authorized to scan this network (yes/no): ", "yes", args.assume_yes)
+    
+    if args.daemon:
+        mapper.telemetry.shutdown()
+        daemon = MonitorDaemon(mapper._config, args.interval, args.api_socket, args.api_port)
+        return daemon.run()
     
     # Run scan
     try:
-        success = mapper.scan_network()
+        with mapper.telemetry.span('ingest_nmap_xml' if args.from_xml else 'scan_network'):
+            success = mapper.ingest_nmap_xml(args.from_xml) if args.from_xml else mapper.scan_network()
+            if success:
+                with mapper.telemetry.span('export', output_format=args.output_format):
+                    mapper.save_results()
         if success:
-            mapper.save_results()
             print("\n✅ Network topology mapping complete!")
             return 0
         else:
@@ -901,12 +6619,17 @@ def main():
             return 1
     except KeyboardInterrupt:
         print("\n\n⚠️  Scan interrupted by user")
+        if mapper.journal:
+            mapper.journal.close()
+            print(f"📝 Progress kept in {mapper.journal.path} - rerun with --resume to continue")
         return 130
     except Exception as e:
         print(f"\n❌ Error: {e}")
         import traceback
         traceback.print_exc()
         return 1
+    finally:
+        mapper.telemetry.shutdown()
 
 
 if __name__ == '__main__':
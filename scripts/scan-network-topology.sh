@@ -14,6 +14,7 @@ PYTHON_SCRIPT="${SCRIPT_DIR}/network-topology-mapper.py"
 OUTPUT_DIR="${PROJECT_ROOT}/network-scans"
 TIMESTAMP=$(date +"%Y%m%d_%H%M%S")
 OUTPUT_FILE="${OUTPUT_DIR}/network-topology-${TIMESTAMP}.json"
+ARCHIVE_FILE="${OUTPUT_DIR}/scan-archive.db"
 
 # Colors for output
 RED='\033[0;31m'
@@ -51,15 +52,19 @@ fi
 # Check for required dependencies
 echo -e "${BLUE}📦 Checking Python dependencies...${NC}"
 
-# Try to import required modules
-python3 -c "import scapy" 2>/dev/null || {
+# Locate modules without importing them (importing scapy takes seconds)
+has_module() {
+    python3 -c "import sys, importlib.util; sys.exit(importlib.util.find_spec('$1') is None)" 2>/dev/null
+}
+
+has_module scapy || {
     echo -e "${YELLOW}⚠️  Python scapy module not found. Installing...${NC}"
     pip3 install scapy || {
         echo -e "${YELLOW}⚠️  Could not install scapy. ARP scanning will use fallback methods.${NC}"
     }
 }
 
-python3 -c "import yaml" 2>/dev/null || {
+has_module yaml || {
     echo -e "${YELLOW}⚠️  PyYAML module not found. Installing...${NC}"
     pip3 install PyYAML || {
         echo -e "${YELLOW}⚠️  Could not install PyYAML. YAML output will be skipped.${NC}"
@@ -110,6 +115,9 @@ echo ""
 # Parse arguments
 INTERFACE=""
 SKIP_PREREQ=""
+ARCHIVE="yes"
+RATE_BUDGET=""
+KEEP=""
 
 while [[ $# -gt 0 ]]; do
     case $1 in
@@ -125,6 +133,18 @@ while [[ $# -gt 0 ]]; do
             SKIP_PREREQ="--skip-prereq-check"
             shift
             ;;
+        --no-archive)
+            ARCHIVE=""
+            shift
+            ;;
+        --rate-budget)
+            RATE_BUDGET="$2"
+            shift 2
+            ;;
+        --keep)
+            KEEP="$2"
+            shift 2
+            ;;
         -h|--help)
             echo "Usage: $0 [options]"
             echo ""
@@ -132,6 +152,10 @@ while [[ $# -gt 0 ]]; do
             echo "  -i, --interface <iface>  Network interface to scan (default: auto-detect)"
             echo "  -o, --output <file>      Output JSON file (default: network-scans/network-topology-TIMESTAMP.json)"
             echo "  --skip-prereq            Skip prerequisite checks"
+            echo "  --no-archive             Do not add the scan to network-scans/scan-archive.db"
+            echo "  --rate-budget <pps>      Packets/s ceiling for the whole scan (default: none)"
+            echo "  --keep <n>               Keep the newest n results in network-scans/ as files; archive"
+            echo "                           and delete older ones once verified (default: keep all)"
             echo "  -h, --help               Show this help message"
             exit 0
             ;;
@@ -142,6 +166,17 @@ while [[ $# -gt 0 ]]; do
     esac
 done
 
+if [ -n "$KEEP" ]; then
+    if ! [[ "$KEEP" =~ ^[1-9][0-9]*$ ]]; then
+        echo -e "${RED}❌ --keep needs a positive number of results to keep${NC}"
+        exit 1
+    fi
+    if [ -z "$ARCHIVE" ]; then
+        echo -e "${RED}❌ --keep prunes into the archive and cannot be combined with --no-archive${NC}"
+        exit 1
+    fi
+fi
+
 # Build command
 CMD="python3 ${PYTHON_SCRIPT} -o ${OUTPUT_FILE}"
 if [ -n "$INTERFACE" ]; then
@@ -150,6 +185,12 @@ fi
 if [ -n "$SKIP_PREREQ" ]; then
     CMD="$CMD $SKIP_PREREQ"
 fi
+if [ -n "$ARCHIVE" ]; then
+    CMD="$CMD --archive ${ARCHIVE_FILE}"
+fi
+if [ -n "$RATE_BUDGET" ]; then
+    CMD="$CMD --rate-budget $RATE_BUDGET"
+fi
 
 echo -e "${BLUE}🚀 Starting network scan...${NC}"
 echo ""
@@ -169,7 +210,25 @@ if [ $EXIT_CODE -eq 0 ]; then
     echo "   JSON: ${OUTPUT_FILE}"
     echo "   Containerlab: ${OUTPUT_FILE%.json}-containerlab.yml"
     echo "   Docker Compose: ${OUTPUT_FILE%.json}-docker-compose.yml"
+    if [ -n "$ARCHIVE" ]; then
+        echo "   Archive: ${ARCHIVE_FILE} (python3 ${PYTHON_SCRIPT} diff --archive ${ARCHIVE_FILE})"
+    fi
     echo ""
+
+    # Older results move into the archive; each file is deleted only after it round-trips
+    if [ -n "$KEEP" ]; then
+        RESULTS=()
+        for results in "${OUTPUT_DIR}"/network-topology-*.json; do
+            [ -f "$results" ] && RESULTS+=("$results")
+        done
+        if [ ${#RESULTS[@]} -gt "$KEEP" ]; then
+            OLDER=("${RESULTS[@]:0:${#RESULTS[@]}-KEEP}")
+            echo -e "${BLUE}🗜️  Archiving and removing ${#OLDER[@]} older results (keeping the newest ${KEEP})...${NC}"
+            python3 "${PYTHON_SCRIPT}" archive --archive "${ARCHIVE_FILE}" --delete "${OLDER[@]}" || \
+                echo -e "${YELLOW}⚠️  Some older results could not be archived and were kept${NC}"
+            echo ""
+        fi
+    fi
     echo -e "${BLUE}🚀 Next Steps:${NC}"
     echo "   1. Review the discovered devices in: ${OUTPUT_FILE}"
     echo "   2. Deploy simulation with containerlab:"